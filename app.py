@@ -2,27 +2,79 @@
 Bookinator Flask App - LLM Version
 """
 
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, render_template, jsonify, request, session, stream_with_context
 from llm_engine import BookinatorLLM
+from knowledge_base import get_knowledge_base
+from search_index import get_search_index
+from fuzzy_index import get_fuzzy_index
+from session_store import SessionStore, default_backend
+from ollama_client import client as ollama, health, pool
+from concurrency import llm_limiter
+from speculation import speculator
+from search_cache import get_search_cache
+import metrics
+import json
+import os
 import secrets
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+# Workers sharing a session backend must also share the cookie signing key
+app.secret_key = os.environ.get('BOOKINATOR_SECRET_KEY') or secrets.token_hex(16)
 
-# Store engines per session (in production, use Redis or similar)
-engines = {}
+# Warm the shared knowledge base, search and fuzzy-title indexes and Ollama discovery once
+# so the first visitor (or first guess) doesn't pay for them
+get_search_index(get_knowledge_base())
+get_fuzzy_index(get_knowledge_base())
+ollama.base_url
+health.start()
 
-def get_engine():
-    """Get or create an engine for the current session."""
+# Bounded per-session engines (LRU + idle TTL); evicted games are restored from the backend.
+# Set BOOKINATOR_SESSION_DB=/path/sessions.db to share sessions between worker processes.
+sessions = SessionStore(BookinatorLLM, backend=default_backend())
+
+# Scrape-time gauges (the histograms are fed by llm_engine as turns run)
+metrics.registry.gauge('bookinator_active_sessions', "Live engines held in this process", lambda: len(sessions))
+metrics.registry.gauge('bookinator_llm_in_flight', "LLM calls currently holding a slot", lambda: llm_limiter.active)
+metrics.registry.gauge('bookinator_llm_waiting', "LLM calls queued for a slot", lambda: llm_limiter.waiting)
+metrics.registry.gauge('bookinator_llm_slots', "Concurrent LLM calls allowed", lambda: llm_limiter.limit)
+metrics.registry.gauge('bookinator_search_cache_hits_total', "Search cache hits",
+                       lambda: get_search_cache().hits, kind='counter')
+metrics.registry.gauge('bookinator_search_cache_misses_total', "Search cache misses",
+                       lambda: get_search_cache().misses, kind='counter')
+metrics.registry.gauge('bookinator_search_cache_hit_ratio', "Search cache hits / lookups since start",
+                       lambda: get_search_cache().stats()['hit_rate'])
+metrics.registry.gauge('bookinator_speculation_hits_total', "Answers served from a speculated turn",
+                       lambda: speculator.hits, kind='counter')
+metrics.registry.gauge('bookinator_speculation_misses_total', "Answers with no usable speculated turn",
+                       lambda: speculator.misses, kind='counter')
+metrics.registry.gauge('bookinator_speculation_hit_ratio', "Speculation hits / answers since start",
+                       lambda: speculator.stats()['hit_rate'])
+metrics.registry.gauge('bookinator_speculation_wasted_seconds_total', "Generation time spent on unused speculations",
+                       lambda: speculator.wasted_seconds, kind='counter')
+metrics.registry.gauge('bookinator_ollama_up', "1 if the last background health check reached Ollama",
+                       lambda: int(health.status()['ollama']))
+if pool is not None:
+    metrics.registry.gauge('bookinator_ollama_node_up', "1 if the pool currently routes to this node",
+                           lambda: {(n['url'],): int(n['healthy']) for n in pool.stats()}, labels=('url',))
+    metrics.registry.gauge('bookinator_ollama_node_outstanding', "Requests in flight per pooled node",
+                           lambda: {(n['url'],): n['outstanding'] for n in pool.stats()}, labels=('url',))
+    metrics.registry.gauge('bookinator_ollama_node_probe_seconds', "Smoothed health-probe round trip per node",
+                           lambda: {(n['url'],): n['latency_ms'] / 1000 for n in pool.stats()}, labels=('url',))
+
+def get_session_id() -> str:
     session_id = session.get('session_id')
     if not session_id:
         session_id = secrets.token_hex(8)
         session['session_id'] = session_id
-    
-    if session_id not in engines:
-        engines[session_id] = BookinatorLLM()
-    
-    return engines[session_id]
+    return session_id
+
+def get_engine():
+    """Get or create an engine for the current session."""
+    return sessions.get(get_session_id())
+
+def save_engine(engine):
+    """Persist the current session's game state after it changed."""
+    sessions.save(get_session_id(), engine)
 
 @app.route('/')
 def index():
@@ -33,6 +85,7 @@ def start_game():
     """Start a new game."""
     engine = get_engine()
     result = engine.start_game()
+    save_engine(engine)
     return jsonify(result)
 
 @app.route('/api/chat', methods=['POST'])
@@ -46,28 +99,88 @@ def chat():
     
     engine = get_engine()
     result = engine.chat(user_message)
+    save_engine(engine)
     return jsonify(result)
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle a chat message, relaying LLM tokens as Server-Sent Events."""
+    data = request.json
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    engine = get_engine()
+    
+    def generate():
+        try:
+            for event in engine.chat_stream(user_message):
+                if event['type'] == 'done':
+                    save_engine(engine)
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/queue', methods=['GET'])
+def queue_position():
+    """Where this visitor's pending LLM call sits in the fair queue (0 = not waiting)."""
+    engine = get_engine()
+    return jsonify({
+        'position': llm_limiter.position(engine),
+        'waiting': llm_limiter.waiting,
+        'active': llm_limiter.active
+    })
+
 @app.route('/api/reset', methods=['POST'])
 def reset():
     """Reset the conversation."""
     engine = get_engine()
     engine.reset()
+    save_engine(engine)
     return jsonify({'status': 'ok'})
 
 @app.route('/api/health', methods=['GET'])
-def health():
-    """Check if Ollama is running."""
-    import requests as req
-    try:
-        resp = req.get('http://127.0.0.1:11434/api/tags', timeout=2)
-        models = resp.json().get('models', [])
-        return jsonify({
-            'ollama': True,
-            'models': [m['name'] for m in models]
-        })
-    except:
-        return jsonify({'ollama': False, 'models': []})
+def health_check():
+    """Report whether Ollama is running (cached; refreshed by a background checker), per node when pooled."""
+    status = health.status()
+    result = {
+        'ollama': status['ollama'],
+        'models': status['models'],
+        'speculation': speculator.stats()
+    }
+    if 'nodes' in status:
+        result['nodes'] = status['nodes']
+    return jsonify(result)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms, counters and gauges in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def serve_production(host: str = '0.0.0.0', port: int = 5000, threads: int = 32):
+    """
+    Multi-threaded production server: each visitor's blocking LLM call occupies one
+    thread while llm_limiter decides who reaches Ollama next.
+    """
+    from waitress import serve
+    print(f"Serving Bookinator on http://{host}:{port} ({threads} threads, "
+          f"{llm_limiter.limit} concurrent LLM calls)")
+    serve(app, host=host, port=port, threads=threads, channel_timeout=120)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    import argparse
+    parser = argparse.ArgumentParser(description="Bookinator web app")
+    parser.add_argument('--prod', action='store_true', help="serve with waitress instead of the debug server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+    
+    if args.prod:
+        serve_production(args.host, args.port, args.threads)
+    else:
+        app.run(debug=True, host=args.host, port=args.port, threaded=True)
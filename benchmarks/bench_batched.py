@@ -0,0 +1,87 @@
+"""
+Benchmark: ml_engine.BatchedEngine (one multiply per micro-batch of sessions)
+against one BookinatorEngine per session, in turns/sec with N concurrent
+sessions. A turn is one answer plus a top-10 ranking.
+
+Uses a synthetic catalogue (see bench_ml_engine.py).
+
+Usage (from the repo root):
+    python benchmarks/bench_batched.py [--sessions 1,100,1000] [--books 10000] [--turns 10]
+"""
+
+import argparse
+import copy
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ml_engine import synthetic_matrix  # noqa: E402
+from ml_engine import BatchedEngine, BookinatorEngine  # noqa: E402
+
+
+def play(session, features: list[str], turns: int, seed: int, out: list):
+    """Answer `turns` random features, ranking the top 10 after each; appends the last ranking."""
+    rng = np.random.default_rng(seed)
+    ranking = []
+    for feature in rng.choice(features, size=turns, replace=False):
+        session.update_user_vector(str(feature), 'yes' if rng.random() < 0.5 else 'no')
+        ranking = session.top_k(10)
+    out.append((seed, ranking))
+
+
+def run(sessions: list, features: list[str], turns: int) -> tuple[float, dict]:
+    """All sessions play concurrently (one thread each); returns (turns/sec, {seed: last ranking})."""
+    out = []
+    threads = [threading.Thread(target=play, args=(s, features, turns, seed, out)) for seed, s in enumerate(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return len(sessions) * turns / elapsed, dict(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', default='1,100,1000', help="comma-separated concurrency levels")
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--features', type=int, default=300)
+    parser.add_argument('--density', type=float, default=0.15)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--window', type=float, default=None, help="batch window in seconds (default BATCH_WINDOW)")
+    args = parser.parse_args()
+
+    matrix, questions = synthetic_matrix(args.books, args.features, args.density)
+    engine = BookinatorEngine.from_matrix(matrix, questions, books=range(args.books))
+    features = engine.feature_names
+    print(f"{args.books} books x {args.features} features, {args.turns} turns per session\n")
+
+    for n in (int(x) for x in args.sessions.split(',')):
+        # Baseline: an engine per session sharing the catalogue arrays (shallow copy, own answer state)
+        engines = []
+        for _ in range(n):
+            e = copy.copy(engine)
+            e.reset_session()
+            engines.append(e)
+        single_rate, expected = run(engines, features, args.turns)
+
+        batch = BatchedEngine(engine, capacity=max(n, 1), **({'window': args.window} if args.window else {}))
+        views = [batch.open_session() for _ in range(n)]
+        batched_rate, got = run(views, features, args.turns)
+        stats = batch.stats()
+        for v in views:
+            v.close()
+
+        print(f"{n:>5} sessions  per-instance {single_rate:9.0f} turns/s   batched {batched_rate:9.0f} turns/s  "
+              f"({batched_rate / single_rate:4.1f}x, mean batch {stats['mean_batch']:6.1f})  "
+              f"same rankings: {got == expected}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: per-turn question selection in ml_engine.BookinatorEngine,
+vectorized information gain vs. the old per-feature Python loop, plus
+memory and per-answer scoring time of the sparse feature store at scale.
+
+Uses a synthetic catalogue (data/books.json is not shipped).
+
+Usage (from the repo root):
+    python benchmarks/bench_ml_engine.py [--books 10000] [--features 300] [--turns 10]
+    python benchmarks/bench_ml_engine.py --scale 10000,100000,1000000 [--scoring bayes]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_engine import BookinatorEngine  # noqa: E402
+
+
+def synthetic_catalogue(n_books: int, n_features: int, density: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    features = [f"f{j:04d}" for j in range(n_features)]
+    questions = [{'feature': f, 'text': f"Does the book have {f}?"} for f in features]
+    # Feature prevalence varies so some questions split the catalogue far better than others
+    prevalence = rng.uniform(0.01, density * 2, n_features)
+    present = rng.random((n_books, n_features)) < prevalence
+    books = [{'id': i, 'title': f"Book {i}", 'features': {features[j]: 1 for j in np.flatnonzero(row)}}
+             for i, row in enumerate(present)]
+    return books, questions
+
+
+def synthetic_matrix(n_books: int, n_features: int, density: float, seed: int = 0):
+    """Same shape of data as synthetic_catalogue, generated straight into a sparse matrix (no dicts)."""
+    rng = np.random.default_rng(seed)
+    questions = [{'feature': f"f{j:04d}", 'text': f"Does the book have f{j:04d}?"} for j in range(n_features)]
+    matrix = sparse.random(n_books, n_features, density=density, format='csc', dtype=np.float32, random_state=rng)
+    matrix.data[:] = 1.0
+    return matrix, questions
+
+
+def legacy_next_question(engine: BookinatorEngine, dense: np.ndarray):
+    """The pre-vectorization algorithm: full sort, list.index per candidate, per-feature np.mean."""
+    recommendations = engine.get_recommendations()
+    if recommendations[0]['score'] == 0:
+        candidates = engine.books
+    else:
+        top_n = max(3, len(engine.books) // 2)
+        candidates = [x['book'] for x in recommendations[:top_n]]
+    candidate_indices = [engine.books.index(b) for b in candidates]
+    subset_vectors = dense[candidate_indices]
+    best_feature, max_variance = None, -1
+    for feature in engine.feature_names:
+        if feature in engine.asked_features:
+            continue
+        p = np.mean(subset_vectors[:, engine.feature_map[feature]])
+        variance = p * (1 - p)
+        if variance > max_variance:
+            max_variance, best_feature = variance, feature
+    for q in engine.questions:
+        if q['feature'] == best_feature:
+            return q
+    return None
+
+
+def time_turns(engine: BookinatorEngine, select, turns: int, seed: int = 1) -> tuple[list[float], list[str]]:
+    """Play `turns` answers with a fixed random oracle; returns per-turn latency (ms) and features asked."""
+    rng = np.random.default_rng(seed)
+    engine.reset_session()
+    samples, asked = [], []
+    for _ in range(turns):
+        t0 = time.perf_counter()
+        question = select(engine)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if question is None:
+            break
+        asked.append(question['feature'])
+        engine.update_user_vector(question['feature'], 'yes' if rng.random() < 0.5 else 'no')
+    return samples, asked
+
+
+def report(name: str, samples: list[float]):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    print(f"{name:<12} mean {statistics.fmean(samples):9.3f} ms   p50 {p50:9.3f} ms   max {samples[-1]:9.3f} ms")
+
+
+def scale_run(n_books: int, n_features: int, density: float, turns: int, scoring: str):
+    """Memory footprint and per-answer cost of the sparse store for one catalogue size."""
+    matrix, questions = synthetic_matrix(n_books, n_features, density)
+    t0 = time.perf_counter()
+    engine = BookinatorEngine.from_matrix(matrix, questions, books=range(n_books), scoring=scoring)
+    build = time.perf_counter() - t0
+
+    rng = np.random.default_rng(1)
+    score_ms, question_ms = [], []
+    for _ in range(turns):
+        t0 = time.perf_counter()
+        question = engine.get_next_question()
+        question_ms.append((time.perf_counter() - t0) * 1000)
+        if question is None:
+            break
+        engine.update_user_vector(question['feature'], 'yes' if rng.random() < 0.5 else 'no')
+        t0 = time.perf_counter()
+        engine.scores()
+        score_ms.append((time.perf_counter() - t0) * 1000)
+
+    dense_mb = n_books * n_features * 8 / 2**20  # the old float64 np.zeros matrix
+    print(f"{n_books:>9} books  {engine.memory_usage() / 2**20:8.1f} MB (dense float64 {dense_mb:8.1f} MB)  "
+          f"index {build:5.2f} s  score/answer {statistics.fmean(score_ms):7.2f} ms  "
+          f"next question {statistics.fmean(question_ms):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--features', type=int, default=300)
+    parser.add_argument('--density', type=float, default=0.15, help="mean fraction of features per book")
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--skip-legacy', action='store_true', help="the old path is O(n^2); skip it for big runs")
+    parser.add_argument('--scale', metavar='N,N,...', help="report memory and scoring time at these catalogue sizes")
+    parser.add_argument('--scoring', choices=('cosine', 'bayes'), default='cosine')
+    args = parser.parse_args()
+
+    if args.scale:
+        print(f"{args.features} features, density {args.density}, {args.turns} answers, {args.scoring} scoring\n")
+        for n_books in (int(n) for n in args.scale.split(',')):
+            scale_run(n_books, args.features, args.density, args.turns, args.scoring)
+        return
+
+    t0 = time.perf_counter()
+    books, questions = synthetic_catalogue(args.books, args.features, args.density)
+    engine = BookinatorEngine.from_data(books, questions, scoring=args.scoring)
+    print(f"{args.books} books x {args.features} features, built in {(time.perf_counter() - t0) * 1000:.0f} ms\n")
+
+    samples, new_path = time_turns(engine, BookinatorEngine.get_next_question, args.turns)
+    report(args.scoring, samples)
+    # The legacy loop only knows cosine scoring
+    if not args.skip_legacy and args.scoring == 'cosine':
+        dense = engine.book_vectors.toarray()
+        samples, old_path = time_turns(engine, lambda e: legacy_next_question(e, dense), args.turns)
+        report("legacy", samples)
+        print(f"\nsame questions asked: {new_path == old_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: inverted BM25 index vs. the old linear substring scan over data/books.csv.
+
+Usage (from the repo root):
+    python benchmarks/bench_search.py [--repeat 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import BOOKS_CSV_PATH, KnowledgeBase  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+
+QUERIES = [
+    "Feluda Satyajit Ray novel",
+    "Satyajit Ray Feluda books",
+    "Byomkesh Bakshi Sharadindu Bandyopadhyay",
+    "Saradindu Banerjee detective",
+    "Rabindranath Tagore Gitanjali",
+    "Sunil Gangopadhyay Kakababu",
+    "harry potter prince",
+    "lord of the rings tolkien",
+    "Jhumpa Lahiri Namesake",
+    "Amitav Ghosh Hungry Tide",
+]
+
+
+def linear_scan(kb: KnowledgeBase, query: str, max_results: int = 5) -> list[int]:
+    """The pre-index `_search_local_db` algorithm: substring test per term per row."""
+    query_terms = query.lower().split()
+    matches = []
+    for i, title in enumerate(kb.titles):
+        text = (title + " " + kb.authors(i)).lower()
+        score = 0
+        for term in query_terms:
+            if term in text:
+                score += 1
+        if score > 0:
+            matches.append((score, i))
+    matches.sort(key=lambda x: x[0], reverse=True)
+    return [i for _, i in matches[:max_results]]
+
+
+def time_per_query(fn, repeat: int) -> list[float]:
+    """Per-query latency samples in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            t0 = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def report(name: str, samples: list[float]):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<14} mean {statistics.fmean(samples):9.1f} us   p50 {p50:9.1f} us   p99 {p99:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=BOOKS_CSV_PATH)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    kb = KnowledgeBase.from_csv(args.csv)
+    t0 = time.perf_counter()
+    index = SearchIndex(kb)
+    print(f"{len(kb)} books, index built in {(time.perf_counter() - t0) * 1000:.0f} ms "
+          f"({len(index._vocab)} terms)\n")
+
+    report("linear scan", time_per_query(lambda q: linear_scan(kb, q), max(1, args.repeat // 10)))
+    report("bm25 index", time_per_query(lambda q: index.search(q), args.repeat))
+
+    print("\nTop hit per query (index):")
+    for q in QUERIES:
+        hits = index.search(q, k=1)
+        top = f"{kb.titles[hits[0][0]]} / {kb.authors(hits[0][0])}" if hits else "-"
+        print(f"  {q:<42} -> {top[:70]}")
+
+
+if __name__ == '__main__':
+    main()
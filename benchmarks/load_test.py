@@ -0,0 +1,141 @@
+"""
+Load test: N concurrent simulated players against the real Flask app and a stub Ollama.
+
+Starts benchmarks/stub_ollama.py in-process, points Bookinator at it via
+OLLAMA_HOST, serves app.py on a local threaded server and reports per-turn
+latency percentiles (and time-to-first-token for the streaming endpoint).
+
+Usage (from the repo root):
+    python benchmarks/load_test.py --players 20 --turns 6 --latency 0.5 --parallel 2
+    python benchmarks/load_test.py --players 20 --stream
+    python benchmarks/load_test.py --players 20 --nodes 3   # OLLAMA_URLS pool of 3 stubs
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from stub_ollama import StubOllama  # noqa: E402
+
+ANSWERS = ["Yes", "No", "Probably", "Probably Not", "Absolutely", "Absolutely Not"]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def play(base_url: str, turns: int, stream: bool, seed: int, results: dict, lock: threading.Lock):
+    """One player: start a game and answer `turns` questions."""
+    rng = random.Random(seed)
+    http = requests.Session()
+    latencies, first_tokens, errors = [], [], 0
+
+    t0 = time.perf_counter()
+    resp = http.post(f"{base_url}/api/start")
+    latencies.append(time.perf_counter() - t0)
+    if resp.status_code != 200:
+        errors += 1
+
+    for _ in range(turns):
+        answer = rng.choice(ANSWERS)
+        t0 = time.perf_counter()
+        try:
+            if stream:
+                first = None
+                with http.post(f"{base_url}/api/chat/stream", json={'message': answer}, stream=True) as r:
+                    for line in r.iter_lines():
+                        if not line.startswith(b'data: '):
+                            continue
+                        event = json.loads(line[6:])
+                        if event['type'] == 'token' and first is None:
+                            first = time.perf_counter() - t0
+                        if event['type'] in ('done', 'error'):
+                            errors += event['type'] == 'error'
+                            break
+                if first is not None:
+                    first_tokens.append(first)
+            else:
+                r = http.post(f"{base_url}/api/chat", json={'message': answer})
+                errors += r.status_code != 200 or r.json().get('response', '').startswith('Error')
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+
+    with lock:
+        results['latencies'].extend(latencies)
+        results['first_tokens'].extend(first_tokens)
+        results['errors'] += errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-player load test against a stub Ollama")
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=6, help="answers per player after /api/start")
+    parser.add_argument('--latency', type=float, default=0.5, help="stub prompt-eval seconds per call")
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--parallel', type=int, default=2, help="stub's concurrent request capacity")
+    parser.add_argument('--nodes', type=int, default=1, help="stub servers; more than one exercises the OLLAMA_URLS pool")
+    parser.add_argument('--stream', action='store_true', help="use /api/chat/stream")
+    parser.add_argument('--no-coalesce', action='store_true', help="send identical LLM requests separately")
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    stubs = [StubOllama(latency=args.latency, token_delay=args.token_delay, parallel=args.parallel).start()
+             for _ in range(args.nodes)]
+    os.environ['OLLAMA_HOST'] = stubs[0].url
+    if args.nodes > 1:
+        os.environ['OLLAMA_URLS'] = ','.join(s.url for s in stubs)
+
+    import logging
+    from werkzeug.serving import make_server
+    import app as bookinator
+    import llm_engine
+    from metrics import coalesced_total
+    llm_engine.COALESCE = not args.no_coalesce
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', args.port, bookinator.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {'latencies': [], 'first_tokens': [], 'errors': 0}
+    lock = threading.Lock()
+    players = [threading.Thread(target=play, args=(base_url, args.turns, args.stream, i, results, lock))
+               for i in range(args.players)]
+
+    started = time.perf_counter()
+    for p in players:
+        p.start()
+    for p in players:
+        p.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    for stub in stubs:
+        stub.stop()
+    calls = [stub.requests for stub in stubs]
+
+    lat = results['latencies']
+    print(f"\n{args.players} players x {args.turns + 1} turns in {elapsed:.1f}s "
+          f"({len(lat) / elapsed:.1f} turns/s), {sum(calls)} LLM calls {calls}, {results['errors']} errors")
+    print(f"coalesced: {coalesced_total.value('joined'):.0f} joined in flight, {coalesced_total.value('cached'):.0f} reused")
+    print(f"stub: {args.nodes} x {args.latency}s prompt eval, {args.parallel} parallel; "
+          f"app: {bookinator.llm_limiter.limit} LLM slots")
+    print(f"turn latency   p50 {percentile(lat, 50):6.2f}s   p95 {percentile(lat, 95):6.2f}s   p99 {percentile(lat, 99):6.2f}s")
+    if results['first_tokens']:
+        ft = results['first_tokens']
+        print(f"first token    p50 {percentile(ft, 50):6.2f}s   p95 {percentile(ft, 95):6.2f}s   p99 {percentile(ft, 99):6.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Exercise the Ollama pool against several local stub servers:
+load spread, session affinity, failover when a node dies, and recovery.
+
+Usage (from the repo root):
+    python benchmarks/pool_check.py --nodes 3 --requests 60
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_ollama import StubOllama  # noqa: E402
+from ollama_client import OllamaClient, OllamaDiscovery, OllamaPool  # noqa: E402
+
+PAYLOAD = {'model': 'llama3.2', 'messages': [{'role': 'user', 'content': 'Game Start.'}], 'stream': False}
+
+
+def served(stubs: list[StubOllama], before: list[int]) -> list[int]:
+    return [s.requests - b for s, b in zip(stubs, before)]
+
+
+def burst(client: OllamaClient, n: int, affinity_prefix: str = 's') -> int:
+    """n concurrent requests from n different sessions; returns how many failed."""
+    failures = []
+
+    def one(i):
+        try:
+            client.chat(PAYLOAD, affinity=f"{affinity_prefix}{i}")
+        except Exception as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(failures)
+
+
+def check(name: str, ok: bool, detail: str):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}: {detail}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama pool routing/failover check against stub servers")
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.2, help="stub prompt-eval seconds per call")
+    args = parser.parse_args()
+
+    stubs = [StubOllama(latency=args.latency, parallel=2).start() for _ in range(args.nodes)]
+    pool = OllamaPool([s.url for s in stubs], probe_interval=0.5)
+    client = OllamaClient(OllamaDiscovery(candidates=[stubs[0].url]), pool=pool)
+    pool.probe_all()
+    pool.start()
+    results = []
+
+    # 1. Least-outstanding routing spreads a burst of new sessions
+    before = [s.requests for s in stubs]
+    started = time.perf_counter()
+    failed = burst(client, args.requests)
+    counts = served(stubs, before)
+    even = args.requests / args.nodes
+    results.append(check("spread", not failed and min(counts) >= 0.5 * even,
+                         f"{counts} in {time.perf_counter() - started:.2f}s, {failed} failed"))
+
+    # 2. A session stays on one node while the pool is idle
+    before = [s.requests for s in stubs]
+    for _ in range(5):
+        client.chat(PAYLOAD, affinity='regular')
+    counts = served(stubs, before)
+    results.append(check("affinity", sorted(counts)[-1] == 5, f"5 sequential turns landed {counts}"))
+
+    # 3. A node answering 503 is routed around without failing requests
+    stubs[0].healthy = False
+    before = [s.requests for s in stubs]
+    failed = burst(client, args.requests, 'failover')
+    counts = served(stubs, before)
+    results.append(check("failover (503)", failed == 0 and counts[0] <= 2,
+                         f"{counts}, {failed} failed, node 0 healthy={pool.stats()[0]['healthy']}"))
+
+    # 4. ... and is used again once a probe sees it healthy
+    stubs[0].healthy = True
+    time.sleep(pool.probe_interval * 3)
+    before = [s.requests for s in stubs]
+    burst(client, args.requests, 'recovered')
+    counts = served(stubs, before)
+    results.append(check("recovery", counts[0] > 0, f"{counts}, node 0 healthy={pool.stats()[0]['healthy']}"))
+
+    # 5. A node that disappears entirely (connection refused)
+    stubs[-1].stop()
+    before = [s.requests for s in stubs]
+    failed = burst(client, args.requests, 'dead')
+    counts = served(stubs, before)
+    results.append(check("failover (down)", failed == 0, f"{counts[:-1]} on the live nodes, {failed} failed"))
+
+    for s in stubs[:-1]:
+        s.stop()
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
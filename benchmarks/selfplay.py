@@ -0,0 +1,434 @@
+"""
+Self-play benchmark: thousands of games of 20 questions against
+ml_engine.BookinatorEngine and llm_engine.BookinatorLLM, answered by oracle
+players who know their book's books.csv attributes.
+
+The LLM side talks to an in-process stub Ollama (stub_ollama.py) whose
+deterministic "model" asks questions the candidate tracker can check, guesses
+when the [CANDIDATES] block says one book clearly fits (and every few
+questions anyway), searches now and then,
+and lists the top candidates on the final turn. So the numbers measure
+Bookinator's own pipeline (shortlist, facets, search, prompts), not a model.
+Web search is off unless --web is given: searches hit the local catalogue.
+
+Games are spread over a process pool; each worker has its own stub server
+and a fresh search cache. Results are written as a JSON baseline, and
+--compare reports (and exits 1 on) regressions against an earlier one.
+
+Usage (from the repo root):
+    python benchmarks/selfplay.py --games 2000 --workers 4 --save benchmarks/baselines/selfplay.json
+    python benchmarks/selfplay.py --games 2000 --workers 4 --compare benchmarks/baselines/selfplay.json
+    python benchmarks/selfplay.py --engines llm --games 50 --verbose
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candidate_tracker import get_mask, parse_question  # noqa: E402
+from knowledge_base import BOOKS_CSV_PATH, get_knowledge_base  # noqa: E402
+from stub_ollama import StubOllama  # noqa: E402
+
+MAX_QUESTIONS = 20
+TARGET_POOL = 2000      # targets are drawn from the most-rated books: players think of well-known ones
+SEARCH_EVERY = 4        # the stub model searches on every 4th question once searches are allowed
+OPENING_QUESTIONS = 6   # generic questions the stub asks before chasing the shortlist
+GUESS_EVERY = 3         # ... after which it also guesses its top candidate every 3rd question
+FINAL_CANDIDATES = 3
+
+# Allowed growth before --compare calls it a regression (rates are absolute, the rest relative)
+TOLERANCES = {
+    'solve_rate': -0.02,
+    'top3_rate': -0.02,
+    'questions_mean': 0.5,
+    'llm_calls_per_game': 0.05,
+    'prompt_tokens_per_game': 0.05,
+    'searches_per_game': 0.10,
+    'turn_ms_p95': 0.50,
+}
+
+# Questions the stub asks when the shortlist gives it nothing better (all understood by parse_question)
+GENERIC_QUESTIONS = [
+    "Is the book written in English?",
+    "Is it part of a series?",
+    "Is it a bestseller?",
+    "Is it longer than 300 pages?",
+    "Was it published after 1995?",
+    "Is it highly rated?",
+    "Is it longer than 500 pages?",
+    "Was it published after 2005?",
+    "Is it shorter than 200 pages?",
+    "Was it published before 1980?",
+]
+
+_CANDIDATE_RE = re.compile(r'^\d+\. (.+) by (.+?) \((\d+)p(?:, (\d+))?\)$')
+_SERIES_TAG_RE = re.compile(r'\s*\([^)]*#[^)]*\)')
+_TITLE_WORD_RE = re.compile(r"[A-Za-z]{5,}")
+_STOPWORDS = {'about', 'after', 'their', 'there', 'which', 'other', 'these', 'those', 'where', 'complete'}
+
+
+# --- The stub "model" ------------------------------------------------------------------------
+
+def _candidates(messages: list[dict]) -> list[tuple[str, str, int, int]]:
+    """(title, author, pages, year) from the most recent [CANDIDATES] block."""
+    for message in reversed(messages):
+        content = message.get('content', '')
+        if '[CANDIDATES]' not in content:
+            continue
+        block = content.split('[CANDIDATES]', 1)[1].split('[END CANDIDATES]', 1)[0]
+        found = []
+        for line in block.splitlines():
+            m = _CANDIDATE_RE.match(line.strip())
+            if m:
+                found.append((m.group(1), m.group(2), int(m.group(3)), int(m.group(4) or 0)))
+        return found
+    return []
+
+
+def _questions_for(candidates: list[tuple], asked: int) -> list[str]:
+    """Broad questions first, then ones that split the leading candidates."""
+    plan = list(GENERIC_QUESTIONS[:OPENING_QUESTIONS]) if asked < OPENING_QUESTIONS else []
+    if candidates:
+        first = candidates[0]
+        plan.append(f"Was it written by {first[1]}?")
+        word = max(_TITLE_WORD_RE.findall(_SERIES_TAG_RE.sub('', first[0])) or [''], key=len)
+        if word and word.lower() not in _STOPWORDS:
+            plan.append(f"Does the title contain the word {word}?")
+        for other in candidates[1:3]:
+            if other[1] != first[1]:
+                plan.append(f"Was it written by {other[1]}?")
+            if other[2] != first[2] and min(other[2], first[2]) > 0:
+                plan.append(f"Is it longer than {min(other[2], first[2])} pages?")
+            if other[3] != first[3] and min(other[3], first[3]) > 0:
+                plan.append(f"Was it published after {min(other[3], first[3])}?")
+    return plan + GENERIC_QUESTIONS
+
+
+def shortlist_responder(messages: list[dict]) -> str:
+    """Deterministic stand-in for the model, driven by the engine's [CANDIDATES] block."""
+    last = messages[-1]['content'] if messages else ''
+    candidates = _candidates(messages)
+    if '[FINAL]' in last:
+        lines = [f"{i}. {title} by {author}" for i, (title, author, _, _) in enumerate(candidates[:FINAL_CANDIDATES], 1)]
+        return "[FINAL]\n" + "\n".join(lines or ["1. Unknown by Unknown"]) + "\n[END FINAL]"
+
+    seen = "\n".join(m.get('content', '') for m in messages[:-1])
+    asked = sum(1 for m in messages if m['role'] == 'assistant')
+    for m in messages:
+        if m['role'] == 'system' and m['content'].startswith('[EARLIER QUESTIONS]'):
+            asked += m['content'].count('\n- ')
+
+    hinted = 'consider guessing it' in last or (asked > OPENING_QUESTIONS and asked % GUESS_EVERY == 0)
+    if candidates and hinted and f"Book: {candidates[0][0]}" not in seen:
+        title, author = candidates[0][:2]
+        return (f"[GUESS]\nConfidence: 95%\nBook: {title} by {author}\n"
+                f"Reasoning: Fits every answer so far.\n[END GUESS]")
+    searching = not last.lstrip().startswith('Search results for')
+    if candidates and searching and asked >= 5 and asked % SEARCH_EVERY == 0:
+        return f"[SEARCH: {_SERIES_TAG_RE.sub('', candidates[0][0])} {candidates[0][1]}]"
+    for question in _questions_for(candidates, asked):
+        if question not in seen:
+            return question
+    return GENERIC_QUESTIONS[asked % len(GENERIC_QUESTIONS)]
+
+
+# --- Oracle players --------------------------------------------------------------------------
+
+def _title_key(title: str) -> str:
+    return ' '.join(_SERIES_TAG_RE.sub('', title).lower().split())
+
+
+class Oracle:
+    """A player thinking of catalogue row `row`, answering from its books.csv attributes."""
+
+    def __init__(self, kb, row: int):
+        self.kb = kb
+        self.row = row
+        self.title = _title_key(kb.titles[row])
+
+    def is_book(self, guess: str) -> bool:
+        """'Title by Author' (series tag optional) names this book."""
+        return _title_key(guess.rsplit(' by ', 1)[0]) == self.title or _title_key(guess) == self.title
+
+    def answer(self, question: str) -> str:
+        key = parse_question(question)
+        mask = get_mask(self.kb, key[:-1]) if key else None
+        if mask is None:
+            return "Probably Not"  # can't tell from the catalogue; most properties don't hold
+        return "Yes" if mask[self.row] else "No"
+
+
+# --- Games (run inside the workers) ----------------------------------------------------------
+
+_worker: Optional["Worker"] = None
+
+
+class Worker:
+    """Per-process state: the stub server, the catalogue and (lazily) each engine."""
+
+    def __init__(self, stub: StubOllama, web: bool):
+        self.stub = stub
+        self.web = web
+        self.kb = get_knowledge_base(BOOKS_CSV_PATH)
+        self._ml = None
+        self._features = None
+
+    def ml_engine(self):
+        if self._ml is None:
+            from ml_engine import BookinatorEngine
+            from feature_store import FEATURE_STORE_DIR
+            self._ml = BookinatorEngine.from_store(FEATURE_STORE_DIR)
+            self._features = self._ml.book_vectors.tocsr()  # per-book rows for the oracle
+        return self._ml
+
+    def play_ml(self, row: int) -> dict:
+        """The engine 'guesses' once the target is the single best-scoring book."""
+        engine = self.ml_engine()
+        engine.reset_session()
+        has = set(self._features[row].indices)
+        turn_ms, questions, solved = [], 0, False
+        while questions < MAX_QUESTIONS:
+            started = time.perf_counter()
+            question = engine.get_next_question()
+            if question is None:
+                break
+            answer = 'yes' if engine.feature_map[question['feature']] in has else 'no'
+            engine.update_user_vector(question['feature'], answer)
+            top = engine.top_k(2)
+            turn_ms.append((time.perf_counter() - started) * 1000)
+            questions += 1
+            if top[0][0] == row and (len(top) < 2 or top[0][1] > top[1][1]):
+                solved = True
+                break
+        top3 = solved or row in [i for i, _ in engine.top_k(FINAL_CANDIDATES)]
+        return {'row': row, 'solved': solved, 'top3': top3, 'questions': questions, 'turn_ms': turn_ms,
+                'llm_calls': 0, 'prompt_tokens': 0, 'eval_tokens': 0, 'searches': 0, 'web_searches': 0}
+
+    def play_llm(self, row: int) -> dict:
+        engine = SimulatedLLM(web=self.web)
+        engine.speculative = False
+        oracle = Oracle(self.kb, row)
+        calls = self.stub.requests
+        turn_ms = []
+
+        started = time.perf_counter()
+        result = engine.start_game()
+        turn_ms.append((time.perf_counter() - started) * 1000)
+        solved = top3 = False
+        while True:
+            if result['game_over']:
+                top3 = any(oracle.is_book(c.split('. ', 1)[-1]) for c in result['final_candidates'][:FINAL_CANDIDATES])
+                break
+            if result['guess']:
+                solved = oracle.is_book(result['guess']['book'])
+                answer = "Yes" if solved else "No"
+            else:
+                answer = oracle.answer(result['response'])
+            if solved or engine._turn_count() > MAX_QUESTIONS:
+                break
+            started = time.perf_counter()
+            result = engine.chat(answer)
+            turn_ms.append((time.perf_counter() - started) * 1000)
+        return {
+            'row': row, 'solved': solved, 'top3': solved or top3, 'questions': engine._turn_count(),
+            'turn_ms': turn_ms, 'llm_calls': self.stub.requests - calls,
+            'prompt_tokens': sum(t['prompt_eval_count'] for t in engine.timings),
+            'eval_tokens': sum(t['eval_count'] for t in engine.timings),
+            'searches': engine.searches, 'web_searches': engine.web_searches,
+        }
+
+
+def _simulated_llm_class():
+    from llm_engine import SEARCH_DEADLINE, BookinatorLLM
+
+    class SimulatedLLM(BookinatorLLM):
+        """BookinatorLLM that counts its searches and keeps the web half offline unless asked."""
+
+        def __init__(self, web: bool = False):
+            super().__init__()
+            self.web = web
+            self.searches = 0
+            self.web_searches = 0
+
+        def _hybrid_search(self, query: str, deadline: float = SEARCH_DEADLINE) -> list[dict]:
+            self.searches += 1
+            return super()._hybrid_search(query, deadline)
+
+        def _web_search(self, query: str, max_results: int = 3) -> list[dict]:
+            if not self.web:
+                return []
+            self.web_searches += 1
+            return super()._web_search(query, max_results)
+
+    return SimulatedLLM
+
+
+SimulatedLLM = None
+
+
+def _init_worker(cache_dir: str, web: bool, coalesce: bool, verbose: bool):
+    """Start this process's stub Ollama before llm_engine (and its Ollama discovery) is imported."""
+    global _worker, SimulatedLLM
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')  # the engines print a DEBUG line per step
+    os.environ['BOOKINATOR_SEARCH_CACHE'] = os.path.join(cache_dir, f"search-{os.getpid()}.db")
+    stub = StubOllama(responder=shortlist_responder, parallel=2).start()
+    os.environ['OLLAMA_HOST'] = stub.url
+    os.environ.pop('OLLAMA_URLS', None)
+    SimulatedLLM = _simulated_llm_class()
+    import llm_engine
+    llm_engine.COALESCE = coalesce
+    _worker = Worker(stub, web)
+
+
+def _play(kind: str, rows: list[int]) -> list[dict]:
+    play = _worker.play_ml if kind == 'ml' else _worker.play_llm
+    return [play(row) for row in rows]
+
+
+# --- Reporting -------------------------------------------------------------------------------
+
+def _p95(values: list[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+def summarize(games: list[dict], elapsed: float) -> dict:
+    n = len(games)
+    solved = [g['questions'] for g in games if g['solved']]
+    turns = [ms for g in games for ms in g['turn_ms']]
+    return {
+        'games': n,
+        'solve_rate': round(len(solved) / n, 4),
+        'top3_rate': round(sum(g['top3'] for g in games) / n, 4),
+        'questions_mean': round(statistics.fmean(solved), 2) if solved else None,
+        'questions_p95': _p95(solved) if solved else None,
+        'llm_calls_per_game': round(sum(g['llm_calls'] for g in games) / n, 2),
+        'prompt_tokens_per_game': round(sum(g['prompt_tokens'] for g in games) / n, 1),
+        'eval_tokens_per_game': round(sum(g['eval_tokens'] for g in games) / n, 1),
+        'searches_per_game': round(sum(g['searches'] for g in games) / n, 2),
+        'web_searches_per_game': round(sum(g['web_searches'] for g in games) / n, 2),
+        'turn_ms_mean': round(statistics.fmean(turns), 3) if turns else 0.0,
+        'turn_ms_p95': round(_p95(turns), 3),
+        'elapsed_s': round(elapsed, 2),
+    }
+
+
+def report(kind: str, s: dict):
+    questions = f"{s['questions_mean']} mean / {s['questions_p95']} p95" if s['questions_mean'] is not None else "-"
+    print(f"{kind:<4} {s['games']} games in {s['elapsed_s']:.1f}s: solved {s['solve_rate']:.1%} "
+          f"(top {FINAL_CANDIDATES}: {s['top3_rate']:.1%}), questions to guess {questions}")
+    print(f"     per game: {s['llm_calls_per_game']} LLM calls, {s['prompt_tokens_per_game']:.0f} prompt + "
+          f"{s['eval_tokens_per_game']:.0f} generated tokens, {s['searches_per_game']} searches "
+          f"({s['web_searches_per_game']} web); per turn {s['turn_ms_mean']:.2f} ms mean / {s['turn_ms_p95']:.2f} ms p95")
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """Metrics that got worse than the baseline by more than TOLERANCES."""
+    regressions = []
+    for kind, current in results['engines'].items():
+        before = baseline.get('engines', {}).get(kind)
+        if not before:
+            continue
+        for metric, tolerance in TOLERANCES.items():
+            old, new = before.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if metric.endswith('_rate'):
+                worse = new - old < tolerance
+            elif metric == 'questions_mean':
+                worse = new - old > tolerance
+            else:
+                worse = new > old * (1 + tolerance) and new - old > 1e-9
+            marker = "REGRESSION" if worse else "ok"
+            print(f"  {kind:<4} {metric:<24} {old!s:>10} -> {new!s:<10} {marker}")
+            if worse:
+                regressions.append(f"{kind}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play benchmark with oracle players and a stub LLM")
+    parser.add_argument('--games', type=int, default=1000, help="games per engine")
+    parser.add_argument('--engines', default='ml,llm', help="comma-separated: ml, llm")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0, help="picks the target books")
+    parser.add_argument('--web', action='store_true', help="let searches reach DuckDuckGo (slow, not reproducible)")
+    parser.add_argument('--coalesce', action='store_true',
+                        help="share identical LLM requests between games (fewer calls, but counts depend on scheduling)")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="baseline to check for regressions (exit 1 if any)")
+    parser.add_argument('--verbose', action='store_true', help="keep the engines' DEBUG output")
+    args = parser.parse_args()
+
+    kb = get_knowledge_base(BOOKS_CSV_PATH)
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    if 'ml' in engines:
+        from feature_store import FEATURE_STORE_DIR, compile_store, store_exists
+        if not store_exists(FEATURE_STORE_DIR):
+            compile_store()
+
+    pool = sorted(range(len(kb)), key=kb.ratings_counts.__getitem__, reverse=True)[:TARGET_POOL]
+    rng = random.Random(args.seed)
+    targets = [rng.choice(pool) for _ in range(args.games)]
+    chunk = max(1, min(50, args.games // (args.workers * 4) or 1))
+    batches = [targets[i:i + chunk] for i in range(0, len(targets), chunk)]
+
+    cache_dir = tempfile.mkdtemp(prefix="bookinator-selfplay-")
+    results = {
+        'created': time.time(),
+        'config': {'games': args.games, 'seed': args.seed, 'workers': args.workers, 'web': args.web,
+                   'coalesce': args.coalesce,
+                   'max_questions': MAX_QUESTIONS, 'target_pool': TARGET_POOL, 'books': len(kb)},
+        'engines': {},
+    }
+    print(f"{args.games} games per engine over {args.workers} worker(s), targets from the "
+          f"{TARGET_POOL} most-rated of {len(kb)} books\n")
+    try:
+        # spawn: every worker imports llm_engine fresh, after pointing it at its own stub
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(cache_dir, args.web, args.coalesce, args.verbose)) as executor:
+            for kind in engines:
+                started = time.perf_counter()
+                games = [g for batch in executor.map(_play, [kind] * len(batches), batches) for g in batch]
+                summary = results['engines'][kind] = summarize(games, time.perf_counter() - started)
+                report(kind, summary)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.compare}:")
+        changed = [k for k in ('games', 'seed', 'web', 'coalesce') if baseline.get('config', {}).get(k) != results['config'][k]]
+        if changed:
+            print(f"  (different {', '.join(changed)} than the baseline: expect noise)")
+        regressions = compare(results, baseline)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == '__main__':
+    main()
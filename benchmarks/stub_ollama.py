@@ -0,0 +1,174 @@
+"""
+Deterministic stand-in for an Ollama server, for load tests and offline benchmarks.
+
+Implements /api/tags and /api/chat (streaming NDJSON and non-streaming), with
+configurable prompt-eval latency, per-token delay and a parallelism cap that
+mimics OLLAMA_NUM_PARALLEL. Replies come from a pluggable responder.
+
+Usage (from the repo root):
+    python benchmarks/stub_ollama.py --port 11435 --latency 0.5 --parallel 1
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+QUESTIONS = [
+    "Is the book written in English?",
+    "Is it a novel?",
+    "Was it published after 2000?",
+    "Is it longer than 400 pages?",
+    "Is it part of a series?",
+    "Is the author British?",
+    "Is it a mystery or detective story?",
+    "Is it aimed at children?",
+    "Was the author alive in the 20th century?",
+    "Is it considered a classic?",
+]
+
+
+def default_responder(messages: list[dict]) -> str:
+    """Cycle through fixed questions; answer the final-turn prompt with a [FINAL] block."""
+    last = messages[-1]['content'] if messages else ''
+    if '[FINAL]' in last:
+        return "[FINAL]\n1. Sonar Kella by Satyajit Ray\n2. Byomkesh Samagra by Sharadindu Bandyopadhyay\n3. Gitanjali by Rabindranath Tagore\n[END FINAL]"
+    asked = sum(1 for m in messages if m['role'] == 'assistant')
+    return QUESTIONS[asked % len(QUESTIONS)]
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubOllama:
+    """A ThreadingHTTPServer speaking enough of the Ollama API for Bookinator."""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, token_delay: float = 0.0,
+                 parallel: int = 1, responder: Optional[Callable[[list[dict]], str]] = None,
+                 model: str = "llama3.2"):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.responder = responder or default_responder
+        self.model = model
+        self.requests = 0
+        self.healthy = True   # set False to make every request fail with 503
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+        self._counter_lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        # Clients hanging up mid-stream (cancelled generations) are expected, not errors
+        self.server.handle_error = lambda request, address: None
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StubOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"stub-ollama-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, keep-alive clients stall ~40 ms per call
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, obj: dict, status: int = 200):
+                body = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path != '/api/tags' or not stub.healthy:
+                    return self._send_json({'error': 'unavailable'}, 503 if not stub.healthy else 404)
+                self._send_json({'models': [{'name': stub.model}]})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path != '/api/chat' or not stub.healthy:
+                    return self._send_json({'error': 'unavailable'}, 503 if not stub.healthy else 404)
+                with stub._counter_lock:
+                    stub.requests += 1
+
+                messages = body.get('messages', [])
+                with stub._slots:
+                    started = time.perf_counter()
+                    time.sleep(stub.latency)
+                    prompt_eval = time.perf_counter() - started
+                    text = stub.responder(messages)
+                    stats = {
+                        'model': stub.model,
+                        'done': True,
+                        'prompt_eval_count': sum(_count_tokens(m.get('content', '')) for m in messages),
+                        'prompt_eval_duration': int(prompt_eval * 1e9),
+                        'eval_count': _count_tokens(text),
+                    }
+                    if body.get('stream'):
+                        self._stream(text, stats, started)
+                    else:
+                        time.sleep(stub.token_delay * _count_tokens(text))
+                        stats['eval_duration'] = int((time.perf_counter() - started - prompt_eval) * 1e9)
+                        stats['total_duration'] = int((time.perf_counter() - started) * 1e9)
+                        self._send_json({'message': {'role': 'assistant', 'content': text}, **stats})
+
+            def _stream(self, text: str, stats: dict, started: float):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                eval_start = time.perf_counter()
+                try:
+                    for word in text.split(' '):
+                        time.sleep(stub.token_delay)
+                        self._chunk({'model': stub.model, 'done': False,
+                                     'message': {'role': 'assistant', 'content': word + ' '}})
+                    stats['eval_duration'] = int((time.perf_counter() - eval_start) * 1e9)
+                    stats['total_duration'] = int((time.perf_counter() - started) * 1e9)
+                    self._chunk({'message': {'role': 'assistant', 'content': ''}, **stats})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client stopped reading: generation "cancelled"
+
+            def _chunk(self, obj: dict):
+                data = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic stub Ollama server")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds of simulated prompt evaluation")
+    parser.add_argument('--token-delay', type=float, default=0.01, help="seconds per generated token")
+    parser.add_argument('--parallel', type=int, default=1, help="requests processed at once (OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+
+    stub = StubOllama(args.port, args.latency, args.token_delay, args.parallel).start()
+    print(f"Stub Ollama listening on {stub.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Bookinator Candidate Tracker
+Turns each answered question into a filter over the local catalogue and
+keeps a running score per book, so every prompt can carry a short list of
+books that still fit the answers.
+"""
+
+import heapq
+import math
+import re
+import threading
+import weakref
+from array import array
+from typing import Optional
+
+from knowledge_base import KnowledgeBase
+from search_index import get_search_index, tokenize
+
+SHORTLIST_SIZE = 5
+POPULARITY_WEIGHT = 0.2     # prior per decade of ratings_count: players think of well-known books
+CONFIDENT_MARGIN = 3.0      # lead over the runner-up at which the block suggests guessing
+POPULAR_RATINGS = 25000     # ratings_count treated as "bestseller / famous" (~top 10%)
+HIGH_RATING = 4.0
+
+# Score added to books that fit the question (subtracted from those that don't)
+ANSWER_WEIGHTS = {
+    'absolutely': 3.0, 'yes': 2.0, 'probably': 1.0, 'maybe': 0.0, "don't know": 0.0,
+    'probably not': -1.0, 'no': -2.0, 'absolutely not': -3.0,
+}
+# The result card's "No" on a guess (static/script.js): the guessed book is out, whatever it scored
+REJECTION_ANSWER = "that is incorrect"
+REJECTED_WEIGHT = -25.0
+
+LANGUAGE_CODES = {
+    'english': ('eng', 'en-US', 'en-GB', 'en-CA', 'enm'),
+    'bengali': ('ben',), 'bangla': ('ben',), 'hindi': ('hin',), 'spanish': ('spa',),
+    'french': ('fre',), 'german': ('ger',), 'japanese': ('jpn',), 'chinese': ('zho',),
+    'italian': ('ita',), 'portuguese': ('por',), 'greek': ('grc',), 'russian': ('rus',),
+}
+
+_TAG_RE = re.compile(r'\[.*', re.DOTALL)
+_PAGES_MORE_RE = re.compile(r'\b(?:more|longer|over|greater) than (\d{2,4}) pages|\bover (\d{2,4}) pages', re.I)
+_PAGES_LESS_RE = re.compile(r'\b(?:fewer|less|shorter|under) than (\d{2,4}) pages|\bunder (\d{2,4}) pages', re.I)
+_LONG_RE = re.compile(r'\b(?:long|lengthy|thick|big) (?:book|novel)\b', re.I)
+_SHORT_RE = re.compile(r'\b(?:short|thin|slim) (?:book|novel)\b', re.I)
+_YEAR_RE = re.compile(r'\b(before|after|in|during)\s+(?:the\s+)?(1[5-9]\d\d|20[0-2]\d)(s)?\b', re.I)
+_CENTURY_RE = re.compile(r'\b(?:in|during) the (19|20|21)(?:th|st) century\b', re.I)
+_LANGUAGE_RE = re.compile(r'\bin (' + '|'.join(LANGUAGE_CODES) + r')\b', re.I)
+_AUTHOR_RE = re.compile(r"\b(?:written|authored|penned) by ([A-Z][\w.'-]*(?: [A-Z][\w.'-]*)*)"
+                        r"|\bis the (?:author|writer) ([A-Z][\w.'-]*(?: [A-Z][\w.'-]*)*)")
+_SERIES_NAME_RE = re.compile(r"\b(?:the )?([A-Z][\w'-]+(?: [A-Z][\w'-]+)*) (?:series|books|stories)\b")
+_ABOUT_RE = re.compile(r"\b(?:about|feature|featuring|involve|starring) ([A-Z][\w'-]+(?: [A-Z][\w'-]+)*)")
+_PUBLISHER_RE = re.compile(r"\b(?:published|printed|brought out) by ([A-Z][\w.&'-]*(?: (?:[A-Z][\w.&'-]*|&|and|of))*)")
+_TITLE_WORD_RE = re.compile(r"\btitle (?:contain|include|have|mention|use)s? (?:the word |a word like )?[\"']?([\w ]+?)[\"']?\s*\??$", re.I)
+_SERIES_RE = re.compile(r'\bpart of a (?:series|trilogy|saga)\b', re.I)
+_POPULAR_RE = re.compile(r'\b(?:best-?sell\w*|very popular|widely read|famous|well[- ]known)\b', re.I)
+_RATED_RE = re.compile(r'\b(?:highly|well|critically) (?:rated|acclaimed|reviewed)\b', re.I)
+_GUESS_BOOK_RE = re.compile(r'Book:\s*(.+)')
+_DEMONYM_RE = re.compile(r'(?:ian|ese|ish|ali|can|ch)$')  # "Is the author Indian?" is not a name
+
+
+def answer_weight(answer: str) -> Optional[float]:
+    """Signed weight of an answer (None if it isn't one of the known answers)."""
+    text = ' '.join(answer.lower().split())
+    if text.startswith(REJECTION_ANSWER):
+        return REJECTED_WEIGHT
+    return ANSWER_WEIGHTS.get(text)
+
+
+def parse_question(question: str) -> Optional[tuple]:
+    """
+    Map a yes/no question onto a catalogue filter key, or None if it can't be checked locally.
+    Keys are hashable tuples so masks can be cached and shared between sessions.
+    """
+    text = _TAG_RE.sub('', question).strip()
+    if not text:
+        # A bare [GUESS] block: "no" means "not this book"
+        guess = _GUESS_BOOK_RE.search(question)
+        return ('match', guess.group(1).strip(), 1.0) if guess else None
+
+    m = _PAGES_MORE_RE.search(text)
+    if m:
+        return ('pages_gt', int(m.group(1) or m.group(2)), 1.0)
+    m = _PAGES_LESS_RE.search(text)
+    if m:
+        return ('pages_lt', int(m.group(1) or m.group(2)), 1.0)
+    if _LONG_RE.search(text):
+        return ('pages_gt', 400, 0.5)
+    if _SHORT_RE.search(text):
+        return ('pages_lt', 200, 0.5)
+
+    # The catalogue has edition dates, not first publication: trust them half as much
+    m = _CENTURY_RE.search(text)
+    if m:
+        start = (int(m.group(1)) - 1) * 100
+        return ('year_between', start, start + 99, 0.5)
+    m = _YEAR_RE.search(text)
+    if m and re.search(r'\b(?:publish|writ|releas|come out|came out|set)\w*', text, re.I):
+        when, year = m.group(1).lower(), int(m.group(2))
+        if when == 'before':
+            return ('year_between', 1, year - 1, 0.5)
+        if when == 'after':
+            return ('year_between', year + 1, 9999, 0.5)
+        return ('year_between', year, year + (9 if m.group(3) else 0), 0.5)
+
+    m = _LANGUAGE_RE.search(text)
+    # "Originally written in Bengali?" says nothing about the edition's language
+    if m and 'original' not in text.lower():
+        return ('language', LANGUAGE_CODES[m.group(1).lower()], 1.0)
+
+    m = _PUBLISHER_RE.search(text)
+    if m:
+        return ('publisher', m.group(1).strip(), 1.0)
+    m = _AUTHOR_RE.search(text)
+    if m:
+        name = m.group(1) or m.group(2)
+        if ' ' in name or not _DEMONYM_RE.search(name):
+            return ('match', name, 1.0)
+        return None
+    m = _TITLE_WORD_RE.search(text)
+    if m:
+        return ('match', m.group(1), 0.7)
+    m = _SERIES_NAME_RE.search(text) or _ABOUT_RE.search(text)
+    if m:
+        return ('match', m.group(1), 0.7)
+
+    if _SERIES_RE.search(text):
+        return ('series', 0.7)
+    if _POPULAR_RE.search(text):
+        return ('popular', 0.5)
+    if _RATED_RE.search(text):
+        return ('rating_ge', HIGH_RATING, 0.5)
+    return None
+
+
+_publisher_tokens: "weakref.WeakKeyDictionary[KnowledgeBase, list]" = weakref.WeakKeyDictionary()
+
+
+def matching_publishers(kb: KnowledgeBase, name: str) -> set[int]:
+    """Publisher ids whose name contains every token of `name` ("Penguin" matches "Penguin Classics")."""
+    wanted = set(tokenize(name))
+    if not wanted:
+        return set()
+    names = _publisher_tokens.get(kb)
+    if names is None:
+        names = _publisher_tokens[kb] = [frozenset(tokenize(p)) for p in kb.publisher_names]
+    return {pid for pid, tokens in enumerate(names) if wanted <= tokens}
+
+
+# Byte i of _BIT_BYTES[b] is bit i of b: expands a facet bitmap into one byte per row
+_BIT_BYTES = [bytes((b >> i) & 1 for i in range(8)) for b in range(256)]
+
+
+def _build_mask(kb: KnowledgeBase, key: tuple) -> Optional[bytearray]:
+    """The facet index's bitmap for the key as one 0/1 byte per row (the filters live in facet_index)."""
+    from facet_index import get_facet_index  # facet_index imports this module
+    bitmap = get_facet_index(kb).bitmap(key)
+    if bitmap is None:
+        return None
+    n = len(kb)
+    table = _BIT_BYTES
+    return bytearray(b''.join(table[b] for b in bitmap.to_bytes((n + 7) // 8, 'little'))[:n])
+
+
+# Masks depend only on the catalogue, so every session shares them
+_masks: "weakref.WeakKeyDictionary[KnowledgeBase, dict]" = weakref.WeakKeyDictionary()
+_masks_lock = threading.Lock()
+
+
+def get_mask(kb: KnowledgeBase, key: tuple) -> Optional[bytearray]:
+    with _masks_lock:
+        cache = _masks.setdefault(kb, {})
+    if key not in cache:
+        cache[key] = _build_mask(kb, key)
+    return cache[key]
+
+
+_priors: "weakref.WeakKeyDictionary[KnowledgeBase, array]" = weakref.WeakKeyDictionary()
+
+
+def _prior(kb: KnowledgeBase) -> array:
+    prior = _priors.get(kb)
+    if prior is None:
+        prior = _priors[kb] = array('f', (POPULARITY_WEIGHT * math.log10(c + 1) for c in kb.ratings_counts))
+    return prior
+
+
+class CandidateTracker:
+    """
+    Per-game scores over the catalogue. `observe(question, answer)` applies
+    the question's filter (if it has one) weighted by the answer; `shortlist()`
+    returns the best-scoring rows.
+    """
+
+    def __init__(self):
+        self.observations: list[tuple[str, str]] = []  # (question, answer), replayed on restore
+        self.applied = 0                                # observations that matched a filter
+        self._kb: Optional[KnowledgeBase] = None
+        self._scores: Optional[array] = None             # allocated on the first applied filter
+
+    def reset(self):
+        self.__init__()
+
+    def observe(self, kb: KnowledgeBase, question: str, answer: str) -> bool:
+        """Record an answer; returns True if it changed the scores."""
+        self.observations.append((question, answer))
+        found = self._filter(kb, question, answer)
+        if found is None:
+            return False
+        if self._kb is not kb or self._scores is None:
+            # First usable filter, or the CSV was reloaded: replay everything
+            self._rebuild(kb)
+        else:
+            self._add(*found)
+        return True
+
+    @staticmethod
+    def _filter(kb: KnowledgeBase, question: str, answer: str) -> Optional[tuple[bytearray, float]]:
+        """(mask, signed weight) for an answered question, or None if it tells us nothing locally."""
+        weight = answer_weight(answer)
+        key = parse_question(question) if weight and kb else None
+        mask = get_mask(kb, key[:-1]) if key else None
+        return (mask, weight * key[-1]) if mask is not None else None
+
+    def _add(self, mask: bytearray, weight: float):
+        scores = self._scores
+        for i, hit in enumerate(mask):
+            scores[i] += weight if hit else -weight
+        self.applied += 1
+
+    def _rebuild(self, kb: KnowledgeBase):
+        self._kb = kb
+        self._scores = array('f', _prior(kb))
+        self.applied = 0
+        for question, answer in self.observations:
+            found = self._filter(kb, question, answer)
+            if found is not None:
+                self._add(*found)
+        if not self.applied:
+            self._scores = None
+
+    def shortlist(self, n: int = SHORTLIST_SIZE) -> list[tuple[int, float]]:
+        """[(row, score)] for the n best-fitting books, best first (empty before any filter applied)."""
+        if not self.applied or self._scores is None:
+            return []
+        scores = self._scores
+        top = heapq.nlargest(n, range(len(scores)), key=scores.__getitem__)
+        return [(i, scores[i]) for i in top]
+
+    def prompt_block(self, n: int = SHORTLIST_SIZE) -> str:
+        """Compact [CANDIDATES] block for the prompt ('' when there is nothing useful to say)."""
+        top = self.shortlist(n)
+        if not top:
+            return ""
+        kb = self._kb
+        lines = []
+        for rank, (i, _) in enumerate(top, 1):
+            year = f", {kb.years[i]}" if kb.years[i] else ""
+            lines.append(f"{rank}. {kb.titles[i]} by {kb.authors(i).split('/')[0]} ({kb.num_pages[i]}p{year})")
+        block = "\n[CANDIDATES] (local catalogue books that fit the answers so far):\n" + "\n".join(lines)
+        if len(top) > 1 and top[0][1] - top[1][1] >= CONFIDENT_MARGIN:
+            block += "\nThe first candidate fits much better than the rest; consider guessing it."
+        return block + "\n[END CANDIDATES]"
+
+    def copy(self) -> "CandidateTracker":
+        """Independent tracker with the same scores (no replay of the observations)."""
+        tracker = CandidateTracker()
+        tracker.observations = list(self.observations)
+        tracker.applied = self.applied
+        tracker._kb = self._kb
+        tracker._scores = array('f', self._scores) if self._scores is not None else None
+        return tracker
+
+    def to_state(self) -> list:
+        return [list(o) for o in self.observations]
+
+    @classmethod
+    def from_state(cls, observations: list, kb: KnowledgeBase) -> "CandidateTracker":
+        tracker = cls()
+        tracker.observations = [tuple(o) for o in observations]
+        tracker._rebuild(kb)
+        return tracker
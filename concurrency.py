@@ -0,0 +1,109 @@
+"""
+Bookinator Concurrency Limiter
+Caps concurrent LLM calls and hands free slots to sessions round-robin,
+so one busy visitor can't starve the others.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Hashable, Optional
+
+from ollama_client import pool_urls
+
+# Concurrent requests allowed in front of Ollama (match OLLAMA_NUM_PARALLEL);
+# with an OLLAMA_URLS pool the default scales with the number of nodes
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get('BOOKINATOR_OLLAMA_CONCURRENCY', str(2 * max(1, len(pool_urls())))))
+
+
+class Ticket:
+    """A queued request; its event is set when it's granted a slot."""
+
+    __slots__ = ('key', 'event')
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.event = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.event.wait(timeout)
+
+
+class FairLimiter:
+    """
+    Semaphore with a fair queue: waiters are grouped per key (session) and
+    slots are granted round-robin across keys, FIFO within a key.
+    """
+
+    def __init__(self, limit: int = OLLAMA_MAX_CONCURRENCY):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._queues: "OrderedDict[Hashable, deque[Ticket]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def enqueue(self, key: Hashable) -> Optional[Ticket]:
+        """Take a slot now (returns None) or join the queue (returns a Ticket to wait on)."""
+        with self._lock:
+            if self.active < self.limit and not self._queues:
+                self.active += 1
+                return None
+            ticket = Ticket(key)
+            self._queues.setdefault(key, deque()).append(ticket)
+            return ticket
+
+    def cancel(self, ticket: Ticket):
+        """Leave the queue; if the slot was granted in the meantime, give it back."""
+        with self._lock:
+            queue = self._queues.get(ticket.key)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.key]
+                return
+        if ticket.event.is_set():
+            self.release()
+
+    def release(self):
+        """Free a slot, handing it straight to the next session in round-robin order."""
+        with self._lock:
+            if self._queues:
+                key, queue = next(iter(self._queues.items()))
+                ticket = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(key)
+                else:
+                    del self._queues[key]
+                ticket.event.set()
+            else:
+                self.active -= 1
+
+    def position(self, key: Hashable) -> int:
+        """1-based place of this key's first waiting request in grant order (0 if not queued)."""
+        with self._lock:
+            if key not in self._queues:
+                return 0
+            # Each key's first ticket is granted in key order (round-robin)
+            for position, k in enumerate(self._queues, 1):
+                if k == key:
+                    return position
+            return 0
+
+    @contextmanager
+    def slot(self, key: Hashable, timeout: Optional[float] = None):
+        """Hold a slot for the duration of the block (raises TimeoutError if not granted in time)."""
+        ticket = self.enqueue(key)
+        if ticket is not None and not ticket.wait(timeout):
+            self.cancel(ticket)
+            raise TimeoutError("Timed out waiting for a free LLM slot")
+        try:
+            yield
+        finally:
+            self.release()
+
+
+llm_limiter = FairLimiter()
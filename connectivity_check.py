@@ -46,7 +46,8 @@ for url in candidates:
 
 if success_url:
     print("\n🎉 FOUND OLLAMA!")
-    print(f"Please update OLLAMA_BASE_URL = \"{success_url}\" in 'llm_engine.py'")
+    print("Bookinator finds the common addresses automatically; for anything else run:")
+    print(f"  export OLLAMA_HOST={success_url}")
 else:
     print("\n❌ Could not connect to Ollama on any common address.")
     print("Please ensure Ollama is running on Windows and accepting connections.")
@@ -0,0 +1,122 @@
+"""
+Bookinator Context Budget
+Fast prompt-size estimate and priority packing of a chat request into a token
+budget. The system prompt, this turn's messages (answer, constraints,
+shortlist) and the most recent turns always go in; the oldest turns are
+folded into one-line "Q -> A" summaries until the request fits, and search
+snippets are clipped and dropped lowest-ranked first.
+"""
+
+import os
+from typing import Optional
+
+# Context window the requests are packed into (sent to Ollama as num_ctx)
+CONTEXT_TOKENS = int(os.environ.get('BOOKINATOR_CONTEXT_TOKENS', '4096'))
+RESPONSE_TOKENS = 384      # kept free for the reply (a [GUESS] or [FINAL] block)
+KEEP_RECENT_TURNS = 4      # question/answer pairs never folded, however tight the budget
+MESSAGE_OVERHEAD = 4       # chat-template tokens around each message (role header, end of turn)
+SNIPPET_CHARS = 240        # search snippets are clipped to this many characters
+MIN_SNIPPETS = 1           # search results kept even when they don't fit
+
+SUMMARY_HEADER = "[EARLIER QUESTIONS] (already asked):"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count estimate without a tokenizer: about 4 characters per token
+    for ASCII, and about one more token per non-ASCII character (Bengali
+    script, accents), counted through the UTF-8 continuation bytes.
+    """
+    extra = len(text.encode('utf-8')) - len(text)
+    return (len(text) + 3) // 4 + extra // 2
+
+
+def message_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in messages)
+
+
+def prompt_budget(context_tokens: Optional[int] = None) -> int:
+    """Tokens the request itself may use."""
+    return (context_tokens or CONTEXT_TOKENS) - RESPONSE_TOKENS
+
+
+def _question_line(content: str) -> str:
+    if '[GUESS]' in content:
+        for line in content.splitlines():
+            if line.strip().lower().startswith('book:'):
+                return f"Is it {line.split(':', 1)[1].strip()}?"
+        return ""
+    return content.split('[', 1)[0].strip().replace('\n', ' ')
+
+
+def fold_turns(history: list[dict], turns: int) -> tuple[list[str], list[dict]]:
+    """
+    Summarize the oldest `turns` questions as "- Q -> A" lines.
+    Returns (lines, kept history); the kept history starts with the answer to
+    the last folded question, so it still alternates user/assistant.
+    """
+    asked = [i for i, m in enumerate(history) if m['role'] == 'assistant'][:turns]
+    if not asked:
+        return [], history
+    lines = []
+    for i in asked:
+        question = _question_line(history[i]['content'])
+        answer = history[i + 1]['content'].split('\n', 1)[0].strip() if i + 1 < len(history) else '?'
+        if question:
+            lines.append(f"- {question} -> {answer}")
+    return lines, history[asked[-1] + 1:]
+
+
+def turns_to_fold(head: list[dict], history: list[dict], tail: list[dict], budget: int,
+                  keep_recent: int = KEEP_RECENT_TURNS) -> int:
+    """
+    Fewest oldest turns to fold so head + summary + history + tail fits the
+    budget (all the foldable ones if nothing less fits; 0 if it already fits).
+    """
+    fixed = message_tokens(head) + message_tokens(tail)
+    sizes = [estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in history]
+    if fixed + sum(sizes) <= budget:
+        return 0
+    asked = [i for i, m in enumerate(history) if m['role'] == 'assistant']
+    foldable = len(asked) - keep_recent
+    summary = estimate_tokens(SUMMARY_HEADER) + MESSAGE_OVERHEAD
+    for turns in range(1, foldable + 1):
+        i = asked[turns - 1]
+        answer = history[i + 1]['content'] if i + 1 < len(history) else '?'
+        # Each folded question costs its summary line instead of its messages
+        summary += estimate_tokens(_question_line(history[i]['content']) + answer.split('\n', 1)[0]) + 2
+        if fixed + summary + sum(sizes[i + 1:]) <= budget:
+            return turns
+    return max(foldable, 0)
+
+
+def pack(head: list[dict], history: list[dict], tail: list[dict], budget: int,
+         keep_recent: int = KEEP_RECENT_TURNS) -> tuple[list[dict], int]:
+    """
+    head + history + tail within the budget, folding the oldest turns into a
+    summary message after the head. Returns (messages, turns folded).
+    """
+    turns = turns_to_fold(head, history, tail, budget, keep_recent)
+    if not turns:
+        return head + history + tail, 0
+    lines, kept = fold_turns(history, turns)
+    summary = [{"role": "system", "content": SUMMARY_HEADER + "\n" + "\n".join(lines)}] if lines else []
+    return head + summary + kept + tail, turns
+
+
+def clip_results(results: list[dict], max_tokens: int) -> list[dict]:
+    """
+    Search hits (best first) clipped to SNIPPET_CHARS, dropping the
+    lowest-ranked ones that don't fit in max_tokens (keeping MIN_SNIPPETS).
+    """
+    kept, used = [], 0
+    for r in results:
+        snippet = r.get('snippet', '')
+        if len(snippet) > SNIPPET_CHARS:
+            r = dict(r, snippet=snippet[:SNIPPET_CHARS].rsplit(' ', 1)[0] + '...')
+        cost = estimate_tokens(f"{r.get('title', '')}: {r.get('snippet', '')}") + 4
+        if len(kept) >= MIN_SNIPPETS and used + cost > max_tokens:
+            break
+        kept.append(r)
+        used += cost
+    return kept
@@ -0,0 +1,245 @@
+"""
+Bookinator Facet Index
+One precomputed bitmap (a Python int, bit i = row i) per language, publisher,
+decade, page-count bucket and rating bucket of the local catalogue. A game's
+definite answers are applied as AND / AND NOT over those bitmaps, so the set
+of catalogue books still consistent with every answer is kept exactly, for
+the whole game, in microseconds per turn.
+"""
+
+import threading
+import weakref
+from array import array
+from typing import Optional
+
+from candidate_tracker import POPULAR_RATINGS, REJECTION_ANSWER, matching_publishers, parse_question
+from knowledge_base import KnowledgeBase
+from search_index import get_search_index
+
+# Bucket upper bounds; range queries take whole buckets and scan only the edge ones
+PAGE_BUCKETS = (50, 100, 150, 200, 250, 300, 350, 400, 500, 600, 800, 1000, 1500)
+RATING_BUCKETS = (2.0, 3.0, 3.5, 3.75, 4.0, 4.25, 4.5, 5.0)
+DECADE_BUCKETS = tuple(decade + 9 for decade in range(1900, 2030, 10))  # last year of each decade
+TOP_ENTRIES = 5
+MAX_CACHED_KEYS = 4096
+
+# Only definite answers prune the set; "probably" and "maybe" are left to the soft scores
+DEFINITE_ANSWERS = {'absolutely': True, 'yes': True, 'no': False, 'absolutely not': False}
+
+
+def _bitmap(rows, n: int) -> int:
+    bits = bytearray((n + 7) // 8)
+    for i in rows:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class _Buckets:
+    """Bitmaps of a numeric column split at fixed bounds, for range queries."""
+
+    def __init__(self, values, bounds: tuple, n: int):
+        self.values = values
+        self.bounds = bounds + (float('inf'),)
+        rows: list[list[int]] = [[] for _ in self.bounds]
+        for i, v in enumerate(values):
+            if v:  # 0 = unknown
+                rows[next(b for b, bound in enumerate(self.bounds) if v <= bound)].append(i)
+        self.rows = [array('I', r) for r in rows]
+        self.bitmaps = [_bitmap(r, n) for r in rows]
+        self.n = n
+
+    def range(self, lo: float, hi: float) -> int:
+        """Rows with lo <= value <= hi (unknown values never match)."""
+        result = 0
+        floor = 0.0
+        for rows, bitmap, bound in zip(self.rows, self.bitmaps, self.bounds):
+            if bound >= lo and floor <= hi:
+                if lo <= floor and bound <= hi:
+                    result |= bitmap                   # whole bucket inside the range
+                else:
+                    values = self.values
+                    result |= _bitmap((i for i in rows if lo <= values[i] <= hi), self.n)
+            floor = bound
+        return result
+
+
+class FacetIndex:
+    """Per-catalogue bitmaps plus the rows in descending ratings_count order."""
+
+    @property
+    def kb(self) -> KnowledgeBase:
+        # Weak: the index is the value of a WeakKeyDictionary keyed on this catalogue
+        return self._kb()
+
+    def __init__(self, kb: KnowledgeBase):
+        n = len(kb)
+        self._kb = weakref.ref(kb)
+        self.size = n
+        self.everything = (1 << n) - 1
+
+        def by_id(ids) -> dict[int, int]:
+            groups: dict[int, list[int]] = {}
+            for i, value in enumerate(ids):
+                groups.setdefault(value, []).append(i)
+            return {value: _bitmap(rows, n) for value, rows in groups.items()}
+
+        self.languages = by_id(kb.language_ids)      # language id -> bitmap
+        self.publishers = by_id(kb.publisher_ids)    # publisher id -> bitmap
+        self.decades = _Buckets(kb.years, DECADE_BUCKETS, n)
+        self.pages = _Buckets(kb.num_pages, PAGE_BUCKETS, n)
+        self.ratings = _Buckets(kb.average_ratings, RATING_BUCKETS, n)
+        self.series = _bitmap((i for i, t in enumerate(kb.titles) if '#' in t), n)
+        self.popular = _bitmap((i for i, c in enumerate(kb.ratings_counts) if c >= POPULAR_RATINGS), n)
+        self.by_popularity = array('I', sorted(range(n), key=kb.ratings_counts.__getitem__, reverse=True))
+        self._cache: dict[tuple, Optional[int]] = {}
+        self._cache_lock = threading.Lock()
+
+    def bitmap(self, key: tuple) -> Optional[int]:
+        """Bitmap for a candidate_tracker.parse_question key (without its reliability), or None."""
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+        bitmap = self._build(key)  # outside the lock: a 'match' key runs a search
+        with self._cache_lock:
+            if len(self._cache) >= MAX_CACHED_KEYS:
+                self._cache.clear()
+            self._cache[key] = bitmap
+        return bitmap
+
+    def _build(self, key: tuple) -> Optional[int]:
+        kind, kb = key[0], self.kb
+        if kind == 'pages_gt':
+            return self.pages.range(key[1] + 1, float('inf'))
+        if kind == 'pages_lt':
+            return self.pages.range(1, key[1] - 1)
+        if kind == 'year_between':
+            return self.decades.range(key[1], key[2])
+        if kind == 'language':
+            result = 0
+            for lid, code in enumerate(kb.language_codes):
+                if code in key[1]:
+                    result |= self.languages.get(lid, 0)
+            return result
+        if kind == 'publisher':
+            ids = matching_publishers(kb, key[1])
+            if not ids:
+                return None
+            result = 0
+            for pid in ids:
+                result |= self.publishers.get(pid, 0)
+            return result
+        if kind == 'match':
+            rows = get_search_index(kb).matching(key[1])
+            return _bitmap(rows, self.size) if rows else None
+        if kind == 'series':
+            return self.series
+        if kind == 'popular':
+            return self.popular
+        if kind == 'rating_ge':
+            return self.ratings.range(key[1], float('inf'))
+        return None
+
+    def top(self, bitmap: int, n: int = TOP_ENTRIES) -> list[int]:
+        """The n most-rated rows in the bitmap."""
+        bits = bitmap.to_bytes((self.size + 7) // 8, 'little')
+        found = []
+        for i in self.by_popularity:
+            if bits[i >> 3] >> (i & 7) & 1:
+                found.append(i)
+                if len(found) == n:
+                    break
+        return found
+
+
+_indexes: "weakref.WeakKeyDictionary[KnowledgeBase, FacetIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_facet_index(kb: KnowledgeBase) -> FacetIndex:
+    """Return the (lazily built, shared) facet index for a knowledge base."""
+    index = _indexes.get(kb)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(kb)
+            if index is None:
+                index = _indexes[kb] = FacetIndex(kb)
+    return index
+
+
+class FacetFilter:
+    """
+    Per-game surviving set. A definite answer to a question with a facet ANDs
+    the set with its bitmap (yes) or with its complement (no). An answer that
+    would leave nothing is recorded as a conflict and skipped, since the
+    catalogue's edition data can disagree with the player's book.
+    """
+
+    def __init__(self):
+        self.survivors: Optional[int] = None   # None = every catalogue book
+        self.applied: list[tuple] = []         # (key, included) in the order applied
+        self.conflicts: list[tuple] = []
+        self._kb: Optional[KnowledgeBase] = None
+
+    def observe(self, kb: KnowledgeBase, question: str, answer: str) -> bool:
+        """Apply an answered question; returns True if it narrowed the set."""
+        answer = ' '.join(answer.lower().split())
+        included = False if answer.startswith(REJECTION_ANSWER) else DEFINITE_ANSWERS.get(answer)
+        if included is None or not kb:
+            return False
+        key = parse_question(question)
+        if key is None:
+            return False
+        index = get_facet_index(kb)
+        bitmap = index.bitmap(key[:-1])
+        if bitmap is None:
+            return False
+        if self._kb is not kb:
+            # First facet answer, or the CSV was reloaded (old bitmaps don't line up): re-apply
+            self._kb, self.survivors = kb, index.everything
+            applied, self.applied = self.applied, []
+            for old_key, old_included in applied:
+                old_bitmap = index.bitmap(old_key)
+                if old_bitmap is not None:
+                    self._apply(old_key, old_bitmap, old_included)
+        return self._apply(key[:-1], bitmap, included)
+
+    def _apply(self, key: tuple, bitmap: int, included: bool) -> bool:
+        current = self.survivors
+        narrowed = current & bitmap if included else current & ~bitmap
+        if not narrowed:
+            self.conflicts.append((key, included))
+            return False
+        self.survivors = narrowed
+        self.applied.append((key, included))
+        return narrowed != current
+
+    def copy(self) -> "FacetFilter":
+        facets = FacetFilter()
+        facets.survivors = self.survivors   # ints are immutable; _apply rebinds it
+        facets.applied = list(self.applied)
+        facets.conflicts = list(self.conflicts)
+        facets._kb = self._kb
+        return facets
+
+    @classmethod
+    def replay(cls, kb: KnowledgeBase, observations: list) -> "FacetFilter":
+        """Rebuild from (question, answer) pairs (the candidate tracker's observations)."""
+        facets = cls()
+        for question, answer in observations:
+            facets.observe(kb, question, answer)
+        return facets
+
+    def summary(self, kb: KnowledgeBase, n: int = TOP_ENTRIES) -> Optional[dict]:
+        """Surviving count and most-rated survivors for the API, or None before any facet applied."""
+        if self.survivors is None or self._kb is not kb:
+            return None
+        index = get_facet_index(kb)
+        return {
+            'remaining': self.survivors.bit_count(),
+            'total': index.size,
+            'top': [{
+                'title': kb.titles[i],
+                'author': kb.authors(i).split('/')[0],
+                'ratings_count': kb.ratings_counts[i],
+            } for i in index.top(self.survivors, n)],
+        }
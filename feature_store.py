@@ -0,0 +1,249 @@
+"""
+Bookinator Feature Store
+Compiles data/books.csv (plus an optional curated question list) into a
+versioned, memory-mappable book x feature matrix for ml_engine.
+
+    python feature_store.py compile [--csv data/books.csv] [--questions data/questions.json]
+
+The artifact is a directory of .npy arrays (CSC matrix + precomputed norms,
+means and bit-packed columns) and a small meta.json. Opening it maps the
+arrays read-only, so startup takes milliseconds and worker processes share
+the same pages. Each compile writes a new sibling directory and then swaps
+the store path (a symlink) over to it, so files a running worker has mapped
+are never rewritten.
+"""
+
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from typing import Optional, Sequence
+
+import numpy as np
+
+from knowledge_base import BOOKS_CSV_PATH, KnowledgeBase
+
+FEATURE_STORE_DIR = "data/feature_store"
+FEATURE_STORE_VERSION = 1
+KEEP_BUILDS = 2  # compiled directories kept (the live one and the one before, which workers may still be opening)
+
+# Minimum books sharing a value before it becomes a question
+MIN_AUTHOR_BOOKS = 8
+MIN_PUBLISHER_BOOKS = 25
+MIN_LANGUAGE_BOOKS = 5
+
+# Cumulative thresholds ask "longer than / after / above" rather than one-hot buckets
+PAGE_THRESHOLDS = (150, 300, 500, 800)
+YEAR_THRESHOLDS = (1950, 1980, 1995, 2005)
+RATING_THRESHOLDS = (3.5, 4.0, 4.3)
+
+# Regional variants fold into one language question
+LANGUAGE_GROUPS = {'en-US': 'eng', 'en-GB': 'eng', 'en-CA': 'eng', 'enm': 'eng'}
+LANGUAGE_NAMES = {
+    'eng': 'English', 'spa': 'Spanish', 'fre': 'French', 'ger': 'German', 'jpn': 'Japanese',
+    'mul': 'several languages', 'zho': 'Chinese', 'grc': 'Ancient Greek', 'por': 'Portuguese',
+    'ita': 'Italian', 'ben': 'Bengali',
+}
+
+_ARRAYS = ('data', 'indices', 'indptr', 'norms', 'means', 'bits')
+
+
+def _slug(text: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in text.lower()).strip('_')
+
+
+def derive_features(kb: KnowledgeBase) -> tuple[list[list[str]], dict[str, str]]:
+    """Feature names per book, and a default question text per feature."""
+    n = len(kb)
+    languages = [LANGUAGE_GROUPS.get(kb.language_code(i), kb.language_code(i)) for i in range(n)]
+    authors = [kb.authors(i).split('/')[0].strip() for i in range(n)]  # first author, not illustrators
+    publishers = [kb.publisher(i).strip() for i in range(n)]
+
+    language_counts = Counter(languages)
+    author_counts = Counter(authors)
+    publisher_counts = Counter(publishers)
+
+    texts: dict[str, str] = {}
+    per_book: list[list[str]] = []
+    for i in range(n):
+        features = []
+        lang = languages[i]
+        # Junk codes (ISBNs in the language column) never reach the support threshold
+        if lang and language_counts[lang] >= MIN_LANGUAGE_BOOKS:
+            name = f"lang_{_slug(lang)}"
+            texts.setdefault(name, f"Is the book written in {LANGUAGE_NAMES.get(lang, lang)}?")
+            features.append(name)
+
+        for pages in PAGE_THRESHOLDS:
+            if kb.num_pages[i] > pages:
+                name = f"pages_over_{pages}"
+                texts.setdefault(name, f"Is it longer than {pages} pages?")
+                features.append(name)
+
+        year = kb.years[i]
+        for threshold in YEAR_THRESHOLDS:
+            if year and year >= threshold:
+                name = f"published_after_{threshold}"
+                texts.setdefault(name, f"Was this edition published in {threshold} or later?")
+                features.append(name)
+
+        for rating in RATING_THRESHOLDS:
+            if kb.average_ratings[i] >= rating:
+                name = f"rating_above_{rating:g}".replace('.', '_')
+                texts.setdefault(name, f"Is it rated {rating:g} stars or higher on average?")
+                features.append(name)
+
+        if author_counts[authors[i]] >= MIN_AUTHOR_BOOKS:
+            name = f"author_{_slug(authors[i])}"
+            texts.setdefault(name, f"Was it written by {authors[i]}?")
+            features.append(name)
+
+        if publishers[i] and publisher_counts[publishers[i]] >= MIN_PUBLISHER_BOOKS:
+            name = f"publisher_{_slug(publishers[i])}"
+            texts.setdefault(name, f"Is this edition published by {publishers[i]}?")
+            features.append(name)
+
+        per_book.append(features)
+    return per_book, texts
+
+
+def compile_store(csv_path: str = BOOKS_CSV_PATH, questions_path: Optional[str] = None,
+                  out_dir: str = FEATURE_STORE_DIR) -> dict:
+    """Build the artifact from the CSV; returns its metadata."""
+    from scipy import sparse
+    from ml_engine import BookinatorEngine
+
+    started = time.perf_counter()
+    kb = KnowledgeBase.from_csv(csv_path)
+    per_book, texts = derive_features(kb)
+
+    # Curated wording wins; curated features the CSV can't derive are skipped
+    questions = {name: {'feature': name, 'text': text} for name, text in texts.items()}
+    if questions_path:
+        with open(questions_path, 'r', encoding='utf-8') as f:
+            for q in json.load(f):
+                if q['feature'] in questions:
+                    questions[q['feature']] = q
+                else:
+                    print(f"DEBUG: Skipping curated question for unknown feature {q['feature']!r}")
+    questions = [questions[name] for name in sorted(questions)]
+
+    feature_names = [q['feature'] for q in questions]
+    column = {name: j for j, name in enumerate(feature_names)}
+    rows = [i for i, features in enumerate(per_book) for _ in features]
+    cols = [column[name] for features in per_book for name in features]
+    matrix = sparse.csc_matrix(
+        (np.ones(len(rows), dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+        shape=(len(kb), len(feature_names)))
+
+    # Let the engine derive norms/means/bits so the store always matches its own math
+    books = [{'id': kb.book_ids[i], 'title': kb.titles[i], 'authors': kb.authors(i)} for i in range(len(kb))]
+    engine = BookinatorEngine.from_matrix(matrix, questions, books)
+    arrays = {
+        'data': engine.book_vectors.data, 'indices': engine.book_vectors.indices,
+        'indptr': engine.book_vectors.indptr, 'norms': engine.book_norms, 'means': engine.feature_means,
+        'bits': engine.feature_bits if engine.feature_bits is not None else np.zeros((0, 0), dtype=np.uint64),
+    }
+
+    out_dir = os.path.normpath(out_dir)
+    build_dir = f"{out_dir}.{time.time_ns()}"
+    os.makedirs(build_dir)
+    for name, values in arrays.items():
+        np.save(os.path.join(build_dir, f"{name}.npy"), np.ascontiguousarray(values))
+    meta = {
+        'version': FEATURE_STORE_VERSION,
+        'created': time.time(),
+        'source': {'csv': csv_path, 'mtime': kb.mtime, 'questions': questions_path},
+        'shape': [len(kb), len(feature_names)],
+        'questions': questions,
+        'books': {key: [b[key] for b in books] for key in ('id', 'title', 'authors')},
+    }
+    # meta.json is written last: its presence marks a complete artifact
+    with open(os.path.join(build_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+    _swap_in(build_dir, out_dir)
+
+    print(f"DEBUG: Compiled {len(kb)} books x {len(feature_names)} features "
+          f"({matrix.nnz} entries) into {out_dir} in {time.perf_counter() - started:.2f}s")
+    return meta
+
+
+def _swap_in(build_dir: str, out_dir: str):
+    """Point out_dir at a finished build in one atomic rename, then prune old builds."""
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # A store compiled before builds were versioned: move it aside once (not atomic)
+        os.replace(out_dir, f"{out_dir}.0")
+    link = f"{out_dir}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    try:
+        os.symlink(os.path.basename(build_dir), link, target_is_directory=True)
+    except OSError as e:
+        # No symlinks on this platform: swap the directories (readers may briefly miss the store)
+        print(f"DEBUG: Cannot symlink the feature store ({e}); renaming it into place instead.")
+        if os.path.lexists(out_dir):
+            os.replace(out_dir, f"{out_dir}.{time.time_ns()}")
+        os.replace(build_dir, out_dir)
+        return
+    os.replace(link, out_dir)
+
+    parent, prefix = os.path.split(out_dir)
+    builds = sorted((name for name in os.listdir(parent or '.')
+                     if name.startswith(os.path.basename(prefix) + '.') and name.rsplit('.', 1)[1].isdigit()),
+                    key=lambda name: int(name.rsplit('.', 1)[1]))
+    for name in builds[:-KEEP_BUILDS]:
+        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+class StoredBooks(Sequence):
+    """Read-only book list backed by the column arrays in meta.json (dicts built on access)."""
+
+    def __init__(self, columns: dict):
+        self._columns = columns
+        self._keys = tuple(columns)
+
+    def __len__(self) -> int:
+        return len(self._columns['id'])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {key: self._columns[key][i] for key in self._keys}
+
+
+class FeatureStore:
+    """An opened artifact: memory-mapped arrays plus its metadata."""
+
+    def __init__(self, path: str = FEATURE_STORE_DIR):
+        # Resolve the link once so meta and arrays come from the same build, even mid-swap
+        path = os.path.realpath(path)
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FEATURE_STORE_VERSION:
+            raise ValueError(f"Feature store {path} is version {meta.get('version')}, "
+                             f"expected {FEATURE_STORE_VERSION}; re-run `python feature_store.py compile`")
+        self.path = path
+        self.meta = meta
+        self.shape = tuple(meta['shape'])
+        self.questions = meta['questions']
+        self.books = StoredBooks(meta['books'])
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+
+
+def store_exists(path: str = FEATURE_STORE_DIR) -> bool:
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the ml_engine feature store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('compile', help="derive features from books.csv")
+    build.add_argument('--csv', default=BOOKS_CSV_PATH)
+    build.add_argument('--questions', help="curated questions JSON: [{\"feature\": ..., \"text\": ...}]")
+    build.add_argument('--out', default=FEATURE_STORE_DIR)
+    args = parser.parse_args()
+
+    compile_store(args.csv, args.questions, args.out)
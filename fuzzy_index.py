@@ -0,0 +1,178 @@
+"""
+Bookinator Fuzzy Index
+Character-trigram index over the catalogue's titles (with and without their
+series tag, e.g. "(Harry Potter  #6)") and author names, used to check an
+LLM guess such as "Sonar Kella by Ray" against the books that actually exist.
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+import weakref
+from typing import Optional
+
+import numpy as np
+
+from knowledge_base import KnowledgeBase
+
+# Dice similarity of the trigram sets; a guess scoring under MIN_SCORE matches nothing
+MIN_SCORE = 0.3
+VERIFIED_SCORE = 0.6       # at or above this the guess is taken to name a catalogue book
+CLOSE_SCORE = 0.45         # below this the "closest" book is just shared letters, not a variant of the guess
+TITLE_WEIGHT = 0.75        # title vs author share of the combined score (when the guess names an author)
+CANDIDATE_TITLES = 16      # best title entries re-scored with the author
+
+_SERIES_TAG_RE = re.compile(r'\s*\(([^)]*#[^)]*)\)\s*$')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+
+def _normalize(text: str) -> str:
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_ALNUM_RE.sub(' ', text.lower()).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of the normalized text, padded so word starts and ends count."""
+    text = _normalize(text)
+    if not text:
+        return set()
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def split_guess(guess: str) -> tuple[str, str]:
+    """'Title by Author' -> (title, author); author is '' when the guess doesn't name one."""
+    guess = guess.strip().strip('"*').strip()
+    title, sep, author = guess.rpartition(' by ')
+    if not sep or not title:
+        return guess, ''
+    return title.strip().strip('"'), author.strip()
+
+
+class FuzzyIndex:
+    """
+    Trigram postings over title entries (the full title, and the title
+    without its series tag) plus one trigram set per distinct author name.
+    A lookup counts shared trigrams for every entry at once (one bincount over
+    the query grams' postings), so its cost doesn't depend on the catalogue's
+    Python object count.
+    """
+
+    @property
+    def kb(self) -> KnowledgeBase:
+        # Weak: the index is the value of a WeakKeyDictionary keyed on this catalogue
+        return self._kb()
+
+    def __init__(self, kb: KnowledgeBase):
+        self._kb = weakref.ref(kb)
+        rows: list[int] = []     # title entry -> catalogue row
+        sizes: list[int] = []    # title entry -> number of distinct trigrams
+        postings: dict[str, list[int]] = {}
+        for i, title in enumerate(kb.titles):
+            variants = {title}
+            tag = _SERIES_TAG_RE.search(title)
+            if tag:
+                variants.add(title[:tag.start()])
+            for variant in variants:
+                grams = trigrams(variant)
+                if not grams:
+                    continue
+                entry = len(rows)
+                rows.append(i)
+                sizes.append(len(grams))
+                for g in grams:
+                    postings.setdefault(g, []).append(entry)
+        self.entry_rows = np.asarray(rows, dtype=np.int32)
+        self._sizes = np.asarray(sizes, dtype=np.float32)
+        self._postings = {g: np.asarray(entries, dtype=np.int32) for g, entries in postings.items()}
+
+        # Authors are interned in the knowledge base: one gram set per name, shared by its rows
+        self._author_grams = [[frozenset(trigrams(name)) for name in names.split('/') if name.strip()]
+                              for names in kb.author_names]
+
+    def _title_candidates(self, grams: set) -> list[tuple[float, int]]:
+        """(Dice score, entry) for the CANDIDATE_TITLES entries closest to the title grams."""
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._sizes))
+        scores = 2 * shared / (len(grams) + self._sizes)
+        n = min(CANDIDATE_TITLES, len(scores))
+        best = np.argpartition(-scores, n - 1)[:n]
+        return [(float(scores[e]), int(e)) for e in best if scores[e] >= MIN_SCORE]
+
+    def author_score(self, row: int, author: str) -> float:
+        """Best similarity between `author` and any of the row's authors."""
+        grams = trigrams(author)
+        return max((_dice(grams, g) for g in self._author_grams[self.kb.author_ids[row]]), default=0.0)
+
+    def match(self, guess: str, k: int = 3) -> list[dict]:
+        """
+        Catalogue books closest to a guessed 'Title by Author', best first:
+        [{'row', 'title', 'author', 'score'}] with score in [0, 1].
+        """
+        title, author = split_guess(guess)
+        grams = trigrams(title)
+        if not grams:
+            return []
+        kb = self.kb
+        scored: dict[int, float] = {}
+        for title_score, entry in self._title_candidates(grams):
+            row = int(self.entry_rows[entry])
+            score = title_score
+            if author:
+                score = TITLE_WEIGHT * title_score + (1 - TITLE_WEIGHT) * self.author_score(row, author)
+            if score >= MIN_SCORE and score > scored.get(row, 0.0):
+                scored[row] = score
+        counts = kb.ratings_counts
+        top = heapq.nlargest(k, scored, key=lambda r: (scored[r], counts[r]))
+        return [{
+            'row': r,
+            'title': kb.titles[r],
+            'author': kb.authors(r).split('/')[0],
+            'score': round(scored[r], 3),
+        } for r in top]
+
+    def best(self, guess: str) -> Optional[dict]:
+        """
+        The closest book as the API reports it ('verified' when the score
+        reaches VERIFIED_SCORE), or None. An unverified book is only reported
+        as a near miss: it scores CLOSE_SCORE and is by the guessed author.
+        """
+        found = self.match(guess, k=1)
+        if not found:
+            return None
+        top = found[0]
+        if top['score'] < VERIFIED_SCORE:
+            author = split_guess(guess)[1]
+            if top['score'] < CLOSE_SCORE or (author and self.author_score(top['row'], author) < VERIFIED_SCORE):
+                return None
+        return {
+            'title': top['title'],
+            'author': top['author'],
+            'book_id': self.kb.book_ids[top['row']],
+            'score': top['score'],
+            'verified': top['score'] >= VERIFIED_SCORE,
+        }
+
+
+_indexes: "weakref.WeakKeyDictionary[KnowledgeBase, FuzzyIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_fuzzy_index(kb: KnowledgeBase) -> FuzzyIndex:
+    """Return the (lazily built, shared) fuzzy index for a knowledge base."""
+    index = _indexes.get(kb)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(kb)
+            if index is None:
+                index = _indexes[kb] = FuzzyIndex(kb)
+    return index
@@ -0,0 +1,192 @@
+"""
+Bookinator Knowledge Base
+Process-wide, read-only view of data/books.csv stored column by column.
+"""
+
+import csv
+import os
+import sys
+import threading
+from array import array
+from typing import Iterator, Optional
+
+BOOKS_CSV_PATH = "data/books.csv"
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value: str) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_year(date: str) -> int:
+    """Extract the year from an 'M/D/YYYY' publication date (0 if unknown)."""
+    try:
+        year = int(date.rsplit('/', 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
+    return year if 0 < year < 10000 else 0
+
+
+class KnowledgeBase:
+    """
+    Immutable, column-oriented copy of the book catalogue.
+
+    Strings that repeat a lot (authors, publishers, language codes) are
+    interned into small lookup tables and referenced by index; numeric
+    columns live in compact `array` buffers instead of per-row dicts.
+    """
+
+    def __init__(self, path: str, mtime: Optional[float] = None):
+        self.path = path
+        self.mtime = mtime
+
+        self.book_ids = array('I')
+        self.titles: tuple[str, ...] = ()
+        self.publication_dates: tuple[str, ...] = ()
+        self.years = array('H')
+        self.average_ratings = array('f')
+        self.num_pages = array('I')
+        self.ratings_counts = array('I')
+        self.text_reviews_counts = array('I')
+
+        # Interned string tables + per-row indices into them
+        self.author_names: tuple[str, ...] = ()
+        self.author_ids = array('I')
+        self.publisher_names: tuple[str, ...] = ()
+        self.publisher_ids = array('I')
+        self.language_codes: tuple[str, ...] = ()
+        self.language_ids = array('H')
+
+    @classmethod
+    def from_csv(cls, path: str = BOOKS_CSV_PATH) -> "KnowledgeBase":
+        """Parse the CSV once into columns."""
+        kb = cls(path, os.path.getmtime(path))
+        titles, dates = [], []
+        author_names, publisher_names, language_codes = [], [], []
+        authors: dict[str, int] = {}
+        publishers: dict[str, int] = {}
+        languages: dict[str, int] = {}
+
+        def intern(table: dict[str, int], names: list[str], value: str) -> int:
+            idx = table.get(value)
+            if idx is None:
+                idx = table[value] = len(names)
+                names.append(sys.intern(value))
+            return idx
+
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            reader = csv.reader(f)
+            header = [h.strip() for h in next(reader, [])]
+            col = {name: i for i, name in enumerate(header)}
+            width = len(header)
+
+            def field(row: list[str], name: str) -> str:
+                i = col.get(name)
+                return row[i] if i is not None and i < len(row) else ''
+
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < width:
+                    row = row + [''] * (width - len(row))
+                kb.book_ids.append(_to_int(field(row, 'bookID')))
+                titles.append(field(row, 'title'))
+                date = field(row, 'publication_date')
+                dates.append(date)
+                kb.years.append(_parse_year(date))
+                kb.average_ratings.append(_to_float(field(row, 'average_rating')))
+                kb.num_pages.append(_to_int(field(row, 'num_pages')))
+                kb.ratings_counts.append(_to_int(field(row, 'ratings_count')))
+                kb.text_reviews_counts.append(_to_int(field(row, 'text_reviews_count')))
+                kb.author_ids.append(intern(authors, author_names, field(row, 'authors')))
+                kb.publisher_ids.append(intern(publishers, publisher_names, field(row, 'publisher')))
+                kb.language_ids.append(intern(languages, language_codes, field(row, 'language_code')))
+
+        kb.titles = tuple(titles)
+        kb.publication_dates = tuple(dates)
+        kb.author_names = tuple(author_names)
+        kb.publisher_names = tuple(publisher_names)
+        kb.language_codes = tuple(language_codes)
+        return kb
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __bool__(self) -> bool:
+        return len(self.titles) > 0
+
+    def authors(self, i: int) -> str:
+        return self.author_names[self.author_ids[i]]
+
+    def publisher(self, i: int) -> str:
+        return self.publisher_names[self.publisher_ids[i]]
+
+    def language_code(self, i: int) -> str:
+        return self.language_codes[self.language_ids[i]]
+
+    def row(self, i: int) -> dict:
+        """Materialize a single book as a dict (same keys as the CSV header)."""
+        return {
+            'bookID': str(self.book_ids[i]),
+            'title': self.titles[i],
+            'authors': self.authors(i),
+            'average_rating': f"{self.average_ratings[i]:.2f}",
+            'language_code': self.language_code(i),
+            'num_pages': str(self.num_pages[i]),
+            'ratings_count': str(self.ratings_counts[i]),
+            'text_reviews_count': str(self.text_reviews_counts[i]),
+            'publication_date': self.publication_dates[i],
+            'publisher': self.publisher(i),
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+
+# Process-wide shared instance, keyed on the CSV's mtime
+_shared_kb: Optional[KnowledgeBase] = None
+_shared_lock = threading.Lock()
+
+
+def get_knowledge_base(path: str = BOOKS_CSV_PATH) -> KnowledgeBase:
+    """
+    Return the shared knowledge base, (re)loading it if the CSV changed.
+    Returns an empty KnowledgeBase if the file is missing or unreadable.
+    """
+    global _shared_kb
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    kb = _shared_kb
+    if kb is not None and kb.path == path and kb.mtime == mtime:
+        return kb
+
+    with _shared_lock:
+        kb = _shared_kb
+        if kb is not None and kb.path == path and kb.mtime == mtime:
+            return kb
+
+        if mtime is None:
+            print(f"DEBUG: No local knowledge base found at {path}")
+            kb = KnowledgeBase(path)
+        else:
+            try:
+                kb = KnowledgeBase.from_csv(path)
+                print(f"DEBUG: Loaded {len(kb)} books from knowledge base.")
+            except Exception as e:
+                print(f"ERROR: Failed to load KB: {e}")
+                kb = KnowledgeBase(path, mtime)
+        _shared_kb = kb
+        return kb
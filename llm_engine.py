@@ -5,15 +5,66 @@ Uses Ollama for local LLM and DuckDuckGo for web search.
 
 import requests
 import json
-import csv
-import os
-from typing import Optional
-from ddgs import DDGS 
+import re
+import secrets
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Iterator, Optional
+from ddgs import DDGS
+from knowledge_base import BOOKS_CSV_PATH, KnowledgeBase, get_knowledge_base
+from search_index import get_search_index
+from search_cache import get_search_cache
+from candidate_tracker import CandidateTracker
+from context_budget import (CONTEXT_TOKENS, SUMMARY_HEADER, clip_results, fold_turns, message_tokens, pack,
+                            prompt_budget, turns_to_fold)
+from facet_index import FacetFilter
+from fuzzy_index import get_fuzzy_index
+from opening_book import get_opening_book, prompt_fingerprint
+from speculation import SPECULATE, speculator
+from ollama_client import COALESCE, READ_TIMEOUT, Abandoned, Flight, client as ollama, coalescer
+from concurrency import llm_limiter
+from metrics import (errors_total, first_token_seconds, folded_turns_total, prompt_tokens, queue_seconds,
+                     record_ollama, span, span_seconds, turn_seconds)
 
 # Configuration
 OLLAMA_BASE_URL = "http://127.0.0.1:11434"
 DEFAULT_MODEL = "llama3.2" 
-BOOKS_CSV_PATH = "data/books.csv"
+OLLAMA_KEEP_ALIVE = "30m"  # keep the model (and its prompt cache) loaded between turns
+QUEUE_TIMEOUT = 120        # seconds to wait for a free LLM slot (see concurrency.llm_limiter)
+QUEUE_POLL_INTERVAL = 1.0  # seconds between queue-position updates while streaming
+TIMINGS_KEPT = 64          # per-call Ollama timings kept per engine (a whole game, searches included)
+
+# Prefix-cache mode: the prompt only ever grows at the end, so Ollama can reuse
+# the KV cache of the previous turn. Past HISTORY_MAX_TURNS the oldest
+# HISTORY_COMPACT_TURNS Q&A pairs are folded into a rolling summary (in one chunk,
+# so the cached prefix is only invalidated once per compaction).
+PREFIX_CACHE = True
+HISTORY_MAX_TURNS = 12
+HISTORY_COMPACT_TURNS = 6
+
+# Response cleanup (see _clean_response)
+_MARKDOWN_RE = re.compile(r'\*\*|__|\*|_')
+_QUESTION_PREFIX_RE = re.compile(r'^(Question \d+|Category):?\s*', re.IGNORECASE)
+_PREAMBLE_RE = re.compile(r"^Here'?s my.*?question:?\s*", re.IGNORECASE)
+
+# Hybrid search: local and web lookups run concurrently; whatever has arrived by
+# SEARCH_DEADLINE is used. A local hit matching every query term with at least
+# LOCAL_CONFIDENT_SCORE (BM25) is trusted on its own and the web call is skipped.
+SEARCH_DEADLINE = 4.0  # seconds
+WEB_SEARCH_TIMEOUT = 5  # seconds a DuckDuckGo request may run, so abandoned lookups don't hold web workers
+LOCAL_CONFIDENT_SCORE = 10.0
+
+# Serve the first turns from the precomputed opening book when it matches (see opening_book.py)
+OPENING_BOOK = True
+START_MESSAGE = "Game Start. Ask the first Yes/No question about the book's language or format."
+
+# Background workers for searches dispatched mid-stream, and a separate pool for the web half
+# of every search: a search task must never wait on work queued behind it in its own pool
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bookinator-search")
+_web_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bookinator-web")
+# Finishes shared replies whose leading caller hung up (see _lead_stream), off the caller's thread
+_drain_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bookinator-drain")
 
 SYSTEM_PROMPT = """You are Bookinator, an AI Quiz Host at the **Kolkata Book Fair (Boimela)**.
 YOUR GOAL: Guess the visitor's book.
@@ -55,6 +106,10 @@ If the user says "No" to a specifically confused entity (e.g. they say No to "Is
 
 SEARCHING:
 Use [SEARCH: query] for silent searches.
+
+CANDIDATE SHORTLIST:
+A [CANDIDATES] block may follow the user's answer. It lists books from the local catalogue that best fit the answers so far (it can be incomplete).
+Ask questions that split these candidates, and guess early when one clearly fits.
 """
 
 FINAL_TURN_PROMPT = """
@@ -69,148 +124,461 @@ Format strictly as:
 Do not add any other text.
 """
 
+class StreamParser:
+    """
+    Incremental parser for a streamed LLM reply.
+
+    Text before the first tag is passed through as visible question text;
+    everything from the first '[' on is held back, since it is a [GUESS],
+    [FINAL], [INFO] or [SEARCH: ...] block. A [SEARCH: query] is reported
+    as soon as its closing ']' arrives.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._emitted = 0        # chars of visible text already emitted
+        self._in_tags = False    # seen a '[' → stop emitting visible text
+        self._search_done = False
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def feed(self, piece: str) -> list[tuple[str, str]]:
+        """Consume a delta; return new ('token', text) / ('search', query) events."""
+        self._parts.append(piece)
+        events = []
+        text = self.text
+        
+        if not self._in_tags:
+            bracket = text.find('[', self._emitted)
+            visible_end = len(text) if bracket == -1 else bracket
+            if bracket != -1:
+                self._in_tags = True
+            delta = _MARKDOWN_RE.sub('', text[self._emitted:visible_end])
+            self._emitted = visible_end
+            if delta:
+                events.append(('token', delta))
+        
+        if self._in_tags and not self._search_done:
+            start = text.find('[SEARCH:')
+            if start != -1:
+                end = text.find(']', start + 8)
+                if end != -1:
+                    self._search_done = True
+                    query = text[start + 8:end].strip()
+                    if query:
+                        events.append(('search', query))
+        return events
+
+
 class BookinatorLLM:
-    def __init__(self, model: str = DEFAULT_MODEL):
+    def __init__(self, model: str = DEFAULT_MODEL, prefix_cache: bool = PREFIX_CACHE,
+                 context_tokens: int = CONTEXT_TOKENS):
         self.model = model
+        self.prefix_cache = prefix_cache
+        self.context_tokens = context_tokens  # requests are packed to fit (see context_budget)
         self.conversation_history: list[dict] = []
         self.rejected_books: list[str] = []
         self.constraints: list[str] = []
         
-        try:
-            self.search_client = DDGS()
-        except:
-            self.search_client = None
-            
-        # Load Knowledge Base
-        self.knowledge_base = self._load_knowledge_base()
-            
-        # Auto-discover Ollama URL
-        self.base_url = self._find_ollama_url()
-        print(f"DEBUG: Using Ollama URL: {self.base_url}")
-
-    def _load_knowledge_base(self) -> list[dict]:
-        """Load books from CSV into memory."""
-        kb = []
-        if os.path.exists(BOOKS_CSV_PATH):
-            try:
-                with open(BOOKS_CSV_PATH, 'r', encoding='utf-8', errors='replace') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        kb.append(row)
-                print(f"DEBUG: Loaded {len(kb)} books from knowledge base.")
-            except Exception as e:
-                print(f"ERROR: Failed to load KB: {e}")
-        else:
-            print(f"DEBUG: No local knowledge base found at {BOOKS_CSV_PATH}")
-        return kb
-
-    def _find_ollama_url(self) -> str:
-        """Try to find where Ollama is running."""
-        candidates = [
-            "http://127.0.0.1:11434",
-            "http://localhost:11434",
-            "http://host.docker.internal:11434"
-        ]
-        for url in candidates:
+        # Prefix-cache mode bookkeeping
+        self.history_summary: list[str] = []  # "Q -> A" lines folded out of the history
+        self.summarized_turns = 0             # assistant turns folded into the summary
+        self.sent_constraints = 0             # constraints already sent to the model
+        self.sent_rejected = 0                # rejected books already sent to the model
+        
+        # Answers mapped onto catalogue filters -> live shortlist for the prompt
+        self.candidates = CandidateTracker()
+        # ... and the exact set of catalogue books every definite answer still allows
+        self.facets = FacetFilter()
+        # Note on the last guess when it named no catalogue book, sent with the next answer
+        self.guess_check: Optional[str] = None
+        
+        # Position in the opening book ([answer, variant] steps); None once off the book
+        self.opening_path: Optional[list] = []
+        
+        # Background pre-generation of the next turn (see speculation.py); never serialized
+        self.speculative = SPECULATE
+        self._speculation: dict = {}
+        self.web_search = True  # False on speculative forks: only cached web results are used
+        
+        # Ollama's own per-call timings (prompt eval vs generation), for measurement
+        self.timings: deque[dict] = deque(maxlen=TIMINGS_KEPT)
+        self.prompt_tokens = 0    # estimated size of the last request, logged with its timings
+        self.turn_source = 'llm'  # where the last turn's reply came from ('llm' or 'opening_book'), for metrics
+        # Routing key for the Ollama pool: keeps a game on the node holding its prompt cache
+        self.affinity = secrets.token_hex(8)
+        
+        # Created on first search (searches are disabled for the first 5 turns)
+        self._search_client = None
+        self._search_client_ready = False
+
+    @property
+    def base_url(self) -> str:
+        """Ollama URL, discovered once per process or picked from the pool (see ollama_client)."""
+        return ollama.base_url
+
+    @property
+    def search_client(self) -> Optional[DDGS]:
+        if not self._search_client_ready:
             try:
-                requests.get(f"{url}/api/tags", timeout=1)
-                return url
+                self._search_client = DDGS(timeout=WEB_SEARCH_TIMEOUT)
             except:
-                continue
-        return "http://127.0.0.1:11434"
-        
+                self._search_client = None
+            self._search_client_ready = True
+        return self._search_client
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        """Shared, load-once catalogue (reloaded automatically if the CSV changes)."""
+        return get_knowledge_base(BOOKS_CSV_PATH)
+
     def reset(self):
         """Clear conversation history and constraints."""
         self.conversation_history = []
         self.rejected_books = []
         self.constraints = []
-        
+        self.history_summary = []
+        self.summarized_turns = 0
+        self.sent_constraints = 0
+        self.sent_rejected = 0
+        self.candidates.reset()
+        self.facets = FacetFilter()
+        self.guess_check = None
+        self.opening_path = []
+        self.timings.clear()
+        speculator.discard(self)
+
+    @property
+    def prompt_fingerprint(self) -> str:
+        """Identifies the prompts the opening book was generated with."""
+        return prompt_fingerprint(SYSTEM_PROMPT, START_MESSAGE, self.prefix_cache)
+
+    def to_state(self) -> dict:
+        """Serializable game state (no clients or caches), see session_store."""
+        return {
+            'model': self.model,
+            'prefix_cache': self.prefix_cache,
+            'context_tokens': self.context_tokens,
+            'conversation_history': self.conversation_history,
+            'rejected_books': self.rejected_books,
+            'constraints': self.constraints,
+            'history_summary': self.history_summary,
+            'summarized_turns': self.summarized_turns,
+            'sent_constraints': self.sent_constraints,
+            'sent_rejected': self.sent_rejected,
+            'candidates': self.candidates.to_state(),
+            'guess_check': self.guess_check,
+            'opening_path': self.opening_path,
+            'affinity': self.affinity,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "BookinatorLLM":
+        """Rebuild an engine from to_state() output."""
+        engine = cls(model=state.get('model', DEFAULT_MODEL),
+                     prefix_cache=state.get('prefix_cache', PREFIX_CACHE),
+                     context_tokens=state.get('context_tokens', CONTEXT_TOKENS))
+        engine._load_state(state)
+        return engine
+
+    def _load_state(self, state: dict):
+        """Overwrite the game state with to_state() output."""
+        self.conversation_history = list(state.get('conversation_history', []))
+        self.rejected_books = list(state.get('rejected_books', []))
+        self.constraints = list(state.get('constraints', []))
+        self.history_summary = list(state.get('history_summary', []))
+        self.summarized_turns = state.get('summarized_turns', 0)
+        self.sent_constraints = state.get('sent_constraints', 0)
+        self.sent_rejected = state.get('sent_rejected', 0)
+        self.candidates = CandidateTracker.from_state(state.get('candidates', []), self.knowledge_base)
+        self.facets = FacetFilter.replay(self.knowledge_base, self.candidates.observations)
+        self.guess_check = state.get('guess_check')
+        # Older saved games have no path: treat them as off the book unless they haven't started
+        self.opening_path = state.get('opening_path', None if self.conversation_history else [])
+        self.affinity = state.get('affinity', self.affinity)
+
+    def fork(self) -> "BookinatorLLM":
+        """Independent copy of the game, as from_state(to_state()) but without replaying the answers."""
+        clone = type(self)(model=self.model, prefix_cache=self.prefix_cache, context_tokens=self.context_tokens)
+        clone._adopt(self)
+        return clone
+
+    def _adopt(self, other: "BookinatorLLM"):
+        """Overwrite the game state with a copy of another engine's."""
+        self.conversation_history = list(other.conversation_history)
+        self.rejected_books = list(other.rejected_books)
+        self.constraints = list(other.constraints)
+        self.history_summary = list(other.history_summary)
+        self.summarized_turns = other.summarized_turns
+        self.sent_constraints = other.sent_constraints
+        self.sent_rejected = other.sent_rejected
+        self.candidates = other.candidates.copy()
+        self.facets = other.facets.copy()
+        self.guess_check = other.guess_check
+        self.opening_path = list(other.opening_path) if other.opening_path is not None else None
+        self.affinity = other.affinity
+
     def _call_ollama(self, messages: list[dict]) -> str:
         """Make a request to the Ollama API (Synchronous)."""
         url = f"{self.base_url}/api/chat"
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"num_ctx": self.context_tokens}
         }
         
-        print(f"DEBUG: Calling Ollama... (History: {len(messages)})")
+        self._log_prompt(messages)
+        print("DEBUG: Calling Ollama...")
         try:
-            # Set a 45s timeout to prevent infinite hangs
-            response = requests.post(url, json=payload, timeout=45) 
-            response.raise_for_status()
-            data = response.json()
+            # Identical requests from other sessions share one upstream call (see ollama_client.Coalescer)
+            if COALESCE:
+                data, shared = coalescer.call(payload, lambda: self._fetch(payload), QUEUE_TIMEOUT + READ_TIMEOUT)
+            else:
+                data, shared = self._fetch(payload), False
             raw_content = data.get('message', {}).get('content', '')
-            print("DEBUG: Ollama responded.")
-            
-            # Post-processing to clean up the LLM's messy output
-            import re
-            
-            # 1. Remove Markdown bold/italic (* or **)
-            clean_content = re.sub(r'\*\*|__|\*|_', '', raw_content)
-            
-            # 2. Remove "Question X:" prefixes
-            clean_content = re.sub(r'^(Question \d+|Category):?\s*', '', clean_content, flags=re.IGNORECASE)
-            
-            # 3. Remove "Here is my question:" preambles
-            clean_content = re.sub(r"^Here'?s my.*?question:?\s*", "", clean_content, flags=re.IGNORECASE)
-            
-            return clean_content.strip()
+            if shared:
+                print("DEBUG: Reused the reply of an identical request.")
+            else:
+                print("DEBUG: Ollama responded.")
+                self._record_timings(data)
+            return self._clean_response(raw_content)
+        except Exception as e:
+            return self._ollama_error(e, url)
+
+    def _fetch(self, payload: dict) -> dict:
+        # Fair-queued slot in front of Ollama; pooled keep-alive client; read timeout prevents infinite hangs
+        queued = time.perf_counter()
+        with llm_limiter.slot(self, timeout=QUEUE_TIMEOUT):
+            queue_seconds.observe(time.perf_counter() - queued)
+            with span('ollama_call'):
+                return ollama.chat(payload, affinity=self.affinity)
+
+    def _log_prompt(self, messages: list[dict]):
+        self.prompt_tokens = message_tokens(messages)
+        prompt_tokens.observe(self.prompt_tokens)
+        print(f"DEBUG: Prompt ~{self.prompt_tokens} tokens of {self.context_tokens} ({len(messages)} messages)")
+
+    def _stream_ollama(self, messages: list[dict]) -> Iterator[tuple[str, object]]:
+        """
+        Stream raw content deltas from the Ollama API (NDJSON, one object per line).
+        Yields ('queue', position) while waiting for an LLM slot, then ('text', delta).
+        Closing the generator early closes the connection, which stops generation upstream
+        (unless other sessions are sharing the request).
+        On failure, yields the same "Error: ..." text as _call_ollama.
+        """
+        url = f"{self.base_url}/api/chat"
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"num_ctx": self.context_tokens}
+        }
+        self._log_prompt(messages)
+        
+        while True:
+            flight, leader = coalescer.join(payload) if COALESCE else (None, True)
+            if leader:
+                yield from self._lead_stream(payload, flight, url)
+                return
+            print("DEBUG: Sharing the reply of an identical request.")
+            try:
+                for chunk in flight.replay(QUEUE_TIMEOUT + READ_TIMEOUT):
+                    piece = chunk.get('message', {}).get('content', '')
+                    if piece:
+                        yield 'text', piece
+                return
+            except Abandoned:
+                continue  # the leader gave up before replying; try again (possibly as leader)
+            except Exception as e:
+                yield 'text', self._ollama_error(e, url)
+                return
+            finally:
+                coalescer.leave(flight)
+
+    def _lead_stream(self, payload: dict, flight: Optional[Flight], url: str) -> Iterator[tuple[str, object]]:
+        """Make the streaming call for this request, publishing every chunk to sessions sharing it."""
+        queued = time.perf_counter()
+        ticket = llm_limiter.enqueue(self)
+        granted = ticket is None
+        stream = ollama.chat_stream(payload, affinity=self.affinity)
+        finished = False
+        error: Optional[Exception] = None
+        try:
+            waited = 0.0
+            while not granted:
+                yield 'queue', llm_limiter.position(self)
+                granted = ticket.wait(QUEUE_POLL_INTERVAL)
+                waited += QUEUE_POLL_INTERVAL
+                if not granted and waited >= QUEUE_TIMEOUT:
+                    raise TimeoutError("Timed out waiting for a free LLM slot")
+            queue_seconds.observe(time.perf_counter() - queued)
             
-        except requests.exceptions.Timeout:
-            print(f"DEBUG: Ollama Timed Out (45s).")
+            print(f"DEBUG: Streaming from Ollama... (History: {len(payload['messages'])})")
+            with span('ollama_stream'):
+                for chunk in stream:
+                    if chunk.get('error'):
+                        raise RuntimeError(chunk['error'])
+                    if flight is not None:
+                        flight.publish(chunk)
+                    piece = chunk.get('message', {}).get('content', '')
+                    if piece:
+                        yield 'text', piece
+                    if chunk.get('done'):
+                        self._record_timings(chunk)
+                        break
+            finished = True
+            print("DEBUG: Ollama stream finished.")
+        except Exception as e:
+            error = e
+            yield 'text', self._ollama_error(e, url)
+        finally:
+            if (flight is not None and not finished and error is None
+                    and not coalescer.abandon(flight, can_finish=granted)):
+                # Our caller hung up but other sessions share this reply: finish it for them in
+                # the background (it keeps the LLM slot), so this caller returns at once
+                _drain_executor.submit(self._drain, stream, flight)
+            else:
+                stream.close()
+                if granted:
+                    llm_limiter.release()
+                else:
+                    llm_limiter.cancel(ticket)
+                if flight is not None and (finished or error is not None):
+                    coalescer.finish(flight, error)
+
+    @staticmethod
+    def _drain(stream: Iterator[dict], flight: Flight):
+        """Read the rest of a stream into the flight, then give back its LLM slot and finish the flight."""
+        error: Optional[Exception] = None
+        try:
+            for chunk in stream:
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                flight.publish(chunk)
+                if chunk.get('done'):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            stream.close()
+            llm_limiter.release()
+            coalescer.finish(flight, error)
+
+    def _record_timings(self, data: dict):
+        """Keep Ollama's prompt-eval vs generation timings (reported in ns) for this call."""
+        timing = {
+            'turn': self._turn_count(),
+            'prompt_estimate': self.prompt_tokens,
+            'prompt_eval_count': data.get('prompt_eval_count', 0),
+            'prompt_eval_ms': data.get('prompt_eval_duration', 0) / 1e6,
+            'eval_count': data.get('eval_count', 0),
+            'eval_ms': data.get('eval_duration', 0) / 1e6,
+            'load_ms': data.get('load_duration', 0) / 1e6,
+            'total_ms': data.get('total_duration', 0) / 1e6,
+        }
+        self.timings.append(timing)
+        record_ollama(data)
+        print(f"DEBUG: Ollama timings: prompt {timing['prompt_eval_count']} tok / {timing['prompt_eval_ms']:.0f} ms, "
+              f"eval {timing['eval_count']} tok / {timing['eval_ms']:.0f} ms")
+
+    @staticmethod
+    def _ollama_error(e: Exception, url: str) -> str:
+        """Map a failed Ollama request to the user-facing error text."""
+        if isinstance(e, requests.exceptions.Timeout):
+            print(f"DEBUG: Ollama Timed Out ({READ_TIMEOUT}s).")
             return "Error: I'm thinking too hard and timed out. Please try again."
-        except requests.exceptions.ConnectionError:
+        if isinstance(e, TimeoutError):
+            errors_total.inc('llm_queue')
+            print(f"DEBUG: No free LLM slot within {QUEUE_TIMEOUT}s.")
+            return "Error: Lots of readers right now! Please try again in a moment."
+        if isinstance(e, requests.exceptions.ConnectionError):
             print(f"DEBUG: Failed to connect to {url}")
             return "Error: Cannot connect to Ollama (Connection Refused). Is 'ollama serve' running?"
-        except Exception as e:
-            print(f"DEBUG: Ollama Error: {e}")
-            return f"Error: {str(e)}"
+        print(f"DEBUG: Ollama Error: {e}")
+        return f"Error: {str(e)}"
+
+    @staticmethod
+    def _clean_response(raw_content: str) -> str:
+        """Post-processing to clean up the LLM's messy output."""
+        # 1. Remove Markdown bold/italic (* or **)
+        clean_content = _MARKDOWN_RE.sub('', raw_content)
+        
+        # 2. Remove "Question X:" prefixes
+        clean_content = _QUESTION_PREFIX_RE.sub('', clean_content)
+        
+        # 3. Remove "Here is my question:" preambles
+        clean_content = _PREAMBLE_RE.sub('', clean_content)
+        
+        return clean_content.strip()
     
     def _search_local_db(self, query: str, max_results: int = 5) -> list[dict]:
         """Search the local knowledge base."""
-        if not self.knowledge_base:
+        kb = self.knowledge_base
+        if not kb:
             return []
+        
+        cache = get_search_cache()
+        namespace = f"local:{max_results}:{kb.mtime}"  # a changed CSV invalidates cached hits
+        cached = cache.get(namespace, query)
+        if cached is not None:
+            return cached
+            
+        # BM25 over the shared inverted index (handles prefixes + Bengali transliterations)
+        with span('local_search'):
+            hits = get_search_index(kb).search(query, k=max_results)
             
-        query_terms = query.lower().split()
-        matches = []
-        
-        for book in self.knowledge_base:
-            text = (book.get('title', '') + " " + book.get('authors', '')).lower()
-            score = 0
-            for term in query_terms:
-                if term in text:
-                    score += 1
-            if score > 0:
-                matches.append((score, book))
-        
-        matches.sort(key=lambda x: x[0], reverse=True)
-        
-        results = []
-        for _, book in matches[:max_results]:
-            results.append({
-                'title': book.get('title', 'Unknown'),
-                'snippet': f"Author: {book.get('authors', 'Unknown')}, Year: {book.get('publication_date', '')}",
-                'source': 'Local Database'
-            })
+            results = []
+            for i, score, coverage in hits:
+                results.append({
+                    'title': kb.titles[i] or 'Unknown',
+                    'snippet': f"Author: {kb.authors(i) or 'Unknown'}, Year: {kb.publication_dates[i]}",
+                    'source': 'Local Database',
+                    'score': round(score, 2),
+                    'coverage': coverage
+                })
+        cache.put(namespace, query, results)
         return results
 
     def _web_search(self, query: str, max_results: int = 3) -> list[dict]:
         """Perform a web search using DuckDuckGo."""
+        cache = get_search_cache()
+        namespace = f"web:{max_results}"
+        cached = cache.get(namespace, query)
+        if cached is not None:
+            return cached
+        
+        if not self.web_search:
+            return []
         if not self.search_client:
             return [{'error': 'Search client not initialized'}]
 
         try:
-            results = list(self.search_client.text(query, max_results=max_results))
-            return [{
+            with span('web_search'):
+                results = list(self.search_client.text(query, max_results=max_results))
+            results = [{
                 'title': r.get('title', ''),
                 'snippet': r.get('body', ''),
                 'url': r.get('href', ''),
                 'source': 'DuckDuckGo' 
             } for r in results]
         except Exception as e:
+            # Failures aren't cached, so the next visitor retries
             return [{'error': str(e)}]
+        cache.put(namespace, query, results)
+        return results
     
+    @staticmethod
+    def _cut_at_search(response: str) -> str:
+        """The reply up to the end of its [SEARCH: ...] tag (unchanged if it has none)."""
+        start = response.find('[SEARCH:')
+        end = response.find(']', start + 8) if start != -1 else -1
+        return response[:end + 1] if end != -1 else response
+
     def _process_search_request(self, response: str) -> tuple[str, Optional[list]]:
         """Check if LLM wants to search and process it (Hybrid: Local + Web)."""
         if '[SEARCH:' in response:
@@ -219,20 +587,48 @@ class BookinatorLLM:
                 end = response.find(']', start)
                 if end > start:
                     query = response[start:end].strip()
-                    
-                    # 1. Local Search
-                    local_results = self._search_local_db(query)
-                    
-                    # 2. Web Search (always do it for now to ensure coverage, as local DB is limited)
-                    web_results = self._web_search(query)
-                    
-                    # Combine
-                    combined_results = local_results + web_results
-                    return response, combined_results
+                    return response, self._hybrid_search(query)
             except:
                 pass
         return response, None
 
+    def _hybrid_search(self, query: str, deadline: float = SEARCH_DEADLINE) -> list[dict]:
+        """
+        Local knowledge base + web results for one [SEARCH:] query.
+        The web lookup runs in the background while the (in-memory BM25) local
+        lookup runs inline; returns whatever has arrived when the deadline expires.
+        """
+        started = time.perf_counter()
+        web_future = _web_executor.submit(self._web_search, query)
+        local_results = self._search_local_db(query)
+        web_results: list[dict] = []
+        
+        if self._is_confident(local_results):
+            # Local index already nailed it; don't wait on DuckDuckGo
+            web_future.cancel()
+            print("DEBUG: Confident local hit; skipping web search.")
+        else:
+            remaining = max(0.0, deadline - (time.perf_counter() - started))
+            done, _ = wait({web_future}, timeout=remaining)
+            if done:
+                web_results = web_future.result()
+            else:
+                # Drops it if it hasn't started; a running one ends at WEB_SEARCH_TIMEOUT
+                web_future.cancel()
+                errors_total.inc('search_deadline')
+                print(f"DEBUG: Search deadline ({deadline}s) hit; skipping the web lookup.")
+        
+        span_seconds.observe(time.perf_counter() - started, 'hybrid_search')
+        # Combine
+        return local_results + web_results
+
+    @staticmethod
+    def _is_confident(local_results: list[dict]) -> bool:
+        if not local_results:
+            return False
+        top = local_results[0]
+        return top.get('coverage', 0) >= 1.0 and top.get('score', 0) >= LOCAL_CONFIDENT_SCORE
+
     def _parse_info_bit(self, response: str) -> tuple[str, Optional[str]]:
         """Extract [INFO] block if present."""
         info_bit = None
@@ -321,59 +717,274 @@ class BookinatorLLM:
             print(f"Error parsing guess: {e}")
             return None
 
-    def chat(self, user_message: str) -> dict:
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        messages.extend(self.conversation_history)
-        
+    def _turn_count(self) -> int:
+        """Questions asked so far (assistant messages, including ones folded into the summary)."""
+        return self.summarized_turns + len([m for m in self.conversation_history if m['role'] == 'assistant'])
+
+    def _build_messages(self, user_message: str) -> tuple[list[dict], int, str]:
+        """
+        Assemble the request for this turn.
+        Returns (messages, turn_count, user_content) where user_content is what
+        should be stored in the history for this turn.
+        """
         # Detect Rejections/Negations manually (Simple heuristic)
         last_assistant_msg = self.conversation_history[-1]['content'] if self.conversation_history else ""
         if 'no' in user_message.lower() or 'not' in user_message.lower():
             # If the user says No, we assume the previous question's premise is false.
             # We append this simple fact to specific constraints.
             self.constraints.append(f"User denied: '{last_assistant_msg}'")
+        
+        self.candidates.observe(self.knowledge_base, last_assistant_msg, user_message)
+        self.facets.observe(self.knowledge_base, last_assistant_msg, user_message)
+        
+        tail: list[dict] = []  # this turn's messages, after the history
+        if self.prefix_cache:
+            self._compact_history()
+            # Only constraints that are new this turn ride along with the answer;
+            # older ones are already in the (cached) history.
+            user_content = user_message + self._constraint_delta()
+        else:
+            user_content = user_message
             
-        # Add Dynamic Constraints to the Context
-        constraint_block = ""
-        if self.rejected_books:
-            constraint_block += f"\n[REJECTED BOOKS] (Do not guess these): {', '.join(self.rejected_books)}"
-        if self.constraints:
-            # Keep only last 5 constraints to avoid context bloat
-            recent_constraints = self.constraints[-5:]
-            constraint_block += f"\n[NEGATIVE CONSTRAINTS] (Avoid these): {'; '.join(recent_constraints)}"
-            
-        if constraint_block:
-             messages.append({"role": "system", "content": constraint_block})
+            # Add Dynamic Constraints to the Context
+            constraint_block = ""
+            if self.rejected_books:
+                constraint_block += f"\n[REJECTED BOOKS] (Do not guess these): {', '.join(self.rejected_books)}"
+            if self.constraints:
+                # Keep only last 5 constraints to avoid context bloat
+                recent_constraints = self.constraints[-5:]
+                constraint_block += f"\n[NEGATIVE CONSTRAINTS] (Avoid these): {'; '.join(recent_constraints)}"
+                
+            if constraint_block:
+                 tail.append({"role": "system", "content": constraint_block})
 
         # Check turn count (Assistant messages in history)
-        turn_count = len([m for m in self.conversation_history if m['role'] == 'assistant'])
+        turn_count = self._turn_count()
         
         # Game Over Logic (Question 20)
         is_final_turn = turn_count >= 19 # 0-indexed
         
+        content = user_content + self.candidates.prompt_block()
+        if self.guess_check:
+            # The catalogue check of the last guess only goes out once
+            content += self.guess_check
+            self.guess_check = None
+        if self.prefix_cache:
+            # Stored exactly as sent, so the next request extends this one and Ollama reuses
+            # its cached prefix; the old shortlists this leaves behind are folded away with
+            # their turns (the summary keeps only the answer)
+            user_content = content
         if is_final_turn:
-            messages.append({"role": "user", "content": user_message + FINAL_TURN_PROMPT})
+            tail.append({"role": "user", "content": content + FINAL_TURN_PROMPT})
         else:
-            messages.append({"role": "user", "content": user_message})
+            tail.append({"role": "user", "content": content})
         
+        return self._fit_context(tail), turn_count, user_content
+
+    def _fit_context(self, tail: list[dict]) -> list[dict]:
+        """
+        System prompt, history and this turn's messages within the token budget:
+        the oldest turns are folded into the summary until it fits (see context_budget).
+        """
+        budget = prompt_budget(self.context_tokens)
+        if self.prefix_cache:
+            folded = turns_to_fold(self._head_messages(), self.conversation_history, tail, budget)
+            if folded:
+                # Fold for good, so the following turns share the new (shorter) prefix
+                self._fold_history(folded)
+            messages = self._prefix_messages() + tail
+        else:
+            head = [{"role": "system", "content": SYSTEM_PROMPT}]
+            messages, folded = pack(head, self.conversation_history, tail, budget)
+        if folded:
+            folded_turns_total.inc(amount=folded)
+            print(f"DEBUG: Folded {folded} old turns to fit the {budget}-token prompt budget.")
+        return messages
+
+    def _head_messages(self) -> list[dict]:
+        """System prompt and rolling summary."""
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if self.history_summary:
+            summary = "\n".join(self.history_summary)
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"})
+        return messages
+
+    def _prefix_messages(self) -> list[dict]:
+        """Stable prefix: system prompt, rolling summary, then the history exactly as sent."""
+        return self._head_messages() + self.conversation_history
+
+    def _constraint_delta(self) -> str:
+        """Constraints and rejected books not yet sent to the model."""
+        block = ""
+        new_rejected = self.rejected_books[self.sent_rejected:]
+        if new_rejected:
+            block += f"\n[REJECTED BOOKS] (Do not guess these): {', '.join(new_rejected)}"
+        new_constraints = self.constraints[self.sent_constraints:]
+        if new_constraints:
+            block += f"\n[NEGATIVE CONSTRAINTS] (Avoid these): {'; '.join(new_constraints)}"
+        self.sent_rejected = len(self.rejected_books)
+        self.sent_constraints = len(self.constraints)
+        return block
+
+    def _compact_history(self):
+        """Fold the oldest Q&A pairs into the rolling summary once the history gets long."""
+        asked = [i for i, m in enumerate(self.conversation_history) if m['role'] == 'assistant']
+        if len(asked) <= HISTORY_MAX_TURNS:
+            return
+        self._fold_history(HISTORY_COMPACT_TURNS)
+        print(f"DEBUG: Compacted {HISTORY_COMPACT_TURNS} turns into summary ({len(self.history_summary)} lines).")
+
+    def _fold_history(self, turns: int):
+        """Move the oldest `turns` Q&A pairs into the rolling summary (see context_budget.fold_turns)."""
+        lines, self.conversation_history = fold_turns(self.conversation_history, turns)
+        self.history_summary.extend(lines)
+        self.summarized_turns += turns
+
+    def _search_followup(self, messages: list[dict], response: str,
+                         search_query: str, search_results: list[dict]) -> list[dict]:
+        """The request continued with the search results, as many as fit the token budget."""
+        messages = messages + [{"role": "assistant", "content": response}]
+        room = prompt_budget(self.context_tokens) - message_tokens(messages)
+        return messages + [{"role": "user", "content": self._format_search_context(search_query, search_results, room)}]
+
+    @staticmethod
+    def _format_search_context(search_query: str, search_results: list[dict], max_tokens: Optional[int] = None) -> str:
+        """Format results for LLM (best first; clipped and cut to max_tokens when given)."""
+        search_context = f"\n\nSearch results for '{search_query}':\n"
+        hits = [r for r in search_results if 'error' not in r][:5]
+        if max_tokens is not None:
+            hits = clip_results(hits, max_tokens - 30)  # leave room for the header and "Now continue."
+        for i, r in enumerate(hits, 1): 
+            source_tag = f"[{r.get('source', 'Web')}]"
+            search_context += f"{i}. {source_tag} {r.get('title', '')}: {r.get('snippet', '')}\n"
+        return search_context + "\nNow continue."
+
+    def _match_guess(self, book: str) -> Optional[dict]:
+        """Closest catalogue book for a guessed 'Title by Author' (see fuzzy_index), or None."""
+        kb = self.knowledge_base
+        return get_fuzzy_index(kb).best(book) if kb else None
+
+    def _check_guess(self, book: str) -> Optional[dict]:
+        """
+        Match the guess against the catalogue. A guess close to, but not the
+        same as, a catalogue title leaves a [CATALOGUE CHECK] note for the next
+        turn. A guess matching nothing gets no note: the catalogue is far from
+        complete (few Bengali titles), so that says nothing about the guess.
+        """
+        match = self._match_guess(book)
+        if match is not None and not match['verified']:
+            self.guess_check = (f"\n[CATALOGUE CHECK] Your guess \"{book}\" was not found in the local catalogue "
+                                f"(it may still be correct); the nearest catalogue title is "
+                                f"\"{match['title']} by {match['author']}\" (similarity {match['score']:.2f}).")
+        return match
+
+    def _final_result(self, final_candidates: list) -> dict:
+        with span('parse'):
+            matches = [self._match_guess(c.split('. ', 1)[-1]) for c in final_candidates]
+        return {
+            'response': '',
+            'search_results': None,
+            'search_query': None,
+            'guess': None,
+            'final_candidates': final_candidates,
+            'final_matches': matches,
+            'game_over': True
+        }
+
+    def _finish_turn(self, user_content: str, response: str,
+                     search_results: Optional[list], search_query: Optional[str]) -> dict:
+        """Parse the final response, record the turn and build the API payload."""
+        with span('parse'):
+            # 2. Check for GUESS
+            guess_data = self._parse_guess(response)
+            
+            # 3. Check for INFO bit
+            display_text, info_bit = self._parse_info_bit(response)
+            
+            if guess_data:
+                guess_data['match'] = self._check_guess(guess_data['book'])
+        
+        if guess_data:
+            display_text = "" 
+        
+        self.conversation_history.append({"role": "user", "content": user_content})
+        self.conversation_history.append({"role": "assistant", "content": response})
+        
+        return {
+            'response': display_text,
+            'info_bit': info_bit,
+            'search_results': search_results,
+            'search_query': search_query,
+            'guess': guess_data,
+            'final_candidates': None,
+            'catalogue': self.facets.summary(self.knowledge_base),
+            'game_over': False
+        }
+
+    def _opening_move(self, user_message: str) -> Optional[str]:
+        """The opening book's reply to this message, or None (and leave the book) if it has none."""
+        if not OPENING_BOOK or self.opening_path is None:
+            return None
+        move = get_opening_book().next_move(self.model, self.prompt_fingerprint, self.opening_path, user_message)
+        if move is None:
+            self.opening_path = None
+            return None
+        step, response = move
+        self.opening_path.append(step)
+        print(f"DEBUG: Served turn {len(self.opening_path)} from the opening book.")
+        return response
+
+    def _take_speculation(self, user_message: str) -> Optional[dict]:
+        """Commit a pre-generated turn for this answer, if there is one."""
+        outcome = speculator.take(self, user_message)
+        if outcome is None:
+            return None
+        clone, result = outcome
+        self._adopt(clone)
+        self.timings.extend(clone.timings)
+        print("DEBUG: Served turn from speculation.")
+        return result
+
+    def _speculate(self, result: dict):
+        if self.speculative and not result.get('game_over'):
+            speculator.start(self)
+
+    def chat(self, user_message: str) -> dict:
+        started = time.perf_counter()
+        result = self._take_speculation(user_message) if self.speculative else None
+        source = 'speculation'
+        if result is None:
+            result = self._play_turn(user_message)
+            source = self.turn_source
+        turn_seconds.observe(time.perf_counter() - started, 'chat', source)
+        self._speculate(result)
+        return result
+
+    def _play_turn(self, user_message: str) -> dict:
+        with span('build_prompt'):
+            messages, turn_count, user_content = self._build_messages(user_message)
+        
+        book_response = self._opening_move(user_message)
+        if book_response is not None:
+            self.turn_source = 'opening_book'
+            return self._finish_turn(user_content, book_response, None, None)
+        
+        self.turn_source = 'llm'
         response = self._call_ollama(messages)
         
         # 0. Check for Final Candidates
-        final_candidates = self._parse_final_candidates(response)
+        with span('parse'):
+            final_candidates = self._parse_final_candidates(response)
         if final_candidates:
-             return {
-                'response': '',
-                'search_results': None,
-                'search_query': None,
-                'guess': None,
-                'final_candidates': final_candidates,
-                'game_over': True
-            }
+             return self._final_result(final_candidates)
 
         # 1. Check for search (ONLY after Turn 5 to prevent early hangs)
         search_results = None
         search_query = None
         
         if turn_count >= 5:
+            # Kept only up to the tag, as in the streaming path (which stops generating there)
+            response = self._cut_at_search(response)
             processed_response, search_results = self._process_search_request(response)
             
             if search_results:
@@ -384,15 +995,7 @@ class BookinatorLLM:
                 except:
                     search_query = "Unknown"
                 
-                messages.append({"role": "assistant", "content": response})
-                
-                # Format results for LLM
-                search_context = f"\n\nSearch results for '{search_query}':\n"
-                for i, r in enumerate(search_results[:5], 1): 
-                    source_tag = f"[{r.get('source', 'Web')}]"
-                    search_context += f"{i}. {source_tag} {r['title']}: {r['snippet']}\n"
-                
-                messages.append({"role": "user", "content": search_context + "\nNow continue."})
+                messages = self._search_followup(messages, response, search_query, search_results)
                 response = self._call_ollama(messages)
         else:
             # If LLM tried to search early, ignore it and force a question generation if needed?
@@ -406,29 +1009,118 @@ class BookinatorLLM:
                 # Improving: If it effectively just searched, we loop back with "Just ask a question".
                 pass 
 
-        # 2. Check for GUESS
-        guess_data = self._parse_guess(response)
+        return self._finish_turn(user_content, response, search_results, search_query)
+
+    def _stream_reply(self, messages: list[dict], allow_search: bool) -> Iterator[tuple[str, object]]:
+        """
+        Stream one LLM reply through a StreamParser.
+        Yields ('queue', position) while waiting for an LLM slot,
+        ('token', text) for visible question text and ('search', (query, future))
+        as soon as a [SEARCH: ...] tag closes, at which point generation is stopped and the
+        search runs in the background. Always ends with ('reply', cleaned_response).
+        """
+        parser = StreamParser()
+        stream = self._stream_ollama(messages)
+        try:
+            for kind, piece in stream:
+                if kind == 'queue':
+                    yield 'queue', piece
+                    continue
+                for kind, value in parser.feed(piece):
+                    if kind == 'token':
+                        yield 'token', value
+                    elif kind == 'search' and allow_search:
+                        future = _search_executor.submit(self._hybrid_search, value)
+                        yield 'search', (value, future)
+                        # The rest of this reply is discarded anyway; stop generating it
+                        yield 'reply', self._clean_response(self._cut_at_search(parser.text))
+                        return
+        finally:
+            stream.close()
+        if not allow_search and '[SEARCH:' in parser.text:
+            print("DEBUG: Suppressing early search request.")
+        yield 'reply', self._clean_response(parser.text)
+
+    def chat_stream(self, user_message: str) -> Iterator[dict]:
+        """
+        Streaming variant of chat().
+        Yields {'type': 'queue', 'position'} while waiting behind other visitors,
+        {'type': 'token', 'text'} while the question is generated,
+        {'type': 'search', 'query'} when a search is dispatched, and finally
+        {'type': 'done', 'result'} carrying the same payload chat() returns.
+        """
+        started = time.perf_counter()
+        result = self._take_speculation(user_message) if self.speculative else None
+        source = 'speculation'
+        if result is not None:
+            first_token_seconds.observe(time.perf_counter() - started)
+            yield {'type': 'token', 'text': result['response']}
+            yield {'type': 'done', 'result': result}
+        else:
+            first_token = True
+            for event in self._play_turn_stream(user_message):
+                if event['type'] == 'token' and first_token:
+                    first_token = False
+                    first_token_seconds.observe(time.perf_counter() - started)
+                elif event['type'] == 'done':
+                    result = event['result']
+                yield event
+            source = self.turn_source
+        if result is not None:
+            turn_seconds.observe(time.perf_counter() - started, 'stream', source)
+            self._speculate(result)
+
+    def _play_turn_stream(self, user_message: str) -> Iterator[dict]:
+        with span('build_prompt'):
+            messages, turn_count, user_content = self._build_messages(user_message)
         
-        # 3. Check for INFO bit
-        display_text, info_bit = self._parse_info_bit(response)
+        book_response = self._opening_move(user_message)
+        if book_response is not None:
+            self.turn_source = 'opening_book'
+            result = self._finish_turn(user_content, book_response, None, None)
+            yield {'type': 'token', 'text': result['response']}
+            yield {'type': 'done', 'result': result}
+            return
         
-        if guess_data:
-            display_text = "" 
+        self.turn_source = 'llm'
+        search_query = None
+        search_future: Optional[Future] = None
+        response = ""
+        for kind, value in self._stream_reply(messages, allow_search=turn_count >= 5):
+            if kind == 'token':
+                yield {'type': 'token', 'text': value}
+            elif kind == 'queue':
+                yield {'type': 'queue', 'position': value}
+            elif kind == 'search':
+                search_query, search_future = value
+                yield {'type': 'search', 'query': search_query}
+            else:
+                response = value
         
-        self.conversation_history.append({"role": "user", "content": user_message})
-        self.conversation_history.append({"role": "assistant", "content": response})
+        with span('parse'):
+            final_candidates = self._parse_final_candidates(response)
+        if final_candidates:
+            yield {'type': 'done', 'result': self._final_result(final_candidates)}
+            return
         
-        return {
-            'response': display_text,
-            'info_bit': info_bit,
-            'search_results': search_results,
-            'search_query': search_query,
-            'guess': guess_data,
-            'final_candidates': None,
-            'game_over': False
-        }
+        search_results = None
+        if search_future is not None:
+            search_results = search_future.result() or None
+            if search_results:
+                messages = self._search_followup(messages, response, search_query, search_results)
+                for kind, value in self._stream_reply(messages, allow_search=False):
+                    if kind == 'token':
+                        yield {'type': 'token', 'text': value}
+                    elif kind == 'queue':
+                        yield {'type': 'queue', 'position': value}
+                    elif kind == 'reply':
+                        response = value
+            else:
+                search_query = None
+        
+        yield {'type': 'done', 'result': self._finish_turn(user_content, response, search_results, search_query)}
     
     def start_game(self) -> dict:
         self.reset()
         # The prompt says "Start immediately with Question 1"
-        return self.chat("Game Start. Ask the first Yes/No question about the book's language or format.")
+        return self.chat(START_MESSAGE)
@@ -0,0 +1,239 @@
+"""
+Bookinator Metrics
+In-process counters, gauges and latency histograms, rendered in the
+Prometheus text format at /api/metrics.
+
+Recording is a perf_counter() call, a bisect and a short lock per
+observation, so spans stay on in production. Each worker process keeps its
+own numbers (scrape every worker, or run one).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Seconds; spans range from sub-millisecond parsing to minute-long LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 45.0, 90.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge:
+    """
+    A value read from a callback at scrape time (sessions, in-flight calls, hit rates).
+    kind='counter' exposes a running total kept elsewhere (e.g. SearchCache.hits).
+    With labels, the callback returns {label values tuple: value}.
+    """
+
+    def __init__(self, name: str, help: str, read: Callable[[], float], kind: str = 'gauge', labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+        self.labelnames = labels
+
+    def samples(self) -> list[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"DEBUG: Gauge {self.name} failed: {e}")
+            return []
+        if not self.labelnames:
+            return [f"{self.name} {_number(value)}"]
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in value.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, plus sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for labels, series in items:
+            names = self.labelnames + ('le',)
+            total = 0
+            for bound, n in zip(self.buckets + (float('inf'),), series):
+                total += n
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {total}")
+        return lines
+
+
+class Registry:
+    """Named metrics in registration order."""
+
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric) and not isinstance(metric, Gauge):
+                return existing
+            self._metrics[metric.name] = metric  # gauges are re-bound (e.g. a reloaded app)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], kind: str = 'gauge', labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, read, kind, labels))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+span_seconds = registry.histogram(
+    'bookinator_span_seconds', "Wall time of instrumented steps (ollama_call, web_search, local_search, parse, ...)",
+    labels=('span',))
+turn_seconds = registry.histogram(
+    'bookinator_turn_seconds', "Wall time of a whole chat turn, by API mode and where the reply came from",
+    labels=('mode', 'source'))
+first_token_seconds = registry.histogram(
+    'bookinator_first_token_seconds', "Time until the first visible token of a streamed turn")
+queue_seconds = registry.histogram(
+    'bookinator_llm_queue_seconds', "Time spent waiting for a free LLM slot")
+ollama_seconds = registry.histogram(
+    'bookinator_ollama_seconds', "Ollama's own reported durations per call (load, prompt_eval, eval, total)",
+    labels=('phase',))
+ollama_tokens = registry.histogram(
+    'bookinator_ollama_tokens', "Tokens per Ollama call (prompt = prompt_eval_count, eval = generated)",
+    labels=('kind',), buckets=TOKEN_BUCKETS)
+prompt_tokens = registry.histogram(
+    'bookinator_prompt_estimated_tokens', "Estimated prompt tokens per LLM request, after packing into the context budget",
+    buckets=TOKEN_BUCKETS)
+folded_turns_total = registry.counter(
+    'bookinator_context_folded_turns_total', "Old turns folded into the summary to fit the context budget")
+coalesced_total = registry.counter(
+    'bookinator_llm_coalesced_total', "LLM requests served by another identical request (joined in flight, or cached)",
+    labels=('how',))
+errors_total = registry.counter(
+    'bookinator_errors_total', "Failed steps by span", labels=('span',))
+
+
+@contextmanager
+def span(name: str):
+    """Time the block into bookinator_span_seconds{span=name}; exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            errors_total.inc(name)
+        raise
+    finally:
+        span_seconds.observe(time.perf_counter() - started, name)
+
+
+def record_ollama(data: dict):
+    """Feed the timings Ollama reports (in ns) on a finished call."""
+    for phase in ('load', 'prompt_eval', 'eval', 'total'):
+        duration = data.get(f'{phase}_duration')
+        if duration:
+            ollama_seconds.observe(duration / 1e9, phase)
+    for kind, key in (('prompt', 'prompt_eval_count'), ('eval', 'eval_count')):
+        if key in data:
+            ollama_tokens.observe(data[key], kind)
+
+
+def render() -> str:
+    return registry.render()
+
+
+def quantile(histogram: Histogram, q: float, *labels) -> Optional[float]:
+    """Bucket upper bound below which `q` of the observations fall (for quick checks and benchmarks)."""
+    series = histogram._series.get(labels)
+    if not series:
+        return None
+    total = sum(series[:-1])
+    seen = 0
+    for bound, n in zip(histogram.buckets + (float('inf'),), series):
+        seen += n
+        if seen >= q * total:
+            return bound
+    return float('inf')
@@ -1,12 +1,58 @@
 
 import json
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from scipy import sparse
+
+from feature_store import FEATURE_STORE_DIR, FeatureStore, store_exists
+
+# 'cosine': similarity to the answer vector; 'bayes': log-posterior over books
+SCORING_MODE = 'cosine'
+
+# Batched scoring (BatchedEngine): session slots, how long the scheduler waits for
+# more sessions to join a batch, and the most sessions scored in one multiply
+BATCH_CAPACITY = 1024
+BATCH_WINDOW = 0.002  # seconds
+MAX_BATCH = 256
+BATCH_DENSE_BYTES = 512 * 2**20  # dense copy of the catalogue for BLAS batch multiplies, if it fits
+DENSE_SPEEDUP = 256  # dense multiply-adds that cost as much as one sparse one (measured on one core, incl. slicing)
+ARGMAX_TOP_K = 32  # up to this k, top-k is k argmax passes over the batch instead of a partition per row
+
+# UI / LLM wording -> canonical answer
+ANSWER_ALIASES = {
+    'absolutely': 'yes',
+    'absolutely not': 'no',
+    "don't know": 'maybe',
+    'probably_not': 'probably not',
+}
+
+# Cosine mode: answer -> user vector entry
+ANSWER_VALUES = {'yes': 1.0, 'probably': 0.5, 'maybe': 0.0, 'probably not': -0.5, 'no': -1.0}
+
+# Bayes mode: P(answer | book has feature), P(answer | book lacks feature).
+# Players sometimes misremember, so even 'no' leaves a feature-holding book some mass.
+ANSWER_LIKELIHOODS = {
+    'yes':          (0.70, 0.02),
+    'probably':     (0.17, 0.04),
+    'maybe':        (0.07, 0.07),
+    'probably not': (0.04, 0.17),
+    'no':           (0.02, 0.70),
+}
+
+
+def normalize_answer(answer):
+    answer = answer.strip().lower()
+    return ANSWER_ALIASES.get(answer, answer)
+
 
 class BookinatorEngine:
-    def __init__(self, data_dir='data'):
+    def __init__(self, data_dir='data', scoring=SCORING_MODE):
         self.data_dir = data_dir
+        self.scoring = scoring
         self.books = []
         self.questions = []
         self.book_vectors = None
@@ -14,8 +60,13 @@ class BookinatorEngine:
         self.user_vector = None
         self.asked_features = set()
         
-        self.load_data()
-        self.init_vectors()
+        # Prefer the compiled store (python feature_store.py compile); fall back to the JSON files
+        store_dir = os.path.join(data_dir, os.path.basename(FEATURE_STORE_DIR))
+        if store_exists(store_dir):
+            self.load_store(store_dir)
+        else:
+            self.load_data()
+            self.init_vectors()
         
     def load_data(self):
         with open(os.path.join(self.data_dir, 'books.json'), 'r') as f:
@@ -23,138 +74,477 @@ class BookinatorEngine:
         with open(os.path.join(self.data_dir, 'questions.json'), 'r') as f:
             self.questions = json.load(f)
             
+    def load_store(self, path=FEATURE_STORE_DIR):
+        """Open a compiled feature store; arrays stay memory-mapped (shared between processes)."""
+        store = FeatureStore(path)
+        self.books = store.books
+        self.questions = store.questions
+        self._init_features()
+        # Use the mapped buffers as-is: no copy, no re-derivation of norms/means/bits
+        self.book_vectors = sparse.csc_matrix((store.data, store.indices, store.indptr), shape=store.shape, copy=False)
+        self._index_vectors(norms=store.norms, means=store.means, bits=store.bits if store.bits.size else None)
+
+    @classmethod
+    def from_store(cls, path=FEATURE_STORE_DIR, scoring=SCORING_MODE):
+        engine = cls.__new__(cls)
+        engine.data_dir = os.path.dirname(path)
+        engine.scoring = scoring
+        engine.load_store(path)
+        return engine
+
+    @classmethod
+    def from_data(cls, books, questions, scoring=SCORING_MODE):
+        """Build an engine from in-memory books/questions (benchmarks, tests)."""
+        engine = cls.__new__(cls)
+        engine.data_dir = None
+        engine.scoring = scoring
+        engine.books = books
+        engine.questions = questions
+        engine.init_vectors()
+        return engine
+
+    @classmethod
+    def from_matrix(cls, book_vectors, questions, books, scoring=SCORING_MODE):
+        """Build an engine around a prebuilt (n_books x n_features) sparse matrix whose columns follow sorted feature names."""
+        engine = cls.__new__(cls)
+        engine.data_dir = None
+        engine.scoring = scoring
+        engine.books = books
+        engine.questions = questions
+        engine._init_features()
+        engine.book_vectors = sparse.csc_matrix(book_vectors, dtype=np.float32)
+        engine._index_vectors()
+        return engine
+
     def init_vectors(self):
-        # 1. Collect all unique features from questions mapping
+        self._init_features()
+        
+        # Build Book Matrix (N_books x N_features), sparse: most books have few features
+        rows, cols, values = [], [], []
+        for i, book in enumerate(self.books):
+            for feature, value in book['features'].items():
+                if feature in self.feature_map and value:
+                    rows.append(i)
+                    cols.append(self.feature_map[feature])
+                    values.append(value)
+        shape = (len(self.books), len(self.feature_names))
+        self.book_vectors = sparse.csc_matrix(
+            (np.asarray(values, dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+            shape=shape)
+        self._index_vectors()
+
+    def _init_features(self):
+        # Collect all unique features from questions mapping
         # We rely on questions.json to define what features exist and matter
         self.feature_names = sorted([q['feature'] for q in self.questions])
         self.feature_map = {name: i for i, name in enumerate(self.feature_names)}
+        # First question per feature (matches the old scan over self.questions)
+        self.question_for = {}
+        for q in self.questions:
+            self.question_for.setdefault(q['feature'], q)
+
+    def _index_vectors(self, norms=None, means=None, bits=None):
+        """Per-catalogue values that never change between turns (taken from a compiled store when given)."""
+        vectors = self.book_vectors
+        self.n_books = vectors.shape[0]
+        if norms is None:
+            # Row norms are fixed, so cosine similarity only needs a dot product per turn
+            norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1), dtype=np.float32).ravel())
+            norms[norms == 0] = 1.0
+        self.book_norms = norms
+        if means is None:
+            n_features = vectors.shape[1]
+            if self.n_books:
+                means = np.asarray(vectors.sum(axis=0), dtype=np.float32).ravel() / self.n_books
+            else:
+                means = np.zeros(n_features, dtype=np.float32)
+        self.feature_means = means
+        self.feature_bits = bits if bits is not None else self._pack_features()
         
-        # 2. Build Book Matrix (N_books x N_features)
-        n_books = len(self.books)
-        n_features = len(self.feature_names)
-        self.book_vectors = np.zeros((n_books, n_features))
-        
-        for i, book in enumerate(self.books):
-            for feature, value in book['features'].items():
-                if feature in self.feature_map:
-                    idx = self.feature_map[feature]
-                    self.book_vectors[i, idx] = value
-                    
-        # 3. Initialize User Vector (starts as all 0s = neutral)
+        # Initialize User Vector (starts as all 0s = neutral)
         self.reset_session()
 
     def reset_session(self):
-        self.user_vector = np.zeros(len(self.feature_names))
+        self.user_vector = np.zeros(len(self.feature_names), dtype=np.float32)
         self.asked_features = set()
+        self.asked_mask = np.zeros(len(self.feature_names), dtype=bool)
+        # Uniform prior; only differences between books matter, so it isn't renormalized
+        self.log_posterior = np.zeros(self.n_books, dtype=np.float64)
+        self.history = []  # (feature index, previous user value, was asked, rows, log-likelihood delta)
 
     def update_user_vector(self, feature, answer):
         """
-        answer: "yes", "no", "maybe"
+        answer: "yes", "probably", "maybe", "probably not", "no"
+        (UI wording such as "Absolutely" is mapped onto these)
         Logic:
-        - Yes: +1
-        - No: -1
-        - Maybe: 0 (no change/neutral)
+        - cosine: sets the feature's entry in the user vector (Yes +1 ... No -1, Maybe 0)
+        - bayes: multiplies every book's posterior by P(answer | book), touching
+          only the books that have the feature
         """
         if feature not in self.feature_map:
             return
             
         idx = self.feature_map[feature]
+        answer = normalize_answer(answer)
+        rows = delta = None
+        if self.scoring == 'bayes':
+            rows, delta = self._log_likelihood(idx, answer)
+            self.log_posterior[rows] += delta
+        self.history.append((idx, self.user_vector[idx], self.asked_mask[idx], rows, delta))
+
         self.asked_features.add(feature)
-        
-        if answer == 'yes':
-            self.user_vector[idx] = 1.0
-        elif answer == 'no':
-            self.user_vector[idx] = -1.0
-        else: # maybe or unknown
-            # For 'maybe', we leave it as 0 (neutral), or could use 0.5?
-            # Sticking to 0 preserves neutrality in dot product.
-            self.user_vector[idx] = 0.0
-
-    def get_recommendations(self):
-        # Compute Cosine Similarity
-        # user_vector [1, -1, 0...] vs book_vectors [1, 0, 1...]
-        
-        # Reshape user_vector for sklearn (1, n_features)
-        user_vec_reshaped = self.user_vector.reshape(1, -1)
-        
-        # Calculate similarity
-        # Note: If user_vector is all zeros, cosine_similarity is 0 (or undefined error handled by sklearn usually returns 0)
-        # To avoid division by zero errors if strictly 0, we can add epsilon or handle explicitly
-        if np.linalg.norm(user_vec_reshaped) == 0:
-            # If no info yet, return uniform scores or base on popularity (simple avg)
-            scores = np.zeros(len(self.books))
-        else:
-            scores = cosine_similarity(user_vec_reshaped, self.book_vectors)[0]
-            
-        # Add indices to sort
-        scored_books = []
-        for i, score in enumerate(scores):
-            scored_books.append({
-                'book': self.books[i],
-                'score': float(score),
-                'index': i
-            })
-            
-        # Sort descending
-        scored_books.sort(key=lambda x: x['score'], reverse=True)
-        return scored_books
+        self.asked_mask[idx] = True
+        # Unknown answers count as 'maybe' (neutral)
+        self.user_vector[idx] = ANSWER_VALUES.get(answer, 0.0)
+
+    def _log_likelihood(self, idx, answer):
+        """
+        Rows with the feature and their log-likelihood relative to books without it.
+        Books lacking the feature all get the same factor, which cancels in the posterior.
+        """
+        has, lacks = ANSWER_LIKELIHOODS.get(answer, ANSWER_LIKELIHOODS['maybe'])
+        vectors = self.book_vectors
+        start, end = vectors.indptr[idx], vectors.indptr[idx + 1]
+        rows = vectors.indices[start:end]
+        # Fractional feature values mix the two likelihoods
+        values = vectors.data[start:end].astype(np.float64)
+        return rows, np.log(values * has + (1 - values) * lacks) - np.log(lacks)
+
+    def undo_last_answer(self):
+        """Revert the most recent update_user_vector; returns the feature name (None if nothing to undo)."""
+        if not self.history:
+            return None
+        idx, value, was_asked, rows, delta = self.history.pop()
+        if rows is not None:
+            self.log_posterior[rows] -= delta
+        self.user_vector[idx] = value
+        self.asked_mask[idx] = was_asked
+        feature = self.feature_names[idx]
+        if not was_asked:
+            self.asked_features.discard(feature)
+        return feature
+
+    def posterior(self):
+        """P(book | answers so far) under the bayes likelihoods."""
+        weights = np.exp(self.log_posterior - self.log_posterior.max())
+        return weights / weights.sum()
+
+    def scores(self):
+        """
+        bayes: posterior probability of each book.
+        cosine: similarity of the user vector against every book (all zeros before any answer).
+        """
+        if self.scoring == 'bayes':
+            return self.posterior()
+        answered = np.flatnonzero(self.user_vector)
+        if answered.size == 0:
+            return np.zeros(self.n_books, dtype=np.float32)
+        # Only answered features contribute: one sparse mat-vec over those columns
+        user = self.user_vector[answered]
+        dots = self.book_vectors[:, answered] @ user
+        return dots / (self.book_norms * np.linalg.norm(user))
+
+    def top_k(self, k=10):
+        """[(book index, score)] for the k best books, best first, without sorting the whole catalogue."""
+        scores = self.scores()
+        k = min(k, self.n_books)
+        if k <= 0:
+            return []
+        top = np.flatnonzero(self._top_mask(scores, k))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def get_recommendations(self, k=None):
+        if k is not None:
+            return [{'book': self.books[i], 'score': score, 'index': i} for i, score in self.top_k(k)]
+        scores = self.scores()
+        # Stable descending sort keeps catalogue order among ties
+        order = np.argsort(-scores, kind='stable')
+        return [{'book': self.books[i], 'score': float(scores[i]), 'index': int(i)} for i in order]
 
     def get_next_question(self):
         """
-        Selects the best question using a Variance/Entropy heuristic.
+        Selects the question with the highest expected information gain.
         We want a feature that splits the remaining HIGH SCORING books ~50/50.
         """
-        # 1. Get current top candidates (e.g., top 5 or all if early game)
-        # If early game (few answers), considered all.
-        # If late game, focus on distinguishing top candidates.
-        recommendations = self.get_recommendations()
-        
-        # Consider top N candidates to decide next split
-        # If we have very little info (scores all 0), consider all
-        if recommendations[0]['score'] == 0:
-            candidates = self.books
-        else:
-            # Take top 5 or those with score > threshold
-            # For robustness, let's take top 50% of books or top 5
-            top_n = max(3, len(self.books) // 2)
-            candidates = [x['book'] for x in recommendations[:top_n]]
-        
-        candidate_indices = [self.books.index(b) for b in candidates]
-        subset_vectors = self.book_vectors[candidate_indices]
-        
-        best_feature = None
-        max_variance = -1
-        
-        for feature in self.feature_names:
-            if feature in self.asked_features:
-                continue
-                
-            idx = self.feature_map[feature]
-            col = subset_vectors[:, idx]
-            
-            # Variance calculation: p * (1-p) for binary
-            # p = fraction of books having this feature = 1
-            p = np.mean(col)
-            variance = p * (1 - p)
-            
-            # We want variance closest to 0.25 (which means p=0.5)
-            # Actually maximizing variance is correct for binary split
-            if variance > max_variance:
-                max_variance = variance
-                best_feature = feature
-        
-        if best_feature is None:
+        n_books = self.n_books
+        if n_books == 0 or self.asked_mask.all():
             return None # No more questions
-            
-        # Find question text for this feature
-        for q in self.questions:
-            if q['feature'] == best_feature:
-                return q
-                
-        return None
+
+        if self.scoring == 'bayes':
+            gain = self._bayes_information_gain()
+            gain[self.asked_mask] = -np.inf
+            return self.question_for.get(self.feature_names[int(np.argmax(gain))])
+
+        # 1. Current candidates: every book while the best score is still 0,
+        # otherwise the top half (at least 3) by score
+        scores = self.scores()
+        if scores.max() == 0:
+            p = self.feature_means
+        else:
+            top_n = min(n_books, max(3, n_books // 2))
+            candidates = self._top_mask(scores, top_n)
+            p = self._feature_counts(candidates) / top_n
+
+        # 2. Expected information gain of a yes/no split = binary entropy of p
+        p = np.clip(p, 1e-6, 1 - 1e-6)
+        gain = -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+        gain[self.asked_mask] = -np.inf
+
+        best_feature = self.feature_names[int(np.argmax(gain))]
+        return self.question_for.get(best_feature)
+
+    def _bayes_information_gain(self):
+        """
+        Mutual information between the (noisy) answer and the book, for every feature:
+        H(answer) - E[H(answer | book)], with the posterior mass p holding each feature.
+        """
+        p = self.book_vectors.T @ self.posterior()
+        has, lacks = (np.array(col) for col in zip(*ANSWER_LIKELIHOODS.values()))
+        answers = np.outer(p, has) + np.outer(1 - p, lacks)  # features x answers
+        entropy = lambda probs: -(probs * np.log2(np.clip(probs, 1e-12, None))).sum(axis=-1)
+        return entropy(answers) - (p * entropy(has) + (1 - p) * entropy(lacks))
+
+    @staticmethod
+    def _top_mask(scores, top_n):
+        """Boolean mask of the top_n scores; ties at the cut go to the lowest index (like a stable sort)."""
+        cut = -np.partition(-scores, top_n - 1)[top_n - 1]
+        mask = scores > cut
+        ties = np.flatnonzero(scores == cut)[:top_n - int(mask.sum())]
+        mask[ties] = True
+        return mask
+
+    def _pack_features(self):
+        """Yes/no features packed as one bit per book (features x 64-bit words), or None if not binary."""
+        vectors = self.book_vectors
+        if not hasattr(np, 'bitwise_count') or not np.all(vectors.data == 1):
+            return None
+        n_features = vectors.shape[1]
+        bits = np.zeros((n_features, -(-self.n_books // 64)), dtype=np.uint64)
+        column = np.zeros(self.n_books, dtype=bool)
+        for j in range(n_features):
+            rows = vectors.indices[vectors.indptr[j]:vectors.indptr[j + 1]]
+            column[rows] = True
+            bits[j] = self._pack(column)
+            column[rows] = False
+        return bits
+
+    @staticmethod
+    def _pack(mask):
+        packed = np.packbits(mask)
+        padded = np.zeros(-(-packed.size // 8) * 8, dtype=np.uint8)  # pad to whole 64-bit words
+        padded[:packed.size] = packed
+        return padded.view(np.uint64)
+
+    def _feature_counts(self, mask):
+        """How many of the masked books have each feature (a weighted sum for non-binary features)."""
+        if self.feature_bits is None:
+            return self.book_vectors.T @ mask.astype(np.float32)
+        # AND + popcount over 64 books at a time
+        return np.bitwise_count(self.feature_bits & self._pack(mask)).sum(axis=1, dtype=np.int64)
+
+    def memory_usage(self):
+        """Bytes held by the per-catalogue arrays."""
+        vectors = self.book_vectors
+        total = vectors.data.nbytes + vectors.indices.nbytes + vectors.indptr.nbytes
+        total += self.book_norms.nbytes + self.feature_means.nbytes
+        if self.feature_bits is not None:
+            total += self.feature_bits.nbytes
+        return total
 
     def get_explanation(self, book_id):
         # Simple heuristic explanation
         # "You asked for [features matched], and this book is [features]"
         # To be implemented on frontend or simple string here
         pass
+
+
+class BatchedEngine:
+    """
+    Scores many concurrent sessions against one shared catalogue.
+    Every session's answer vector is a row of one preallocated
+    (capacity x n_features) array; slots are handed out from a free-list.
+    top_k requests are queued, and a scheduler thread scores everything that
+    arrives within BATCH_WINDOW together: one BLAS multiply against a dense
+    float32 copy of the catalogue (kept when it fits BATCH_DENSE_BYTES) when
+    that is cheaper than a sparse product per session, then top-k for every
+    session at once.
+    Cosine scoring only: bayes state is a per-book posterior, not an answer vector.
+    """
+
+    def __init__(self, engine, capacity=BATCH_CAPACITY, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        if engine.scoring != 'cosine':
+            raise ValueError("BatchedEngine only supports cosine scoring")
+        self.engine = engine
+        self.capacity = capacity
+        self.window = window
+        self.max_batch = max_batch
+        n_features = len(engine.feature_names)
+        vectors = engine.book_vectors
+        self.dense = None
+        if vectors.shape[0] * vectors.shape[1] * 4 <= BATCH_DENSE_BYTES:
+            # (n_features x n_books): a batch's scores come out of one BLAS call, already row-per-session
+            self.dense = vectors.T.toarray().astype(np.float32, copy=False)
+        self.column_nnz = np.diff(vectors.indptr).astype(np.int64)
+        self.user_vectors = np.zeros((capacity, n_features), dtype=np.float32)
+        self.asked = np.zeros((capacity, n_features), dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))  # pop() hands out the lowest slot first
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._thread = None
+        self.batches = 0
+        self.scored = 0
+
+    @property
+    def active(self):
+        return self.capacity - len(self._free)
+
+    def open_session(self):
+        """A SessionView on a free slot (RuntimeError when all slots are taken)."""
+        with self._lock:
+            if not self._free:
+                raise RuntimeError(f"All {self.capacity} session slots are in use")
+            slot = self._free.pop()
+        return SessionView(self, slot)
+
+    def release(self, slot):
+        self.user_vectors[slot] = 0
+        self.asked[slot] = False
+        with self._lock:
+            self._free.append(slot)
+
+    def submit(self, slot, k=10):
+        """Queue a top-k request for a slot; the Future resolves to [(book index, score)]."""
+        future = Future()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="bookinator-batch", daemon=True)
+                    self._thread.start()
+        self._pending.put((slot, k, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            # Wait (at most one window) only while other open sessions might still join
+            deadline = time.perf_counter() + self.window
+            while len(batch) < min(self.max_batch, self.active):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.top_k_many([slot for slot, _, _ in batch], max(k for _, k, _ in batch))
+            except Exception as e:
+                print(f"DEBUG: Batched scoring failed: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.scored += len(batch)
+            for (_, k, future), result in zip(batch, results):
+                future.set_result(result[:k])
+
+    def scores_many(self, slots):
+        """(len(slots) x n_books) cosine scores; rows of sessions with no answers are all zeros."""
+        engine = self.engine
+        users = self.user_vectors[slots]
+        norms = np.linalg.norm(users, axis=1)
+        if not norms.any():
+            return np.zeros((len(slots), engine.n_books), dtype=np.float32)
+        vectors = engine.book_vectors
+        # Sparse work is the nonzeros of each session's answered columns; the dense multiply touches everything
+        sparse_work = int((users != 0).sum(axis=0) @ self.column_nnz)
+        if self.dense is not None and self.dense.size * len(slots) <= DENSE_SPEEDUP * sparse_work:
+            dots = users @ self.dense
+        else:
+            dots = np.zeros((len(slots), engine.n_books), dtype=np.float32)
+            for row, user in zip(dots, users):
+                answered = np.flatnonzero(user)
+                if answered.size:
+                    row[:] = vectors[:, answered] @ user[answered]
+        norms[norms == 0] = np.inf  # no answers yet -> 0 everywhere, as in BookinatorEngine.scores
+        dots /= engine.book_norms * norms[:, None]
+        return dots
+
+    def top_k_many(self, slots, k=10):
+        """Per-slot top_k lists, ranked like BookinatorEngine.top_k (best first, ties to the lowest index)."""
+        k = min(k, self.engine.n_books)
+        if k <= 0:
+            return [[] for _ in slots]
+        scores = self.scores_many(slots)
+        if k > ARGMAX_TOP_K:
+            results = []
+            for row in scores:
+                top = np.flatnonzero(BookinatorEngine._top_mask(row, k))
+                top = top[np.argsort(-row[top], kind='stable')]
+                results.append([(int(i), float(row[i])) for i in top])
+            return results
+        # k argmax passes over the whole batch: best first, ties to the lowest index like a
+        # stable sort, and cheaper than partitioning rows full of tied cosine scores
+        rows = np.arange(len(slots))
+        top = np.empty((len(slots), k), dtype=np.intp)
+        values = np.empty((len(slots), k), dtype=scores.dtype)
+        for j in range(k):
+            best = scores.argmax(axis=1)
+            top[:, j] = best
+            values[:, j] = scores[rows, best]
+            scores[rows, best] = -np.inf
+        return [list(zip(map(int, t), map(float, v))) for t, v in zip(top, values)]
+
+    def memory_usage(self):
+        """Bytes held on top of the shared engine: session rows plus the dense catalogue copy."""
+        total = self.user_vectors.nbytes + self.asked.nbytes
+        if self.dense is not None:
+            total += self.dense.nbytes
+        return total
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'active': self.active,
+            'batches': self.batches,
+            'mean_batch': self.scored / self.batches if self.batches else 0.0,
+        }
+
+
+class SessionView(BookinatorEngine):
+    """
+    One game on a BatchedEngine slot. Shares the catalogue arrays, keeps
+    user_vector / asked_mask as views into the batch rows, and sends top_k
+    (and get_recommendations(k)) through the scheduler; everything else is
+    the BookinatorEngine code.
+    """
+
+    _SHARED = ('data_dir', 'scoring', 'books', 'questions', 'feature_names', 'feature_map', 'question_for',
+               'book_vectors', 'n_books', 'book_norms', 'feature_means', 'feature_bits')
+
+    def __init__(self, batch, slot):
+        self.batch = batch
+        self.slot = slot
+        for name in self._SHARED:
+            setattr(self, name, getattr(batch.engine, name))
+        self.reset_session()
+
+    def reset_session(self):
+        self.batch.user_vectors[self.slot] = 0
+        self.batch.asked[self.slot] = False
+        self.user_vector = self.batch.user_vectors[self.slot]
+        self.asked_mask = self.batch.asked[self.slot]
+        self.asked_features = set()
+        self.history = []
+
+    def top_k(self, k=10):
+        if self.batch.active == 1:
+            return super().top_k(k)  # nobody to batch with: score like a standalone engine
+        return self.batch.submit(self.slot, k).result()
+
+    def close(self):
+        """Give the slot back; the view must not be used afterwards."""
+        if self.slot is not None:
+            self.batch.release(self.slot)
+            self.slot = None
@@ -0,0 +1,602 @@
+"""
+Bookinator Ollama Client
+Process-wide discovery of the Ollama endpoint (or a routed pool of them),
+a pooled, keep-alive HTTP client shared by every engine, and single-flight
+coalescing of identical chat requests.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import coalesced_total
+
+DEFAULT_OLLAMA_URL = "http://127.0.0.1:11434"
+OLLAMA_CANDIDATE_URLS = [
+    "http://127.0.0.1:11434",
+    "http://localhost:11434",
+    "http://host.docker.internal:11434",
+]
+PROBE_TIMEOUT = 1          # seconds per candidate
+RECHECK_MIN_INTERVAL = 5   # seconds between background re-discoveries
+
+# HTTP client tuning
+CONNECT_TIMEOUT = 3        # seconds to establish a connection
+READ_TIMEOUT = 45          # seconds to wait between bytes of a reply
+POOL_CONNECTIONS = 4       # distinct hosts kept in the pool
+POOL_MAXSIZE = 32          # keep-alive connections per host (~ concurrent LLM calls)
+MAX_RETRIES = 2            # extra attempts on connection errors/resets
+RETRY_BACKOFF = 0.25       # seconds, doubled per attempt
+HEALTH_INTERVAL = 10       # seconds between background health checks
+
+# Several Ollama machines: OLLAMA_URLS=http://gpu1:11434,http://gpu2:11434
+# Requests go to the healthy node with the fewest in flight; a session sticks to
+# its last node (warm prompt cache) unless that node is AFFINITY_SLACK busier.
+POOL_PROBE_INTERVAL = 5    # seconds between background health/latency probes
+POOL_LATENCY_ALPHA = 0.3   # weight of the newest probe in the latency average
+AFFINITY_SLACK = 1         # extra in-flight requests tolerated to stay on a warm node
+AFFINITY_MAX_SESSIONS = 10000
+
+# Identical chat requests (same model, messages and options) in flight at the same
+# time share one upstream call; finished replies are reused for COALESCE_TTL seconds.
+COALESCE = True
+COALESCE_TTL = 15          # seconds; short, so repeated games still see varied questions
+COALESCE_MAX_ENTRIES = 256
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    # Ollama is local: don't route it through HTTP(S)_PROXY (see connectivity_check.py)
+    session.trust_env = False
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _candidates() -> list[str]:
+    """Candidate URLs in preference order (OLLAMA_HOST first if set)."""
+    urls = list(OLLAMA_CANDIDATE_URLS)
+    host = os.environ.get('OLLAMA_HOST')
+    if host:
+        if not host.startswith('http'):
+            host = f"http://{host}"
+        urls.insert(0, host.rstrip('/'))
+    return urls
+
+
+def pool_urls() -> list[str]:
+    """Endpoints listed in OLLAMA_URLS (comma-separated); empty means single-endpoint discovery."""
+    urls = []
+    for url in os.environ.get('OLLAMA_URLS', '').split(','):
+        url = url.strip().rstrip('/')
+        if url:
+            urls.append(url if url.startswith('http') else f"http://{url}")
+    return urls
+
+
+class OllamaDiscovery:
+    """
+    Finds a reachable Ollama once per process and caches it.
+    Callers report connection failures; a background thread then re-probes
+    so the next request can use whichever endpoint answers now.
+    """
+
+    def __init__(self, candidates: Optional[list[str]] = None, session: Optional[requests.Session] = None):
+        self._candidates = candidates
+        self._session = session or _make_session()
+        self._url: Optional[str] = None
+        self._lock = threading.Lock()
+        self._rechecking = False
+        self._last_check = 0.0
+
+    def _discover(self) -> str:
+        """Probe all candidates concurrently; prefer the earliest one that answers."""
+        urls = self._candidates or _candidates()
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            alive = list(pool.map(self._probe, urls))
+        self._last_check = time.monotonic()
+        for url, ok in zip(urls, alive):
+            if ok:
+                return url
+        return urls[0] if self._candidates else DEFAULT_OLLAMA_URL
+
+    def _probe(self, url: str) -> bool:
+        try:
+            self._session.get(f"{url}/api/tags", timeout=PROBE_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    @property
+    def url(self) -> str:
+        url = self._url
+        if url is None:
+            with self._lock:
+                if self._url is None:
+                    self._url = self._discover()
+                    print(f"DEBUG: Using Ollama URL: {self._url}")
+                url = self._url
+        return url
+
+    def report_failure(self):
+        """Schedule a background re-discovery (rate limited, at most one at a time)."""
+        with self._lock:
+            if self._rechecking or time.monotonic() - self._last_check < RECHECK_MIN_INTERVAL:
+                return
+            self._rechecking = True
+        threading.Thread(target=self._recheck, name="ollama-discovery", daemon=True).start()
+
+    def _recheck(self):
+        try:
+            url = self._discover()
+            if url != self._url:
+                print(f"DEBUG: Ollama endpoint changed: {self._url} -> {url}")
+            self._url = url
+        finally:
+            self._rechecking = False
+
+
+class OllamaNode:
+    """One pooled endpoint and what the router knows about it."""
+
+    __slots__ = ('url', 'healthy', 'outstanding', 'latency', 'failures', 'models', 'checked_at')
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True      # optimistic until the first probe says otherwise
+        self.outstanding = 0     # requests currently routed here
+        self.latency = 0.0       # smoothed /api/tags round trip, seconds
+        self.failures = 0        # consecutive failed probes/requests
+        self.models: list[str] = []
+        self.checked_at: Optional[float] = None
+
+
+class OllamaPool:
+    """
+    Several Ollama endpoints behind one router: a background thread probes
+    each node's health and latency; pick() sends a request to the healthy node
+    with the fewest requests in flight (then the lowest latency), keeping a
+    session on its previous node while that costs at most AFFINITY_SLACK.
+    Nodes that fail a request are skipped until a probe succeeds again.
+    """
+
+    def __init__(self, urls: list[str], session: Optional[requests.Session] = None,
+                 probe_interval: float = POOL_PROBE_INTERVAL):
+        self.nodes = [OllamaNode(url) for url in urls]
+        self.probe_interval = probe_interval
+        self._session = session or _make_session()
+        self._affinity: "OrderedDict[str, OllamaNode]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="ollama-pool-probe", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            time.sleep(self.probe_interval)
+
+    def probe_all(self):
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as pool:
+            list(pool.map(self.probe, self.nodes))
+
+    def probe(self, node: OllamaNode) -> bool:
+        started = time.perf_counter()
+        try:
+            resp = self._session.get(f"{node.url}/api/tags", timeout=PROBE_TIMEOUT)
+            resp.raise_for_status()
+            models = [m['name'] for m in resp.json().get('models', [])]
+        except Exception:
+            with self._lock:
+                if node.healthy:
+                    print(f"DEBUG: Ollama node {node.url} is down.")
+                node.healthy = False
+                node.failures += 1
+                node.checked_at = time.time()
+            return False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if not node.healthy:
+                print(f"DEBUG: Ollama node {node.url} is back.")
+            node.latency = elapsed if node.checked_at is None else \
+                POOL_LATENCY_ALPHA * elapsed + (1 - POOL_LATENCY_ALPHA) * node.latency
+            node.healthy = True
+            node.failures = 0
+            node.models = models
+            node.checked_at = time.time()
+        return True
+
+    def pick(self, affinity: Optional[str] = None, exclude: tuple = ()) -> Optional[OllamaNode]:
+        """Reserve a node for one request (release() it afterwards); None if every node is excluded."""
+        with self._lock:
+            candidates = [n for n in self.nodes if n.healthy and n not in exclude]
+            if not candidates:
+                # Nothing known to be up: try the others anyway, the probes may be stale
+                candidates = [n for n in self.nodes if n not in exclude]
+                if not candidates:
+                    return None
+            node = min(candidates, key=lambda n: (n.outstanding, n.latency))
+            if affinity is not None:
+                warm = self._affinity.get(affinity)
+                if warm in candidates and warm.outstanding <= node.outstanding + AFFINITY_SLACK:
+                    node = warm
+                self._affinity[affinity] = node
+                self._affinity.move_to_end(affinity)
+                if len(self._affinity) > AFFINITY_MAX_SESSIONS:
+                    self._affinity.popitem(last=False)
+            node.outstanding += 1
+            return node
+
+    def release(self, node: OllamaNode, ok: bool = True):
+        with self._lock:
+            node.outstanding -= 1
+            if not ok:
+                if node.healthy:
+                    print(f"DEBUG: Ollama node {node.url} failed a request; routing around it.")
+                node.healthy = False
+                node.failures += 1
+
+    @property
+    def url(self) -> str:
+        """The node a new session would be sent to (for messages and health checks)."""
+        with self._lock:
+            healthy = [n for n in self.nodes if n.healthy] or self.nodes
+            return min(healthy, key=lambda n: (n.outstanding, n.latency)).url
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [{
+                'url': n.url,
+                'healthy': n.healthy,
+                'outstanding': n.outstanding,
+                'latency_ms': round(n.latency * 1000, 1),
+                'failures': n.failures,
+                'models': n.models,
+            } for n in self.nodes]
+
+
+class OllamaClient:
+    """
+    Shared client for all Ollama traffic: one pooled keep-alive session,
+    separate connect/read timeouts, and retry with exponential backoff when
+    a connection is refused or reset before a reply arrives. With a pool,
+    each attempt is routed to a node and failed nodes are tried last.
+    """
+
+    def __init__(self, discovery: OllamaDiscovery, session: Optional[requests.Session] = None,
+                 pool: Optional[OllamaPool] = None):
+        self.discovery = discovery
+        self.session = session or _make_session()
+        self.pool = pool
+
+    @property
+    def base_url(self) -> str:
+        return self.pool.url if self.pool else self.discovery.url
+
+    def _post(self, path: str, payload: dict, stream: bool = False,
+              affinity: Optional[str] = None) -> tuple[Optional[OllamaNode], requests.Response]:
+        """POST with retries; returns (node it went to, response). Pass the node to _done() when finished."""
+        if self.pool is not None:
+            return self._post_pool(path, payload, stream, affinity)
+        delay = RETRY_BACKOFF
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload, stream=stream,
+                                             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                response.raise_for_status()
+                return None, response
+            except requests.exceptions.ConnectionError:
+                if attempt == MAX_RETRIES:
+                    self.discovery.report_failure()
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _post_pool(self, path: str, payload: dict, stream: bool,
+                   affinity: Optional[str]) -> tuple[OllamaNode, requests.Response]:
+        delay = RETRY_BACKOFF
+        tried: list[OllamaNode] = []
+        error: Optional[Exception] = None
+        for attempt in range(len(self.pool.nodes) + MAX_RETRIES):
+            node = self.pool.pick(affinity, exclude=tuple(tried))
+            if node is None:
+                # Every node failed this request once: back off, then go round again
+                tried = []
+                time.sleep(delay)
+                delay *= 2
+                continue
+            handed_over = failed = False
+            try:
+                response = self.session.post(f"{node.url}{path}", json=payload, stream=stream,
+                                             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                response.raise_for_status()
+                handed_over = True  # the caller releases the node when the reply is read
+                return node, response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                status = e.response.status_code if getattr(e, 'response', None) is not None else None
+                if status is not None and status < 500:
+                    raise  # the request itself is bad; another node won't help
+                failed = True
+                tried.append(node)
+                error = e
+            finally:
+                # Any other exception too: the node must not keep counting this request as outstanding
+                if not handed_over:
+                    self.pool.release(node, ok=not failed)
+        raise error
+
+    def _done(self, node: Optional[OllamaNode], ok: bool = True):
+        if node is not None:
+            self.pool.release(node, ok)
+
+    def chat(self, payload: dict, affinity: Optional[str] = None) -> dict:
+        """Non-streaming /api/chat; returns the decoded reply."""
+        node, response = self._post("/api/chat", payload, affinity=affinity)
+        ok = False
+        try:
+            data = response.json()
+            ok = True
+            return data
+        finally:
+            self._done(node, ok)
+
+    def chat_stream(self, payload: dict, affinity: Optional[str] = None) -> Iterator[dict]:
+        """
+        Streaming /api/chat; yields decoded NDJSON chunks.
+        Closing the generator early closes the connection, which stops generation upstream.
+        """
+        node, response = self._post("/api/chat", payload, stream=True, affinity=affinity)
+        ok = True
+        try:
+            with response:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        except requests.exceptions.RequestException:
+            ok = False
+            raise
+        finally:
+            self._done(node, ok)
+
+    def list_models(self, timeout: float = 2) -> list[str]:
+        resp = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+        resp.raise_for_status()
+        return [m['name'] for m in resp.json().get('models', [])]
+
+
+class Abandoned(Exception):
+    """The leading request was dropped before any reply arrived; followers should retry."""
+
+
+class Flight:
+    """
+    One upstream chat request and everyone waiting on it.
+    The leader publishes raw chunks (a non-streaming reply is a single chunk);
+    followers replay them as they arrive.
+    """
+
+    __slots__ = ('key', 'chunks', 'done', 'error', 'followers', 'finished_at', '_cond')
+
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: list[dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.finished_at = 0.0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: dict):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def replay(self, timeout: float) -> Iterator[dict]:
+        """Yield the chunks published so far and then new ones until the leader finishes."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError("Timed out waiting for a shared LLM reply")
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            yield from chunks
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    def result(self, timeout: float) -> dict:
+        """The whole reply as one /api/chat response dict."""
+        chunks = list(self.replay(timeout))
+        if len(chunks) == 1:
+            return chunks[0]
+        data = dict(chunks[-1]) if chunks else {}
+        content = ''.join(c.get('message', {}).get('content', '') for c in chunks)
+        data['message'] = {'role': 'assistant', 'content': content}
+        return data
+
+
+class Coalescer:
+    """
+    Single-flight table for chat requests, keyed on a hash of everything but
+    the stream flag. join() makes the caller either the leader (who calls
+    Ollama and publishes) or a follower of an in-flight or recently finished
+    identical request, so Ollama load scales with distinct game states rather
+    than with visitors.
+    """
+
+    def __init__(self, ttl: float = COALESCE_TTL, max_entries: int = COALESCE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._flights: "OrderedDict[str, Flight]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        request = {k: v for k, v in payload.items() if k != 'stream'}
+        blob = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def join(self, payload: dict) -> tuple[Flight, bool]:
+        """(flight, is_leader) for this request."""
+        key = self.key(payload)
+        now = time.monotonic()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                if not flight.done:
+                    flight.followers += 1
+                    coalesced_total.inc('joined')
+                    return flight, False
+                if flight.error is None and now - flight.finished_at < self.ttl:
+                    flight.followers += 1
+                    coalesced_total.inc('cached')
+                    return flight, False
+            flight = self._flights[key] = Flight(key)
+            self._flights.move_to_end(key)
+            self._trim(now)
+            return flight, True
+
+    def finish(self, flight: Flight, error: Optional[BaseException] = None):
+        flight.finish(error)
+        if error is not None or self.ttl <= 0:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    def leave(self, flight: Flight):
+        """A follower stopped listening."""
+        with self._lock:
+            flight.followers -= 1
+
+    def abandon(self, flight: Flight, can_finish: bool) -> bool:
+        """
+        The leader's caller hung up. Returns False if others are waiting on the
+        reply and the leader can still finish it for them; otherwise drops the
+        flight (waiting followers retry on their own).
+        """
+        with self._lock:
+            if flight.followers and can_finish:
+                return False
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(Abandoned())
+        return True
+
+    def _trim(self, now: float):
+        """Drop expired replies, then the oldest finished ones beyond max_entries (in-flight ones stay)."""
+        for key in [k for k, f in self._flights.items() if f.done and now - f.finished_at >= self.ttl]:
+            del self._flights[key]
+        excess = len(self._flights) - self.max_entries
+        for key in [k for k, f in self._flights.items() if f.done][:max(0, excess)]:
+            del self._flights[key]
+
+    def call(self, payload: dict, fetch: Callable[[], dict], timeout: float) -> tuple[dict, bool]:
+        """Non-streaming single-flight: (reply, shared) where shared means another request paid for it."""
+        while True:
+            flight, leader = self.join(payload)
+            if not leader:
+                try:
+                    return flight.result(timeout), True
+                except Abandoned:
+                    continue
+                finally:
+                    self.leave(flight)
+            try:
+                data = fetch()
+            except BaseException as e:
+                self.finish(flight, e)
+                raise
+            flight.publish(data)
+            self.finish(flight)
+            return data, False
+
+
+class HealthMonitor:
+    """Background thread that keeps a cached Ollama status for /api/health."""
+
+    def __init__(self, client: OllamaClient, interval: float = HEALTH_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self._status = {'ollama': False, 'models': [], 'checked_at': None}
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if self.client.pool is not None:
+            self.client.pool.start()
+        threading.Thread(target=self._run, name="ollama-health", daemon=True).start()
+
+    def check(self) -> dict:
+        pool = self.client.pool
+        if pool is not None:
+            # The pool's own prober does the network checks
+            nodes = pool.stats()
+            status = {
+                'ollama': any(n['healthy'] for n in nodes),
+                'models': sorted({m for n in nodes if n['healthy'] for m in n['models']}),
+                'nodes': nodes,
+                'checked_at': time.time(),
+            }
+            self._status = status
+            return status
+        try:
+            status = {'ollama': True, 'models': self.client.list_models()}
+        except Exception:
+            status = {'ollama': False, 'models': []}
+            self.client.discovery.report_failure()
+        status['checked_at'] = time.time()
+        self._status = status
+        return status
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+
+    def status(self) -> dict:
+        if self.client.pool is not None:
+            return self.check()  # in-memory snapshot of the pool, always current
+        return self._status
+
+
+_session = _make_session()
+discovery = OllamaDiscovery(session=_session)
+pool = OllamaPool(pool_urls(), _session) if pool_urls() else None
+client = OllamaClient(discovery, _session, pool)
+health = HealthMonitor(client)
+coalescer = Coalescer()
+
+
+def get_ollama_url() -> str:
+    """The process-wide Ollama base URL (discovered on first use)."""
+    return discovery.url
@@ -0,0 +1,194 @@
+"""
+Bookinator Opening Book
+Precomputed LLM replies for the first turns of the answer tree, so a new
+game's first questions are served without calling the model.
+
+Generate it offline against the configured model (needs Ollama running):
+    python opening_book.py generate --depth 2 --variants 3
+
+Entries are keyed by (model, prompt fingerprint); within an entry the tree is
+walked by (variant shown, normalized answer). Changing SYSTEM_PROMPT, the
+start message or the prefix-cache mode changes the fingerprint, so stale
+books are simply never matched.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+OPENING_BOOK_PATH = os.environ.get('BOOKINATOR_OPENING_BOOK', 'data/opening_book.json')
+OPENING_BOOK_VERSION = 1
+OPENING_DEPTH = 2       # turns covered (1 = just the first question)
+OPENING_VARIANTS = 3    # alternative replies stored per node, picked at random
+
+# The answer buttons in templates/index.html
+ANSWERS = ["Absolutely", "Yes", "Probably", "Probably Not", "No", "Absolutely Not"]
+
+
+def normalize_answer(answer: str) -> str:
+    return ' '.join(answer.lower().split())
+
+
+def prompt_fingerprint(system_prompt: str, start_message: str, prefix_cache: bool) -> str:
+    """Hash of everything besides the model that decides what the opening requests look like."""
+    text = json.dumps([OPENING_BOOK_VERSION, system_prompt, start_message, prefix_cache])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class OpeningBook:
+    """
+    Tree of stored replies: node = {'variants': [{'response': str, 'next': {answer: node}}]}.
+    A game's position is a path of [answer, variant index] steps ('' for the start message).
+    """
+
+    def __init__(self, path: str = OPENING_BOOK_PATH):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self.mtime: Optional[float] = None
+        self.load()
+
+    @staticmethod
+    def key(model: str, fingerprint: str) -> str:
+        return f"{model}|{fingerprint}"
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.entries, self.mtime = {}, None
+            return
+        self.entries = data.get('entries', {}) if data.get('version') == OPENING_BOOK_VERSION else {}
+        self.mtime = mtime
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': OPENING_BOOK_VERSION, 'entries': self.entries}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def next_move(self, model: str, fingerprint: str, path: list, message: str,
+                  rng: random.Random = random) -> Optional[tuple[list, str]]:
+        """
+        The stored reply to `message` at `path`, as (step to append, response),
+        or None once the game has left the book.
+        """
+        entry = self.entries.get(self.key(model, fingerprint))
+        if entry is None:
+            return None
+        if not path:
+            if message != entry['start']:
+                return None
+            node, answer = entry['root'], ''
+        else:
+            node = entry['root']
+            try:
+                variant = node['variants'][path[0][1]]
+                for answer, index in path[1:]:
+                    variant = variant['next'][answer]['variants'][index]
+            except (IndexError, KeyError):
+                return None
+            answer = normalize_answer(message)
+            node = variant['next'].get(answer)
+            if node is None:
+                return None
+        if not node['variants']:
+            return None
+        index = rng.randrange(len(node['variants']))
+        return [answer, index], node['variants'][index]['response']
+
+
+_shared_book: Optional[OpeningBook] = None
+_shared_lock = threading.Lock()
+
+
+def get_opening_book(path: str = OPENING_BOOK_PATH) -> OpeningBook:
+    """Process-wide book, reloaded when the file changes."""
+    global _shared_book
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    book = _shared_book
+    if book is None or book.path != path or book.mtime != mtime:
+        with _shared_lock:
+            book = _shared_book
+            if book is None or book.path != path or book.mtime != mtime:
+                book = _shared_book = OpeningBook(path)
+    return book
+
+
+def _plain_question(response: str) -> bool:
+    """Only bare questions go in the book: guesses, searches and finals depend on the game."""
+    return bool(response.strip()) and '[' not in response
+
+
+def _collect_variants(state: dict, message: str, variants: int, attempts: int) -> list[tuple[str, dict]]:
+    """Ask the model for distinct replies to `message` from `state`; returns (response, state after) pairs."""
+    from llm_engine import BookinatorLLM
+
+    found: dict[str, dict] = {}
+    for _ in range(attempts):
+        if len(found) >= variants:
+            break
+        engine = BookinatorLLM.from_state(state)
+        engine.opening_path = None  # always ask the model while generating
+        engine.chat(message)
+        response = engine.conversation_history[-1]['content']
+        if _plain_question(response) and response not in found:
+            found[response] = engine.to_state()
+    return list(found.items())
+
+
+def generate(model: str, depth: int = OPENING_DEPTH, variants: int = OPENING_VARIANTS,
+             path: str = OPENING_BOOK_PATH) -> dict:
+    """Build (and save) the opening book entry for `model` and the current prompts."""
+    from llm_engine import START_MESSAGE, BookinatorLLM
+
+    engine = BookinatorLLM(model=model)
+    attempts = variants * 2  # the model may repeat itself or emit tags
+
+    def build(state: dict, message: str, level: int) -> dict:
+        node = {'variants': []}
+        for response, after in _collect_variants(state, message, variants, attempts):
+            variant = {'response': response, 'next': {}}
+            if level < depth:
+                for answer in ANSWERS:
+                    variant['next'][normalize_answer(answer)] = build(after, answer, level + 1)
+            node['variants'].append(variant)
+            print(f"DEBUG: {'  ' * level}{message!r} -> {response!r}")
+        return node
+
+    started = time.perf_counter()
+    root = build(engine.to_state(), START_MESSAGE, 1)
+    book = OpeningBook(path)
+    book.entries[OpeningBook.key(model, engine.prompt_fingerprint)] = {
+        'start': START_MESSAGE,
+        'depth': depth,
+        'created': time.time(),
+        'root': root,
+    }
+    book.save()
+    print(f"DEBUG: Opening book for {model} written to {path} in {time.perf_counter() - started:.0f}s")
+    return book.entries
+
+
+if __name__ == '__main__':
+    import argparse
+    from llm_engine import DEFAULT_MODEL
+
+    parser = argparse.ArgumentParser(description="Precompute the Bookinator opening book")
+    sub = parser.add_subparsers(dest='command', required=True)
+    gen = sub.add_parser('generate', help="ask the model for the first turns of the answer tree")
+    gen.add_argument('--model', default=DEFAULT_MODEL)
+    gen.add_argument('--depth', type=int, default=OPENING_DEPTH)
+    gen.add_argument('--variants', type=int, default=OPENING_VARIANTS)
+    gen.add_argument('--out', default=OPENING_BOOK_PATH)
+    args = parser.parse_args()
+
+    generate(args.model, args.depth, args.variants, args.out)
@@ -0,0 +1,222 @@
+"""
+Bookinator Search Cache
+Persistent (SQLite) cache of local and web search results keyed on a
+normalized query, with TTL, size-bounded LRU eviction and hit/miss counters.
+
+Pre-warm it before the fair opens:
+    python search_cache.py --prewarm data/prewarm_queries.txt
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from search_index import tokenize
+
+# Configuration
+SEARCH_CACHE_PATH = os.environ.get('BOOKINATOR_SEARCH_CACHE', 'data/search_cache.db')
+SEARCH_CACHE_TTL = 7 * 24 * 60 * 60   # seconds
+SEARCH_CACHE_MAX_ENTRIES = 20000
+MEMORY_CACHE_ENTRIES = 512            # hot entries also kept in-process
+EVICT_EVERY = 100                     # puts between LRU trims of the SQLite table
+TOUCH_INTERVAL = 30                   # seconds between writes of in-memory hits' access times to SQLite
+
+# Words that don't change what a search finds ("Feluda books" == "Feluda novel")
+QUERY_NOISE = frozenset({
+    'book', 'books', 'novel', 'novels', 'story', 'stories', 'series', 'collection',
+    'author', 'written', 'writer', 'is', 'it', 'about',
+})
+_NOISE_TOKENS = frozenset(t for word in QUERY_NOISE for t in tokenize(word))  # in folded form
+
+
+def normalize_query(query: str) -> str:
+    """Order-insensitive, transliteration-folded key for a search query ('' if it's all noise)."""
+    tokens = {t for t in tokenize(query) if t not in _NOISE_TOKENS}
+    return ' '.join(sorted(tokens))
+
+
+class SearchCache:
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple[float, list[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        self._touched: dict[str, float] = {}   # key -> last in-memory hit not yet written to SQLite
+        self._flushed = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, created REAL NOT NULL,"
+                " accessed REAL NOT NULL, results TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed ON search_cache(accessed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(namespace: str, query: str) -> Optional[str]:
+        """Cache key, or None for a query with nothing but noise words (those aren't cached)."""
+        normalized = normalize_query(query)
+        return f"{namespace}|{normalized}" if normalized else None
+
+    @staticmethod
+    def _copy(results: list[dict]) -> list[dict]:
+        # Callers get their own lists and dicts: the cached ones are shared across sessions
+        return [dict(r) for r in results]
+
+    def get(self, namespace: str, query: str) -> Optional[list[dict]]:
+        key = self._key(namespace, query)
+        if key is None:
+            return None
+        now = time.time()
+
+        with self._lock:
+            item = self._memory.get(key)
+            hit = item is not None and now - item[0] < self.ttl
+            if hit:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                # Hot keys are served from memory; their SQLite recency is refreshed in batches
+                self._touched[key] = now
+                flush = now - self._flushed >= TOUCH_INTERVAL
+        if hit:
+            if flush:
+                self.flush_access()
+            return self._copy(item[1])
+
+        row = self._conn().execute("SELECT created, results FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[0] >= self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        results = json.loads(row[1])
+        with self._conn() as conn:
+            conn.execute("UPDATE search_cache SET accessed = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+            self._remember(key, row[0], results)
+        return self._copy(results)
+
+    def put(self, namespace: str, query: str, results: list[dict]):
+        key = self._key(namespace, query)
+        if key is None:
+            return
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, created, accessed, results) VALUES (?, ?, ?, ?)",
+                (key, now, now, json.dumps(results, separators=(',', ':')))
+            )
+        with self._lock:
+            self._remember(key, now, self._copy(results))
+            self._puts += 1
+            trim = self._puts % EVICT_EVERY == 0
+        if trim:
+            self.evict()
+
+    def _remember(self, key: str, created: float, results: list[dict]):
+        self._memory[key] = (created, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_CACHE_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def flush_access(self):
+        """Write the access times of in-memory hits to SQLite, so the LRU trim sees them."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._flushed = time.time()
+        if touched:
+            with self._conn() as conn:
+                conn.executemany("UPDATE search_cache SET accessed = ? WHERE key = ?",
+                                 [(ts, key) for key, ts in touched.items()])
+
+    def evict(self):
+        """Drop expired entries, then least-recently-used ones beyond max_entries."""
+        self.flush_access()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM search_cache WHERE created < ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                " SELECT key FROM search_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM search_cache")
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        size = self._conn().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': size,
+        }
+
+    def prewarm(self, queries: Iterable[str], fetch: Callable[[str], object]) -> int:
+        """Run `fetch` (which fills the cache as a side effect) for every query; returns how many ran."""
+        warmed = 0
+        for query in queries:
+            query = query.strip()
+            if not query or query.startswith('#'):
+                continue
+            fetch(query)
+            warmed += 1
+        return warmed
+
+
+_shared_cache: Optional[SearchCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide cache instance (opened on first use)."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = SearchCache()
+    return _shared_cache
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Manage the Bookinator search cache")
+    parser.add_argument('--prewarm', metavar='FILE', help="file with one query per line")
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    cache = get_search_cache()
+    if args.clear:
+        cache.clear()
+        print("Cache cleared.")
+    if args.prewarm:
+        from llm_engine import BookinatorLLM
+        engine = BookinatorLLM()
+        with open(args.prewarm, encoding='utf-8') as f:
+            # No deadline here: wait for every web result so it gets cached
+            count = cache.prewarm(f, lambda q: (engine._search_local_db(q), engine._web_search(q)))
+        print(f"Pre-warmed {count} queries.")
+    print(cache.stats())
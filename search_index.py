@@ -0,0 +1,176 @@
+"""
+Bookinator Search Index
+Inverted BM25 index over normalized title/author tokens of the knowledge base.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+import weakref
+from array import array
+from functools import lru_cache
+from math import log
+
+from knowledge_base import KnowledgeBase
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Prefix expansion: only for tokens this long that are not a vocabulary term
+# themselves, at most this many vocabulary terms, scored at a discount.
+PREFIX_MIN_LEN = 3
+PREFIX_MAX_EXPANSIONS = 32
+PREFIX_WEIGHT = 0.6
+
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'the', 'of', 'by', 'in', 'on', 'to', 'for', 'with', 'de', 'la',
+})
+
+# Anglicised Bengali surnames → one canonical spelling (applied before folding)
+SURNAME_ALIASES = {
+    'banerjee': 'bandyopadhyay', 'banerji': 'bandyopadhyay', 'bandopadhyay': 'bandyopadhyay',
+    'bandyopadhyaya': 'bandyopadhyay', 'bandhopadhyay': 'bandyopadhyay',
+    'chatterjee': 'chattopadhyay', 'chatterji': 'chattopadhyay', 'chattopadhyaya': 'chattopadhyay',
+    'mukherjee': 'mukhopadhyay', 'mukherji': 'mukhopadhyay', 'mukhopadhyaya': 'mukhopadhyay',
+    'ganguly': 'gangopadhyay', 'ganguli': 'gangopadhyay', 'gangopadhyaya': 'gangopadhyay',
+    'bhattacharjee': 'bhattacharya', 'bhattacharyya': 'bhattacharya',
+    'thakur': 'tagore', 'thakure': 'tagore',
+    'basu': 'bose', 'bosu': 'bose',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_ASPIRATE_RE = re.compile(r"([bcdgkpst])h")
+_REPEAT_RE = re.compile(r"(.)\1+")
+
+
+@lru_cache(maxsize=65536)
+def _fold(token: str) -> str:
+    """Phonetic key that merges common romanization variants (sh/s, dh/d, v/b, ee/i, ...)."""
+    token = SURNAME_ALIASES.get(token, token)
+    token = _ASPIRATE_RE.sub(r"\1", token)
+    token = token.replace('v', 'b').replace('z', 'j')
+    token = token.replace('ee', 'i').replace('oo', 'u')
+    return _REPEAT_RE.sub(r"\1", token)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, strip accents, split, drop stopwords and fold transliteration variants."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.lower()
+    return [_fold(t) for t in _TOKEN_RE.findall(text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class SearchIndex:
+    """
+    Prebuilt inverted index with precomputed BM25 weights per posting,
+    so a query is a handful of dictionary lookups and array walks.
+    """
+
+    @property
+    def kb(self) -> KnowledgeBase:
+        # Weak: the index is the value of a WeakKeyDictionary keyed on this catalogue
+        return self._kb()
+
+    def __init__(self, kb: KnowledgeBase):
+        self._kb = weakref.ref(kb)
+        postings: dict[str, dict[int, int]] = {}
+        doc_lengths = array('H')
+
+        for i, title in enumerate(kb.titles):
+            tokens = tokenize(title + " " + kb.authors(i).replace('/', ' '))
+            doc_lengths.append(min(len(tokens), 0xFFFF))
+            for t in tokens:
+                docs = postings.setdefault(t, {})
+                docs[i] = docs.get(i, 0) + 1
+
+        n_docs = max(len(kb), 1)
+        avgdl = (sum(doc_lengths) / n_docs) or 1.0
+
+        self._docs: dict[str, array] = {}
+        self._weights: dict[str, array] = {}
+        for term, docs in postings.items():
+            df = len(docs)
+            idf = log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            ids = array('I', docs.keys())
+            weights = array('f')
+            for doc, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc] / avgdl)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+            self._docs[term] = ids
+            self._weights[term] = weights
+
+        self._vocab = sorted(self._docs)
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        """
+        Vocabulary terms matching `token` exactly or, failing that, by prefix,
+        with their weight factor. A token that is a term stays exact: a rare
+        longer term ("johnstown") would otherwise outscore it on its own idf.
+        """
+        if token in self._docs:
+            return [(token, 1.0)]
+        matches = []
+        if len(token) >= PREFIX_MIN_LEN:
+            start = bisect.bisect_right(self._vocab, token)
+            for term in self._vocab[start:start + PREFIX_MAX_EXPANSIONS]:
+                if not term.startswith(token):
+                    break
+                matches.append((term, PREFIX_WEIGHT))
+        return matches
+
+    def search(self, query: str, k: int = 5) -> list[tuple[int, float, float]]:
+        """
+        Top-k BM25 hits for `query`.
+        Returns (row index, score, coverage) where coverage is the fraction of query tokens matched.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        scores: dict[int, float] = {}
+        matched: dict[int, int] = {}
+        for token in tokens:
+            # Best weight per document for this query token
+            best: dict[int, float] = {}
+            for term, factor in self._expand(token):
+                for doc, w in zip(self._docs[term], self._weights[term]):
+                    w *= factor
+                    if w > best.get(doc, 0.0):
+                        best[doc] = w
+            for doc, w in best.items():
+                scores[doc] = scores.get(doc, 0.0) + w
+                matched[doc] = matched.get(doc, 0) + 1
+
+        counts = self.kb.ratings_counts
+        top = heapq.nlargest(k, scores, key=lambda d: (scores[d], counts[d]))
+        return [(d, scores[d], matched[d] / len(tokens)) for d in top]
+
+    def matching(self, query: str) -> set[int]:
+        """Rows whose title/author contain every token of `query` (exact terms, no prefixes)."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or any(t not in self._docs for t in tokens):
+            return set()
+        rows = set(self._docs[tokens[0]])
+        for t in tokens[1:]:
+            rows.intersection_update(self._docs[t])
+        return rows
+
+
+_indexes: "weakref.WeakKeyDictionary[KnowledgeBase, SearchIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(kb: KnowledgeBase) -> SearchIndex:
+    """Return the (lazily built, shared) search index for a knowledge base."""
+    index = _indexes.get(kb)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(kb)
+            if index is None:
+                index = _indexes[kb] = SearchIndex(kb)
+    return index
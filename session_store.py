@@ -0,0 +1,257 @@
+"""
+Bookinator Session Store
+Bounded LRU + idle-TTL cache of live engines, backed by a pluggable store
+of serialized game state so evicted sessions can be restored cheaply.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Configuration
+MAX_LIVE_SESSIONS = 500           # engines kept in memory per process
+SESSION_IDLE_TTL = 30 * 60        # seconds before an idle engine is evicted
+SESSION_STATE_TTL = 24 * 60 * 60  # seconds a serialized game is kept in the backend
+PURGE_INTERVAL = 60               # seconds between backend purges
+
+
+class SessionBackend(ABC):
+    """
+    Storage for serialized game state, keyed by session id.
+    Each save bumps a revision so other processes can tell their copy is stale.
+    """
+
+    # True if other processes may write to the same store
+    shared = False
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[tuple[int, dict]]:
+        """Return (revision, state) or None."""
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, state: dict) -> int:
+        """Store state and return its new revision."""
+        ...
+
+    @abstractmethod
+    def revision(self, session_id: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def purge(self, older_than: float):
+        """Drop states last written before the given timestamp."""
+        ...
+
+
+class MemoryBackend(SessionBackend):
+    """In-process backend: states kept as compact JSON strings."""
+
+    def __init__(self):
+        self._states: dict[str, tuple[int, float, str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[tuple[int, dict]]:
+        item = self._states.get(session_id)
+        if item is None:
+            return None
+        return item[0], json.loads(item[2])
+
+    def save(self, session_id: str, state: dict) -> int:
+        blob = json.dumps(state, separators=(',', ':'))
+        with self._lock:
+            item = self._states.get(session_id)
+            revision = item[0] + 1 if item else 1
+            self._states[session_id] = (revision, time.time(), blob)
+        return revision
+
+    def revision(self, session_id: str) -> Optional[int]:
+        item = self._states.get(session_id)
+        return item[0] if item else None
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def purge(self, older_than: float):
+        with self._lock:
+            stale = [sid for sid, (_, updated, _) in self._states.items() if updated < older_than]
+            for sid in stale:
+                del self._states[sid]
+
+
+class SQLiteBackend(SessionBackend):
+    """On-disk backend that several worker processes can share (WAL mode)."""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, revision INTEGER NOT NULL,"
+                " updated REAL NOT NULL, state TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Optional[tuple[int, dict]]:
+        row = self._conn().execute(
+            "SELECT revision, state FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def save(self, session_id: str, state: dict) -> int:
+        blob = json.dumps(state, separators=(',', ':'))
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE sessions SET revision = revision + 1, updated = ?, state = ? WHERE id = ?",
+                (now, blob, session_id)
+            )
+            if cur.rowcount == 0:
+                conn.execute(
+                    "INSERT INTO sessions (id, revision, updated, state) VALUES (?, 1, ?, ?)",
+                    (session_id, now, blob)
+                )
+            return conn.execute("SELECT revision FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+
+    def revision(self, session_id: str) -> Optional[int]:
+        row = self._conn().execute("SELECT revision FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, session_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge(self, older_than: float):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE updated < ?", (older_than,))
+
+
+class _LiveSession:
+    __slots__ = ('engine', 'revision', 'last_used')
+
+    def __init__(self, engine, revision: int):
+        self.engine = engine
+        self.revision = revision
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """
+    Live engines in an LRU capped at `max_live` and evicted after `idle_ttl`
+    seconds of inactivity. Engines must provide `to_state()` and a
+    `from_state(state)` constructor on the factory.
+    """
+
+    def __init__(self, factory: Callable, backend: Optional[SessionBackend] = None,
+                 max_live: int = MAX_LIVE_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL,
+                 state_ttl: float = SESSION_STATE_TTL):
+        self.factory = factory
+        self.backend = backend or MemoryBackend()
+        self.max_live = max_live
+        self.idle_ttl = idle_ttl
+        self.state_ttl = state_ttl
+        self._live: "OrderedDict[str, _LiveSession]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_purge = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def get(self, session_id: str):
+        """Return the engine for a session, restoring or creating it as needed."""
+        with self._lock:
+            self._evict_idle()
+            live = self._live.get(session_id)
+            if live is not None:
+                self._live.move_to_end(session_id)
+                live.last_used = time.monotonic()
+                if not self.backend.shared:
+                    return live.engine
+                # Another worker may have advanced this game since we last saw it
+                revision = self.backend.revision(session_id)
+                if revision is None or revision == live.revision:
+                    return live.engine
+
+            stored = self.backend.load(session_id)
+            if stored is not None:
+                revision, state = stored
+                engine = self.factory.from_state(state)
+            else:
+                revision, engine = 0, self.factory()
+
+            self._live[session_id] = _LiveSession(engine, revision)
+            self._live.move_to_end(session_id)
+            while len(self._live) > self.max_live:
+                self._evict(next(iter(self._live)))
+            return engine
+
+    def save(self, session_id: str, engine):
+        """
+        Persist the engine's game state (call after each request that changes it).
+        The engine is passed in rather than looked up, so a turn still gets stored
+        if the session was evicted while the request ran.
+        """
+        # Serialized and written outside the store lock: other sessions' requests don't wait on it
+        revision = self.backend.save(session_id, engine.to_state())
+        with self._lock:
+            live = self._live.get(session_id)
+            if live is None:
+                return
+            if live.engine is engine:
+                live.revision = max(live.revision, revision)
+            else:
+                # Restored from an older state while this request ran; reload it next time
+                del self._live[session_id]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._live.pop(session_id, None)
+            self.backend.delete(session_id)
+
+    def _evict(self, session_id: str):
+        live = self._live.pop(session_id)
+        if not self.backend.shared or self.backend.revision(session_id) == live.revision:
+            self.backend.save(session_id, live.engine.to_state())
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        cutoff = now - self.idle_ttl
+        while self._live:
+            session_id, live = next(iter(self._live.items()))
+            if live.last_used >= cutoff:
+                break
+            self._evict(session_id)
+
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            self.backend.purge(time.time() - self.state_ttl)
+
+
+def default_backend() -> SessionBackend:
+    """SQLite if BOOKINATOR_SESSION_DB is set (needed for multiple workers), else in-process."""
+    path = os.environ.get('BOOKINATOR_SESSION_DB')
+    return SQLiteBackend(path) if path else MemoryBackend()
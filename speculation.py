@@ -0,0 +1,193 @@
+"""
+Bookinator Speculative Turns
+While a player reads the question, pre-generate the next reply for the
+answers they are most likely to give. A matching answer commits the stored
+turn; the other speculations are cancelled.
+
+Opt-in: BOOKINATOR_SPECULATE=1. Speculation never queues behind (or in front
+of) real players: it only starts when an LLM slot is free and stops as soon
+as anyone is waiting.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from concurrency import llm_limiter
+from metrics import turn_seconds
+
+SPECULATE = os.environ.get('BOOKINATOR_SPECULATE', '0') == '1'
+SPECULATION_BUDGET = int(os.environ.get('BOOKINATOR_SPECULATION_BUDGET', '1'))  # concurrent speculative LLM calls
+SPECULATION_FANOUT = 2   # answers speculated per question
+TAKE_TIMEOUT = 10.0      # seconds to wait for a still-running speculation before playing the turn live
+
+# Initial guess at answer popularity; reordered by what players actually click
+LIKELY_ANSWERS = ["Yes", "No", "Probably", "Probably Not", "Absolutely", "Absolutely Not"]
+
+
+def _normalize(answer: str) -> str:
+    return ' '.join(answer.lower().split())
+
+
+class SpeculativeTurn:
+    """One background attempt at the next turn for a given answer."""
+
+    __slots__ = ('answer', 'base', 'future', 'cancelled', 'started', 'elapsed')
+
+    def __init__(self, answer: str, base: int):
+        self.answer = answer
+        self.base = base                   # history length the speculation was forked from
+        self.future = None
+        self.cancelled = threading.Event()
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+
+class Speculator:
+    """Process-wide speculation budget, executor and hit/waste counters."""
+
+    def __init__(self, budget: int = SPECULATION_BUDGET, fanout: int = SPECULATION_FANOUT):
+        self.budget = max(1, budget)
+        self.fanout = fanout
+        self._slots = threading.BoundedSemaphore(self.budget)
+        self._executor = ThreadPoolExecutor(max_workers=self.budget, thread_name_prefix="bookinator-speculate")
+        self._lock = threading.Lock()
+        self._answer_counts = {_normalize(a): 0 for a in LIKELY_ANSWERS}
+        self._answer_text = {_normalize(a): a for a in LIKELY_ANSWERS}
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0          # speculations cancelled or finished for an answer nobody gave
+        self.saved_seconds = 0.0    # generation time players didn't have to wait for
+        self.wasted_seconds = 0.0   # generation time spent on speculations nobody used
+
+    def likely_answers(self) -> list[str]:
+        with self._lock:
+            ranked = sorted(self._answer_counts, key=self._answer_counts.get, reverse=True)
+        return [self._answer_text[a] for a in ranked]
+
+    def start(self, engine):
+        """Fork `engine` and pre-generate its next turn for the most likely answers."""
+        self.discard(engine)
+        if llm_limiter.waiting or llm_limiter.active >= llm_limiter.limit:
+            return  # real players come first
+        base = len(engine.conversation_history)
+        turns = {}
+        for answer in self.likely_answers()[:self.fanout]:
+            if not self._slots.acquire(blocking=False):
+                break
+            turn = SpeculativeTurn(answer, base)
+            turn.future = self._executor.submit(self._run, self._fork(engine), turn)
+            turns[_normalize(answer)] = turn
+            with self._lock:
+                self.started += 1
+        engine._speculation = turns
+
+    @staticmethod
+    def _fork(engine):
+        clone = engine.fork()
+        clone.speculative = False
+        # A speculation may never be used: it doesn't send lookups to the web, only reads cached ones
+        clone.web_search = False
+        return clone
+
+    def _run(self, clone, turn: SpeculativeTurn):
+        """Play the turn on a clone; returns (clone, result) or None if cancelled."""
+        try:
+            # The inner turn, so speculative work isn't counted as player-facing turn latency
+            events = clone._play_turn_stream(turn.answer)
+            try:
+                for event in events:
+                    # Never wait for a slot, and give it up as soon as a real player is queued
+                    if turn.cancelled.is_set() or event['type'] == 'queue' or llm_limiter.waiting:
+                        turn.cancelled.set()
+                        return None
+                    if event['type'] == 'done':
+                        turn_seconds.observe(time.monotonic() - turn.started, 'speculative', clone.turn_source)
+                        return clone, event['result']
+            finally:
+                events.close()  # closes the Ollama stream, which stops generation
+            return None
+        except Exception as e:
+            print(f"DEBUG: Speculative turn failed: {e}")
+            return None
+        finally:
+            turn.elapsed = time.monotonic() - turn.started
+            self._slots.release()
+
+    def take(self, engine, answer: str) -> Optional[tuple]:
+        """
+        The speculated (clone, result) for this answer, or None on a miss.
+        Every other speculation for the engine is cancelled.
+        """
+        turns = getattr(engine, '_speculation', None)
+        if not turns:
+            return None
+        engine._speculation = {}
+        key = _normalize(answer)
+        with self._lock:
+            if key in self._answer_counts:
+                self._answer_counts[key] += 1
+
+        turn = turns.pop(key, None)
+        for other in turns.values():
+            self._cancel(other)
+        if turn is None or turn.base != len(engine.conversation_history):
+            if turn is not None:
+                self._cancel(turn)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Still generating: it's ahead of a fresh call, so wait for it (but not forever)
+        try:
+            outcome = turn.future.result(timeout=TAKE_TIMEOUT)
+        except TimeoutError:
+            print(f"DEBUG: Speculation still running after {TAKE_TIMEOUT}s; playing the turn live.")
+            self._cancel(turn)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            if outcome is None:
+                self.misses += 1
+                self.wasted_seconds += turn.elapsed
+            else:
+                self.hits += 1
+                self.saved_seconds += turn.elapsed
+        return outcome
+
+    def discard(self, engine):
+        """Cancel whatever is in flight for the engine (new game, reset)."""
+        turns = getattr(engine, '_speculation', None)
+        engine._speculation = {}
+        for turn in (turns or {}).values():
+            self._cancel(turn)
+
+    def _cancel(self, turn: SpeculativeTurn):
+        turn.cancelled.set()
+        turn.future.add_done_callback(lambda _: self._discarded(turn))
+
+    def _discarded(self, turn: SpeculativeTurn):
+        with self._lock:
+            self.discarded += 1
+            self.wasted_seconds += turn.elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            taken = self.hits + self.misses
+            return {
+                'enabled': SPECULATE,
+                'started': self.started,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / taken if taken else 0.0,
+                'discarded': self.discarded,
+                'saved_seconds': round(self.saved_seconds, 3),
+                'wasted_seconds': round(self.wasted_seconds, 3),
+            }
+
+
+speculator = Speculator()
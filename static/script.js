@@ -65,6 +65,7 @@ document.addEventListener('DOMContentLoaded', () => {
             .then(data => {
                 setLoading(false);
                 displayQuestion(data.response);
+                updateCatalogue(data.catalogue);
                 updateProgress(1); // Q1
                 answersArea.style.display = 'grid'; // Show buttons
             })
@@ -78,41 +79,130 @@ document.addEventListener('DOMContentLoaded', () => {
         answersArea.style.opacity = '0.5';
         answersArea.style.pointerEvents = 'none';
 
-        fetch('/api/chat', {
+        // Prefer the streaming endpoint; fall back to plain JSON if the browser can't stream
+        const request = (window.ReadableStream && window.TextDecoder)
+            ? streamChat(answer).then(data => data || postChat(answer))
+            : postChat(answer);
+
+        request
+            .then(handleResult)
+            .catch(err => {
+                qText.textContent = "Connection Error.";
+                setLoading(false);
+            });
+    }
+
+    function postChat(answer) {
+        // Without a stream we poll for our place in the queue while waiting
+        const poll = setInterval(() => {
+            fetch('/api/queue')
+                .then(res => res.json())
+                .then(q => { if (q.position > 0) showQueuePosition(q.position); })
+                .catch(() => {});
+        }, 2000);
+
+        return fetch('/api/chat', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message: answer })
         })
             .then(res => res.json())
-            .then(data => {
-                setLoading(false);
-                answersArea.style.opacity = '1';
-                answersArea.style.pointerEvents = 'all';
+            .finally(() => clearInterval(poll));
+    }
 
-                // 1. Info Bit (Did you mean?)
-                if (data.info_bit) {
-                    showInfoToast(data.info_bit);
-                }
+    function showQueuePosition(position) {
+        qText.innerText = position === 1
+            ? "You're next! Reading your mind in a moment..."
+            : `Lots of readers right now! You're #${position} in line...`;
+    }
 
-                // 2. Game Over (Limit Reached)
-                if (data.game_over) {
-                    showResolutionCard(data.final_candidates);
-                    return;
+    // Reads Server-Sent Events from /api/chat/stream, showing tokens as they arrive.
+    // Resolves with the final result payload (same shape as /api/chat),
+    // or null if the server doesn't offer streaming.
+    async function streamChat(answer) {
+        const res = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message: answer })
+        });
+        if (!res.ok || !res.body) return null;
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                if (!frame.startsWith('data: ')) continue;
+                const event = JSON.parse(frame.slice(6));
+
+                if (event.type === 'token') {
+                    if (!streamed) setLoading(false);
+                    streamed += event.text;
+                    qText.textContent = streamed.trimStart();
+                } else if (event.type === 'queue') {
+                    if (event.position > 0) showQueuePosition(event.position);
+                } else if (event.type === 'search') {
+                    streamed = '';
+                    setLoading(true);
+                    qText.innerText = `Looking up "${event.query}"...`;
+                } else if (event.type === 'done') {
+                    return event.result;
+                } else if (event.type === 'error') {
+                    throw new Error(event.message);
                 }
+            }
+        }
+        throw new Error('Stream ended without a result');
+    }
 
-                // 3. Normal Guess vs Question
-                if (data.guess) {
-                    showResultScreen(data.guess);
-                } else {
-                    displayQuestion(data.response);
-                    questionCount++;
-                    updateProgress(questionCount);
-                }
-            })
-            .catch(err => {
-                qText.textContent = "Connection Error.";
-                setLoading(false);
-            });
+    function handleResult(data) {
+        setLoading(false);
+        answersArea.style.opacity = '1';
+        answersArea.style.pointerEvents = 'all';
+
+        // 1. Info Bit (Did you mean?)
+        if (data.info_bit) {
+            showInfoToast(data.info_bit);
+        }
+
+        // 2. Game Over (Limit Reached)
+        if (data.game_over) {
+            showResolutionCard(data.final_candidates, data.final_matches);
+            return;
+        }
+
+        updateCatalogue(data.catalogue);
+
+        // 3. Normal Guess vs Question
+        if (data.guess) {
+            showResultScreen(data.guess);
+        } else {
+            displayQuestion(data.response);
+            questionCount++;
+            updateProgress(questionCount);
+        }
+    }
+
+    // How many local catalogue books still fit every definite answer
+    function updateCatalogue(catalogue) {
+        const el = document.getElementById('catalogue-count');
+        if (!el) return;
+        if (!catalogue) {
+            el.style.display = 'none';
+            return;
+        }
+        el.textContent = `📚 ${catalogue.remaining.toLocaleString()} of ${catalogue.total.toLocaleString()} catalogue books still fit`;
+        el.title = catalogue.top.map(b => `${b.title} — ${b.author}`).join('\n');
+        el.style.display = 'block';
     }
 
     function displayQuestion(text) {
@@ -166,7 +256,14 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    window.showResolutionCard = function (candidates) {
+    // Tooltip naming the catalogue book a guessed title resolved to
+    function matchTooltip(match) {
+        if (!match) return 'Not found in the local catalogue';
+        const label = match.verified ? 'Catalogue' : 'Closest catalogue book';
+        return `${label}: ${match.title} — ${match.author} (${Math.round(match.score * 100)}% similar)`;
+    }
+
+    window.showResolutionCard = function (candidates, matches) {
         // Hide Question UI
         document.getElementById('q-card').style.display = 'none';
         document.getElementById('answers-area').style.display = 'none';
@@ -176,10 +273,11 @@ document.addEventListener('DOMContentLoaded', () => {
         list.innerHTML = '';
 
         if (candidates) {
-            candidates.forEach(cand => {
+            candidates.forEach((cand, i) => {
                 const btn = document.createElement('button');
                 btn.className = 'candidate-btn';
                 btn.textContent = cand;
+                if (matches) btn.title = matchTooltip(matches[i]);
                 btn.onclick = () => showFinalStatus(true, "I Win! 🎉", `I knew it was ${cand}!`);
                 list.appendChild(btn);
             });
@@ -224,6 +322,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         resConfidence.textContent = data.confidence + " Match";
         resTitle.textContent = data.book;
+        resTitle.title = 'match' in data ? matchTooltip(data.match) : '';
         resReasoning.textContent = data.reasoning;
 
         resSimilarList.innerHTML = '';
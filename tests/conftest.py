@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from knowledge_base import BOOKS_CSV_PATH, get_knowledge_base  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def kb():
+    """The bundled catalogue (shared, loaded once)."""
+    return get_knowledge_base(os.path.join(ROOT, BOOKS_CSV_PATH))
@@ -0,0 +1,54 @@
+import pytest
+
+from candidate_tracker import CandidateTracker, answer_weight, parse_question
+
+REJECTION = "That is incorrect. Please continue questioning."  # static/script.js, rejectResBtn
+
+
+def guess_block(book: str) -> str:
+    return f"[GUESS]\nConfidence: 95%\nBook: {book}\nReasoning: fits.\n[END GUESS]"
+
+
+def test_rejection_answer_is_strongly_negative():
+    assert answer_weight(REJECTION) < answer_weight('absolutely not')
+    assert answer_weight('  Probably   Not ') == -1.0
+    assert answer_weight('whatever') is None
+
+
+def test_rejected_guess_leaves_the_shortlist(kb):
+    tracker = CandidateTracker()
+    assert tracker.observe(kb, "Is it written by J.K. Rowling?", "yes")
+    top = tracker.shortlist(1)[0][0]
+    guessed = f"{kb.titles[top]} by {kb.authors(top).split('/')[0]}"
+
+    assert tracker.observe(kb, guess_block(guessed), REJECTION)
+    rows = [i for i, _ in tracker.shortlist(5)]
+    assert top not in rows
+    assert all('Rowling' in kb.authors(i) for i in rows)  # the other answers still count
+
+
+@pytest.mark.parametrize('question, key', [
+    ("Does the book have more than 300 pages?", ('pages_gt', 300, 1.0)),
+    ("Is it a short novel?", ('pages_lt', 200, 0.5)),
+    ("Was it published before 1950?", ('year_between', 1, 1949, 0.5)),
+    ("Was it written in the 1980s?", ('year_between', 1980, 1989, 0.5)),
+    ("Was it published in the 19th century?", ('year_between', 1800, 1899, 0.5)),
+    ("Is the book in Bengali?", ('language', ('ben',), 1.0)),
+    ("Was it written by Satyajit Ray?", ('match', 'Satyajit Ray', 1.0)),
+    ("Is it part of the Feluda series?", ('match', 'Feluda', 0.7)),
+    ("Is it part of a trilogy?", ('series', 0.7)),
+    ("Is it a bestseller? [INFO] Most are. [END INFO]", ('popular', 0.5)),
+    (guess_block("Sonar Kella by Satyajit Ray"), ('match', 'Sonar Kella by Satyajit Ray', 1.0)),
+])
+def test_parse_question(question, key):
+    assert parse_question(question) == key
+
+
+@pytest.mark.parametrize('question', [
+    "Was it originally written in Bengali?",   # the catalogue lists editions, not originals
+    "Is the author Indian?",                   # a nationality, not a name
+    "Does it make you cry?",
+    "",
+])
+def test_unparseable_questions(question):
+    assert parse_question(question) is None
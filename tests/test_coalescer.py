@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from ollama_client import Abandoned, Coalescer
+
+PAYLOAD = {'model': 'llama3.2', 'messages': [{'role': 'user', 'content': 'Game Start.'}]}
+
+
+def chunk(text: str, done: bool = False) -> dict:
+    return {'message': {'role': 'assistant', 'content': text}, 'done': done}
+
+
+def test_stream_flag_does_not_change_the_key():
+    assert Coalescer.key(PAYLOAD) == Coalescer.key(dict(PAYLOAD, stream=True))
+    assert Coalescer.key(PAYLOAD) != Coalescer.key(dict(PAYLOAD, model='other'))
+
+
+def test_follower_replays_the_leaders_stream():
+    coalescer = Coalescer(ttl=60)
+    flight, leader = coalescer.join(PAYLOAD)
+    assert leader
+    follower, is_leader = coalescer.join(dict(PAYLOAD, stream=True))
+    assert follower is flight and not is_leader
+
+    flight.publish(chunk("Is it "))
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(flight.replay(5)))
+    reader.start()
+    flight.publish(chunk("a novel?", done=True))
+    coalescer.finish(flight)
+    reader.join(5)
+    assert ''.join(c['message']['content'] for c in received) == "Is it a novel?"
+    assert flight.result(1)['message']['content'] == "Is it a novel?"
+
+    # Finished replies are reused within the TTL
+    coalescer.leave(flight)
+    assert coalescer.join(PAYLOAD) == (flight, False)
+
+
+def test_call_shares_one_fetch():
+    coalescer = Coalescer(ttl=60)
+    calls = []
+    reply = chunk("Is it a novel?", done=True)
+    assert coalescer.call(PAYLOAD, lambda: calls.append(1) or reply, 5) == (reply, False)
+    assert coalescer.call(PAYLOAD, lambda: calls.append(1) or reply, 5) == (reply, True)
+    assert len(calls) == 1
+
+
+def test_abandon_keeps_the_flight_for_waiting_followers():
+    coalescer = Coalescer(ttl=60)
+    flight, _ = coalescer.join(PAYLOAD)
+    coalescer.join(PAYLOAD)
+    assert not coalescer.abandon(flight, can_finish=True)   # the leader must finish it
+    assert not flight.done
+
+
+def test_abandon_without_a_slot_sends_followers_to_retry():
+    coalescer = Coalescer(ttl=60)
+    flight, _ = coalescer.join(PAYLOAD)
+    coalescer.join(PAYLOAD)
+    assert coalescer.abandon(flight, can_finish=False)
+    with pytest.raises(Abandoned):
+        flight.result(1)
+    retry, leader = coalescer.join(PAYLOAD)
+    assert leader and retry is not flight
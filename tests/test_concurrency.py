@@ -0,0 +1,65 @@
+import threading
+
+from concurrency import FairLimiter
+
+
+def granted(tickets) -> list[str]:
+    return [name for name, ticket in tickets if ticket.event.is_set()]
+
+
+def test_slots_go_round_robin_across_sessions():
+    limiter = FairLimiter(limit=1)
+    assert limiter.enqueue('busy') is None            # holds the only slot
+    tickets = [('a1', limiter.enqueue('a')), ('a2', limiter.enqueue('a')),
+               ('b1', limiter.enqueue('b')), ('c1', limiter.enqueue('c'))]
+    assert limiter.position('a') == 1 and limiter.position('c') == 3
+
+    order = []
+    for _ in tickets:
+        limiter.release()
+        order.append(next(n for n in granted(tickets) if n not in order))
+    assert order == ['a1', 'b1', 'c1', 'a2']          # one per session before anyone's second
+    limiter.release()
+    assert limiter.active == 0 and limiter.waiting == 0
+
+
+def test_cancel_leaves_the_queue():
+    limiter = FairLimiter(limit=1)
+    limiter.enqueue('busy')
+    first, second = limiter.enqueue('a'), limiter.enqueue('b')
+    limiter.cancel(first)
+    assert limiter.waiting == 1 and limiter.position('a') == 0
+    limiter.release()
+    assert second.event.is_set() and not first.event.is_set()
+
+
+def test_cancel_after_grant_gives_the_slot_back():
+    limiter = FairLimiter(limit=1)
+    limiter.enqueue('busy')
+    ticket = limiter.enqueue('a')
+    limiter.release()                                 # granted, but its waiter timed out
+    assert ticket.event.is_set()
+    limiter.cancel(ticket)
+    assert limiter.active == 0
+
+
+def test_slot_times_out_without_keeping_a_place():
+    limiter = FairLimiter(limit=1)
+    limiter.enqueue('busy')
+    try:
+        with limiter.slot('a', timeout=0.01):
+            raise AssertionError("slot should not have been granted")
+    except TimeoutError:
+        pass
+    assert limiter.waiting == 0
+
+    done = threading.Event()
+
+    def worker():
+        with limiter.slot('b', timeout=5):
+            done.set()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    limiter.release()
+    thread.join(5)
+    assert done.is_set() and limiter.active == 0
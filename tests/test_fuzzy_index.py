@@ -0,0 +1,29 @@
+from conftest import ROOT
+from fuzzy_index import get_fuzzy_index
+
+
+def test_misspelled_guess_is_verified(kb):
+    match = get_fuzzy_index(kb).best("The Hobit by Tolkien")
+    assert match['title'] == 'The Hobbit' and match['verified']
+
+
+def test_uncatalogued_titles_match_nothing(kb):
+    index = get_fuzzy_index(kb)
+    # Only shares letters with "Fell" / "Peter Pan": not a near miss
+    assert index.best("Feluda (Sonar Kella) by Satyajit Ray") is None
+    assert index.best("Pather Panchali by Bibhutibhushan") is None
+    # Similar title by someone else ("The Shadow Rising" by Robert Jordan)
+    assert index.best("The Shadow Lines by Amitav Ghosh") is None
+
+
+def test_only_close_but_different_guesses_get_a_note(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    from llm_engine import BookinatorLLM
+    engine = BookinatorLLM()
+
+    engine._check_guess("Pather Panchali by Bibhutibhushan Bandyopadhyay")
+    assert engine.guess_check is None
+
+    match = engine._check_guess("Hobbit Tales by Tolkien")
+    assert match is not None and not match['verified']
+    assert "may still be correct" in engine.guess_check
@@ -0,0 +1,63 @@
+import os
+import time
+
+import search_cache
+from search_cache import SearchCache, normalize_query
+
+RESULTS = [{'title': 'Sonar Kella', 'snippet': 'A Feluda adventure.'}]
+
+
+def make_cache(tmp_path, **kwargs) -> SearchCache:
+    return SearchCache(path=os.path.join(tmp_path, 'cache.db'), **kwargs)
+
+
+def test_normalized_queries_share_an_entry(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('web:3', "Feluda books", RESULTS)
+    assert cache.get('web:3', "novel feluda") == RESULTS
+    assert cache.get('web:5', "feluda") is None            # namespaces don't mix
+    assert normalize_query("books novel") == ''
+    cache.put('web:3', "books", RESULTS)                   # noise-only queries aren't cached
+    assert cache.get('web:3', "books") is None
+
+
+def test_callers_get_copies(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('web:3', "feluda", RESULTS)
+    cache.get('web:3', "feluda")[0]['title'] = 'changed'
+    assert cache.get('web:3', "feluda") == RESULTS
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = make_cache(tmp_path, ttl=0.05)
+    cache.put('web:3', "feluda", RESULTS)
+    assert cache.get('web:3', "feluda") == RESULTS
+    time.sleep(0.1)
+    assert cache.get('web:3', "feluda") is None
+    assert make_cache(tmp_path, ttl=0.05).get('web:3', "feluda") is None   # on disk too
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_cache, 'MEMORY_CACHE_ENTRIES', 0)   # every get reads SQLite
+    cache = make_cache(tmp_path, max_entries=2)
+    for query in ("feluda", "byomkesh", "tintin"):
+        cache.put('web:3', query, RESULTS)
+        time.sleep(0.01)
+    cache.get('web:3', "feluda")                          # now the most recently used
+    cache.evict()
+    assert cache.stats()['entries'] == 2
+    assert cache.get('web:3', "byomkesh") is None
+    assert cache.get('web:3', "feluda") == RESULTS
+
+
+def test_memory_hits_refresh_sqlite_recency(tmp_path):
+    cache = make_cache(tmp_path, max_entries=1)
+    cache.put('web:3', "feluda", RESULTS)
+    time.sleep(0.01)
+    cache.put('web:3', "byomkesh", RESULTS)
+    time.sleep(0.01)
+    cache.get('web:3', "feluda")                          # served from memory
+    cache.evict()                                         # flushes the access time first
+    fresh = make_cache(tmp_path, max_entries=1)
+    assert fresh.get('web:3', "feluda") == RESULTS
+    assert fresh.get('web:3', "byomkesh") is None
@@ -0,0 +1,68 @@
+import os
+import time
+
+from session_store import MemoryBackend, SessionStore, SQLiteBackend
+
+
+class Game:
+    """Stand-in engine: the store only needs to_state() and from_state()."""
+
+    def __init__(self, turns: int = 0):
+        self.turns = turns
+
+    def to_state(self) -> dict:
+        return {'turns': self.turns}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Game":
+        return cls(state['turns'])
+
+
+def test_lru_eviction_and_restore():
+    store = SessionStore(Game, MemoryBackend(), max_live=2)
+    first = store.get('a')
+    first.turns = 3
+    store.save('a', first)
+    store.get('b')
+    store.get('c')                                        # evicts 'a', the least recently used
+    assert len(store) == 2
+
+    restored = store.get('a')
+    assert restored is not first and restored.turns == 3
+    assert store.get('a') is restored                     # live again
+
+
+def test_idle_sessions_are_evicted_with_their_state():
+    store = SessionStore(Game, MemoryBackend(), idle_ttl=0.05)
+    game = store.get('a')
+    game.turns = 5                                        # not saved yet: eviction saves it
+    time.sleep(0.1)
+    store.get('b')
+    assert len(store) == 1
+    assert store.get('a').turns == 5
+
+
+def test_save_after_eviction_keeps_the_turn():
+    store = SessionStore(Game, MemoryBackend(), max_live=1)
+    game = store.get('a')
+    store.get('b')                                        # 'a' evicted mid-request
+    game.turns = 1
+    store.save('a', game)
+    assert store.get('a').turns == 1
+
+
+def test_shared_backend_picks_up_other_workers_turns(tmp_path):
+    path = os.path.join(tmp_path, 'sessions.db')
+    mine, theirs = SessionStore(Game, SQLiteBackend(path)), SessionStore(Game, SQLiteBackend(path))
+    game = mine.get('a')
+    game.turns = 1
+    mine.save('a', game)
+
+    other = theirs.get('a')
+    other.turns = 2
+    theirs.save('a', other)
+    assert mine.get('a').turns == 2                       # stale live copy reloaded
+
+    store = SessionStore(Game, SQLiteBackend(path))
+    store.delete('a')
+    assert store.get('a').turns == 0
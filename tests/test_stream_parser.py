@@ -0,0 +1,25 @@
+from llm_engine import StreamParser
+
+
+def feed_all(pieces: list[str]) -> tuple[list[tuple[str, str]], StreamParser]:
+    parser = StreamParser()
+    events = []
+    for piece in pieces:
+        events.extend(parser.feed(piece))
+    return events, parser
+
+
+def test_visible_text_stops_at_the_first_tag():
+    events, parser = feed_all(["**Is it", " a novel?** ", "[INFO] Fun", " fact [END INFO]"])
+    assert ''.join(text for kind, text in events if kind == 'token') == "Is it a novel? "
+    assert parser.text == "**Is it a novel?** [INFO] Fun fact [END INFO]"
+
+
+def test_search_tag_split_across_chunks():
+    events, _ = feed_all(["Is it Feluda? [SEA", "RCH: feluda so", "nar kella", "] more", " [SEARCH: again]"])
+    assert [e for e in events if e[0] == 'search'] == [('search', 'feluda sonar kella')]
+
+
+def test_empty_search_query_is_ignored():
+    events, _ = feed_all(["[SEARCH: ]"])
+    assert events == []